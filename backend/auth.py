@@ -7,6 +7,8 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlmodel import Session
 from .database import get_session
 from .models import Parent
+from .utils.metrics import password_hashes_in_progress
+from .utils.tracing import traced, section
 
 # SECRET KEY for JWT (should be in env vars for production)
 SECRET_KEY = "supersecretkeybrightbookmvp"
@@ -20,14 +22,25 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    # Invited parents (roster import) have no usable hash until they accept the invite
+    if not pwd_context.identify(hashed_password):
+        return False
+    password_hashes_in_progress.inc()
+    try:
+        return pwd_context.verify(plain_password, hashed_password)
+    finally:
+        password_hashes_in_progress.dec()
 
 def get_password_hash(password):
     # Truncate password to 72 bytes if needed (bcrypt limitation)
     password_bytes = password.encode('utf-8')
     if len(password_bytes) > 72:
         password = password_bytes[:72].decode('utf-8', errors='ignore')
-    return pwd_context.hash(password)
+    password_hashes_in_progress.inc()
+    try:
+        return pwd_context.hash(password)
+    finally:
+        password_hashes_in_progress.dec()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -40,12 +53,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+@traced
 async def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    section("jwt decode")
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -55,6 +70,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), session: Session
         raise credentials_exception
         
     # Find user in DB
+    section("parent lookup")
     from sqlmodel import select
     statement = select(Parent).where(Parent.email == email)
     user = session.exec(statement).first()
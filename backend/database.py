@@ -1,5 +1,6 @@
 from sqlmodel import SQLModel, create_engine, Session  # Import SQLModel components for database connection
 import os
+from .utils.tracing import span  # Import tracing span for the session dependency
 
 # Define the database directory and file
 # Use persistent disk location on Render, fallback to local directory
@@ -20,22 +21,49 @@ sqlite_file_name = os.path.join(database_dir, "database.db")
 # Create the full connection URL string for SQLite
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
+# Archived plans, activities and progress live in a separate file (see utils/archival.py)
+archive_file_name = os.path.join(database_dir, "archive.db")
+
 print(f"🔴 Database file: {sqlite_file_name}")
 print(f"🔴 Database URL: {sqlite_url}")
 
 # Argument to allow check_same_thread=False, needed for SQLite with FastAPI
 connect_args = {"check_same_thread": False}
-# Create the database engine. echo=True logs all SQL commands to console
-engine = create_engine(sqlite_url, echo=True, connect_args=connect_args)
+# Create the database engine. SQL_ECHO=1 logs all SQL commands to console (debugging only;
+# per-request counts and the slow-query log come from utils/sql_instrumentation.py)
+engine = create_engine(sqlite_url, echo=os.getenv("SQL_ECHO", "") == "1", connect_args=connect_args)
 
 # Function to create database tables based on defined models
+def enable_incremental_vacuum():
+    """Switch the database to auto_vacuum=INCREMENTAL so deletes can give pages back in small steps"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+            return
+        connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        # An existing file only picks up the new mode after one full VACUUM (fresh files need none)
+        if connection.exec_driver_sql("SELECT COUNT(*) FROM sqlite_master").scalar():
+            print("🔴 Converting database to incremental auto_vacuum (one-time VACUUM)")
+            connection.exec_driver_sql("VACUUM")
+
 def create_db_and_tables():
-    # Will create tables for all models inheriting from SQLModel
-    SQLModel.metadata.create_all(engine)
+    from .migrations import run_migrations
+
+    enable_incremental_vacuum()
+    with engine.begin() as connection:
+        # Will create tables for all models inheriting from SQLModel
+        SQLModel.metadata.create_all(connection)
+        # Reshape tables created by older versions of the models
+        run_migrations(connection)
+        # create_all skips existing tables entirely, so add any indexes declared since
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
 
 # Dependency generator to provide a database session
 def get_session():
-    # Create a new session using the engine
-    with Session(engine) as session:
+    # Create a new session using the engine (its connection is checked out on first use)
+    with span("get_session"):
+        session = Session(engine)
+    with session:
         # Yield the session to the requester (e.g., API endpoint)
         yield session
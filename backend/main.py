@@ -1,8 +1,23 @@
-from fastapi import FastAPI, HTTPException  # Import main FastAPI class
+from fastapi import FastAPI, HTTPException, Request  # Import main FastAPI class
+from fastapi.responses import PlainTextResponse  # Import plain text response for /metrics
+import anyio.to_thread  # Import the thread limiter sync endpoints run under
 from fastapi.middleware.cors import CORSMiddleware  # Import CORS middleware for handling cross-origin requests
 import os
-from .database import create_db_and_tables  # Import DB initialization function
-from .routers import users, activities, assessments, dashboard, notifications, auth  # Import specific API routers
+import time
+from .database import create_db_and_tables, engine  # Import DB initialization function and engine
+from .utils.activity_catalog import load_activity_catalog  # Import activity template cache warm-up
+from .utils.archival import run_archival  # Import plan archival job
+from .utils.notification_retention import run_notification_retention  # Import notification compaction job
+from .utils.child_deletion import purge_detached_children  # Import cleanup for interrupted child deletes
+from .utils.streaks import reconcile_streaks  # Import nightly streak reconcile
+from .utils.leaderboard import load_leaderboards, save_leaderboard_snapshot  # Import leaderboard warm-up and snapshots
+from .utils.columnar_export import run_columnar_export  # Import incremental Parquet export job
+from .utils.sql_instrumentation import instrument_engine, start_request, finish_request  # Import per-request SQL stats
+from .utils import metrics  # Import request/pool/cache/job metrics
+from .utils.tracing import start_trace, finish_trace, instrument_serialization  # Import request tracing
+from .utils import profiling  # Import signed per-request profiling
+from .utils.scheduler import schedule_periodic, stop_all  # Import background job scheduler
+from .routers import users, activities, assessments, dashboard, notifications, auth, history, achievements, leaderboards, analytics, exports, classrooms, admin  # Import specific API routers
 
 # Initialize the FastAPI application with a custom title
 app = FastAPI(title="BrightBook API")
@@ -12,6 +27,33 @@ app = FastAPI(title="BrightBook API")
 def on_startup():
     # Create database tables when the application starts
     create_db_and_tables()
+    # Intern the shared activity templates in memory
+    load_activity_catalog()
+    # Build the in-memory leaderboards (from a snapshot if the database hasn't changed since)
+    print(f"🔴 Leaderboards loaded: {load_leaderboards()}")
+    # Move superseded/expired plans out of the hot tables (every 6 hours by default)
+    schedule_periodic("archival", "ARCHIVE_INTERVAL_SECONDS", 6 * 3600, run_archival)
+    # Roll up old notifications and reclaim their pages (daily by default)
+    schedule_periodic("notification-retention", "NOTIFICATION_RETENTION_INTERVAL_SECONDS", 24 * 3600, run_notification_retention)
+    # Finish child deletes that were scheduled but interrupted (hourly by default)
+    schedule_periodic("child-purge", "CHILD_PURGE_INTERVAL_SECONDS", 3600, purge_detached_children)
+    # Recompute every streak from the daily rollups and zero lapsed ones (nightly by default)
+    schedule_periodic("streak-reconcile", "STREAK_RECONCILE_INTERVAL_SECONDS", 24 * 3600, reconcile_streaks)
+    # Snapshot the leaderboard rows so a quiet restart can skip the rebuild (every 15 minutes by default)
+    schedule_periodic("leaderboard-snapshot", "LEADERBOARD_SNAPSHOT_INTERVAL_SECONDS", 15 * 60, save_leaderboard_snapshot)
+    # Append new learning rows to the analysts' Parquet files (hourly by default)
+    schedule_periodic("columnar-export", "COLUMNAR_EXPORT_INTERVAL_SECONDS", 3600, run_columnar_export)
+    # Busy/queued threads of the pool sync endpoints (and bcrypt) run in
+    metrics.watch_threadpool(anyio.to_thread.current_default_thread_limiter())
+    # Share this worker's metrics with the others through METRICS_DIR (multi-worker deployments)
+    metrics.start_flusher()
+
+# Stop background jobs when the application shuts down
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_all()
+    save_leaderboard_snapshot()
+    metrics.stop_flusher()
 
 # Configure Middleware to allow the frontend to access the API
 # Get allowed origins from environment variable or use defaults
@@ -24,6 +66,49 @@ else:
 
 print(f"🔴 ALLOWED_ORIGINS: {allowed_origins}")
 
+# Time every SQL statement (slow-query log, N+1 warnings) and report per-request totals as headers
+instrument_engine(engine)
+# Connection checkout wait and pool state for /metrics
+metrics.instrument_pool(engine.pool)
+# Trace response-model serialization as its own span
+instrument_serialization()
+# Let a signed X-Profile-Request header profile one request's endpoint
+profiling.instrument_endpoints()
+
+@app.middleware("http")
+async def instrumentation_middleware(request: Request, call_next):
+    stats = start_request(f"{request.method} {request.url.path}")
+    root_span = start_trace(f"{request.method} {request.url.path}", request.headers.get("traceparent"))
+    profile = profiling.start_request_profile(
+        request.method, request.url.path, request.headers.get(profiling.REQUEST_PROFILE_HEADER))
+    metrics.http_in_flight.inc()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        finish_trace(root_span, 500)
+        raise
+    finally:
+        metrics.http_in_flight.dec()
+    elapsed = time.perf_counter() - started
+    # Label by route template once routing has matched (e.g. /children/{child_id}), never the raw path
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else "unmatched"
+    stats.route = f"{request.method} {route_path}"
+    metrics.http_request_duration.observe(elapsed, request.method, route_path)
+    metrics.http_requests.inc(request.method, route_path, str(response.status_code))
+    # Streamed bodies run their queries after these headers are sent
+    response.headers.update(finish_request(stats, response.status_code, elapsed))
+    if profile is not None:
+        response.headers["X-Profile-Id"] = profiling.finish_request_profile(profile)
+    if root_span is not None:
+        root_span.name = stats.route
+        root_span.attributes.update({"http.method": request.method, "http.route": route_path})
+        # Written only if sampled or slow/failed; the header lets a caller find it in the trace file
+        response.headers["traceparent"] = root_span.traceparent
+        finish_trace(root_span, response.status_code)
+    return response
+
 app.add_middleware(
     CORSMiddleware,
     # Allow requests from production URL and local development
@@ -48,6 +133,20 @@ app.include_router(dashboard.router)
 app.include_router(notifications.router)
 # Register the auth router
 app.include_router(auth.router)
+# Register the history router (archived plans)
+app.include_router(history.router)
+# Register the achievements router (badge catalog and earned sets)
+app.include_router(achievements.router)
+# Register the leaderboards router (weekly / all-time rankings)
+app.include_router(leaderboards.router)
+# Register the analytics router (cohort distributions)
+app.include_router(analytics.router)
+# Register the exports router (streaming history downloads)
+app.include_router(exports.router)
+# Register the classrooms router (teacher group dashboards)
+app.include_router(classrooms.router)
+# Register the admin router (operator profiling)
+app.include_router(admin.router)
 
 # Root endpoint
 @app.get("/")
@@ -63,10 +162,22 @@ async def root():
             "assessments": "/assessments",
             "dashboard": "/dashboard",
             "notifications": "/notifications",
-            "auth": "/auth"
+            "auth": "/auth",
+            "history": "/history",
+            "achievements": "/achievements",
+            "leaderboards": "/leaderboards",
+            "analytics": "/analytics",
+            "exports": "/exports",
+            "classrooms": "/classrooms",
+            "admin": "/admin"
         }
     }
 
+# Prometheus scrape endpoint (all workers when METRICS_DIR is shared)
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,270 @@
+"""
+Schema Migrations - in-place upgrades for databases created by older versions
+create_all only adds missing tables, so anything that reshapes an existing table lives here
+"""
+
+from typing import List
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from sqlmodel import SQLModel
+from .models import Activity, ActivityTemplate, Achievement
+from .utils.activity_catalog import template_fingerprint
+from .utils.achievements import ACHIEVEMENT_DEFINITIONS
+from .utils.item_bank import SKILL_DISPLAY_NAMES
+from .utils.archival import get_archived_type_completions
+from .utils.skill_snapshots import backfill_skill_snapshots
+
+COPY_BATCH_SIZE = 1000
+
+# Tables updated in place; their rows carry a trigger-maintained row_version (see RowVersion)
+VERSIONED_TABLES = ("activity", "activityprogress")
+# Tables whose changes are only counted (the leaderboard snapshot's watermark)
+COUNTED_TABLES = ("child", "childprogress", "dailyactivity")
+
+
+def migrate_activity_templates(connection: Connection) -> None:
+    """Move per-row activity text into the shared ActivityTemplate catalog"""
+    columns = {c["name"] for c in inspect(connection).get_columns("activity")}
+    if "activity_name" not in columns:
+        return
+
+    print("🔴 Migrating activity table to ActivityTemplate catalog")
+
+    # Rebuild the table (SQLite can't drop NOT NULL columns in place).
+    # legacy_alter_table keeps activityprogress' foreign key pointing at "activity".
+    for index in inspect(connection).get_indexes("activity"):
+        connection.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+    connection.execute(text("PRAGMA legacy_alter_table=ON"))
+    connection.execute(text("ALTER TABLE activity RENAME TO activity_legacy"))
+    connection.execute(text("PRAGMA legacy_alter_table=OFF"))
+    Activity.__table__.create(connection)
+
+    # 1. Intern the distinct templates
+    distinct_rows = connection.execute(text(
+        "SELECT DISTINCT activity_type, activity_name, activity_content, "
+        "estimated_duration_minutes, language, difficulty_level FROM activity_legacy"
+    )).all()
+
+    template_ids = {}
+    for row in distinct_rows:
+        template = ActivityTemplate(**row._mapping)
+        template.fingerprint = template_fingerprint(template)
+        existing_id = connection.execute(
+            text("SELECT id FROM activitytemplate WHERE fingerprint = :fp"), {"fp": template.fingerprint}
+        ).scalar()
+        if existing_id is None:
+            existing_id = connection.execute(
+                ActivityTemplate.__table__.insert().values(**template.model_dump(exclude={"id"}))
+            ).inserted_primary_key[0]
+        template_ids[tuple(row)] = existing_id
+
+    # 2. Copy assignments across in batches, keeping ids so progress rows still match
+    last_id = 0
+    while True:
+        rows = connection.execute(text(
+            "SELECT id, plan_id, child_id, activity_type, activity_name, activity_content, "
+            "estimated_duration_minutes, language, difficulty_level FROM activity_legacy "
+            "WHERE id > :last_id ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": COPY_BATCH_SIZE}).all()
+        if not rows:
+            break
+        connection.execute(Activity.__table__.insert(), [
+            {
+                "id": row.id,
+                "template_id": template_ids[tuple(row)[3:]],
+                "plan_id": row.plan_id,
+                "child_id": row.child_id,
+                "day": None,
+                "week": None,
+            }
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+    connection.execute(text("DROP TABLE activity_legacy"))
+
+
+def migrate_achievement_codes(connection: Connection) -> None:
+    """Replace per-award name/description/icon text with the badge's catalog code"""
+    columns = {c["name"] for c in inspect(connection).get_columns("achievement")}
+    if "achievement_name" not in columns:
+        return
+
+    print("🔴 Migrating achievement table to catalog codes")
+
+    for index in inspect(connection).get_indexes("achievement"):
+        connection.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+    connection.execute(text("ALTER TABLE achievement RENAME TO achievement_legacy"))
+    Achievement.__table__.create(connection)
+
+    # Map stored names to codes in SQL; duplicates of one badge collapse into a single row
+    params = {}
+    values = []
+    for i, definition in enumerate(ACHIEVEMENT_DEFINITIONS.values()):
+        params[f"name_{i}"] = definition["name"]
+        params[f"code_{i}"] = definition["code"]
+        values.append(f"(:name_{i}, :code_{i})")
+    connection.execute(text(
+        f"WITH codes(name, code) AS (VALUES {', '.join(values)}) "
+        "INSERT OR IGNORE INTO achievement (child_id, achievement_code, awarded_at) "
+        "SELECT a.child_id, codes.code, NULL FROM achievement_legacy a "
+        "JOIN codes ON codes.name = a.achievement_name WHERE a.child_id IS NOT NULL"
+    ), params)
+
+    connection.execute(text("DROP TABLE achievement_legacy"))
+
+
+def add_missing_columns(connection: Connection) -> List[str]:
+    """ALTER TABLE ADD COLUMN for nullable model columns missing from existing tables"""
+    added = []
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+            added.append(f"{table.name}.{column.name}")
+
+    return added
+
+
+def backfill_child_pointers(connection: Connection) -> None:
+    """Point each child at its newest assessment and that assessment's plan (set-based)"""
+    connection.execute(text(
+        "UPDATE child SET latest_assessment_id = "
+        "(SELECT MAX(assessment.id) FROM assessment WHERE assessment.child_id = child.id) "
+        "WHERE latest_assessment_id IS NULL"
+    ))
+    connection.execute(text(
+        "UPDATE child SET active_plan_id = "
+        "(SELECT MAX(learningplan.id) FROM learningplan WHERE learningplan.assessment_id = child.latest_assessment_id) "
+        "WHERE active_plan_id IS NULL AND latest_assessment_id IS NOT NULL"
+    ))
+
+
+def seed_child_progress(connection: Connection) -> None:
+    """
+    First run with per-child counters: derive them from activity history and split each
+    family's legacy Progress.total_score between its children by completed activities.
+    """
+    if connection.execute(text("SELECT 1 FROM childprogress LIMIT 1")).first():
+        return
+
+    connection.execute(text(
+        "WITH child_stats AS ("
+        "  SELECT a.child_id,"
+        "    SUM(CASE WHEN ap.completion_status = 'Completed' THEN 1 ELSE 0 END) AS completed,"
+        "    SUM(ap.total_time_spent_minutes) AS minutes"
+        "  FROM activity a JOIN activityprogress ap ON ap.activity_id = a.id GROUP BY a.child_id"
+        "), family AS ("
+        "  SELECT c.parent_id, SUM(COALESCE(cs.completed, 0)) AS completed, COUNT(*) AS children"
+        "  FROM child c LEFT JOIN child_stats cs ON cs.child_id = c.id GROUP BY c.parent_id"
+        ") "
+        "INSERT INTO childprogress (child_id, total_score, streak_days, total_time_minutes, activities_completed) "
+        "SELECT c.id,"
+        "  CASE WHEN f.completed > 0 THEN COALESCE(p.total_score, 0) * COALESCE(cs.completed, 0) / f.completed"
+        "       ELSE COALESCE(p.total_score, 0) / f.children END,"
+        "  COALESCE(p.streak_days, 0), COALESCE(cs.minutes, 0), COALESCE(cs.completed, 0) "
+        "FROM child c JOIN family f ON f.parent_id = c.parent_id "
+        "LEFT JOIN child_stats cs ON cs.child_id = c.id "
+        "LEFT JOIN (SELECT parent_id, MAX(total_score) AS total_score, MAX(streak_days) AS streak_days "
+        "           FROM progress GROUP BY parent_id) p ON p.parent_id = c.parent_id"
+    ))
+
+
+def seed_child_type_progress(connection: Connection) -> None:
+    """First run with per-type counters: count completed activities in main and the archive"""
+    if connection.execute(text("SELECT 1 FROM childtypeprogress LIMIT 1")).first():
+        return
+
+    # Read before this transaction writes anything (another connection reads the archive)
+    archived = get_archived_type_completions()
+    connection.execute(text(
+        "INSERT INTO childtypeprogress (child_id, activity_type, activities_completed) "
+        "SELECT a.child_id, t.activity_type, COUNT(*) "
+        "FROM activity a JOIN activityprogress ap ON ap.activity_id = a.id "
+        "JOIN activitytemplate t ON t.id = a.template_id "
+        "WHERE ap.completion_status = 'Completed' AND a.child_id IS NOT NULL "
+        "GROUP BY a.child_id, t.activity_type"
+    ))
+    if archived:
+        connection.execute(text(
+            "INSERT INTO childtypeprogress (child_id, activity_type, activities_completed) "
+            "VALUES (:child_id, :activity_type, :completed) "
+            "ON CONFLICT (child_id, activity_type) DO UPDATE SET activities_completed = activities_completed + excluded.activities_completed"
+        ), archived)
+
+
+def backfill_skill_names(connection: Connection) -> None:
+    """Snapshots written before skill names came from the item bank stored the raw skill key"""
+    for skill, skill_name in SKILL_DISPLAY_NAMES.items():
+        connection.execute(text(
+            "UPDATE skillsnapshot SET skill_name = :skill_name WHERE skill = :skill AND skill_name != :skill_name"
+        ), {"skill": skill, "skill_name": skill_name})
+
+
+def install_row_versions(connection: Connection) -> None:
+    """Counters and triggers stamping row_version; rows from before get their id as version"""
+    for table in VERSIONED_TABLES:
+        connection.execute(text(
+            "INSERT OR IGNORE INTO rowversion (table_name, version) VALUES (:table, 0)"
+        ), {"table": table})
+        if connection.execute(text(f'SELECT 1 FROM "{table}" WHERE row_version IS NULL LIMIT 1')).first():
+            connection.execute(text(f'UPDATE "{table}" SET row_version = id WHERE row_version IS NULL'))
+            connection.execute(text(
+                f'UPDATE rowversion SET version = MAX(version, (SELECT MAX(id) FROM "{table}")) WHERE table_name = :table'
+            ), {"table": table})
+
+        stamp = (
+            f"UPDATE rowversion SET version = version + 1 WHERE table_name = '{table}'; "
+            f'UPDATE "{table}" SET row_version = (SELECT version FROM rowversion WHERE table_name = \'{table}\') '
+            "WHERE id = NEW.id; "
+        )
+        connection.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS "{table}_row_version_insert" AFTER INSERT ON "{table}" '
+            f"BEGIN {stamp}END"
+        ))
+        # The WHEN clause skips the trigger's own row_version update
+        connection.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS "{table}_row_version_update" AFTER UPDATE ON "{table}" '
+            f"WHEN NEW.row_version IS OLD.row_version BEGIN {stamp}END"
+        ))
+
+
+def install_change_counters(connection: Connection) -> None:
+    """Triggers bumping a table's RowVersion counter on every insert, update and delete"""
+    for table in COUNTED_TABLES:
+        connection.execute(text(
+            "INSERT OR IGNORE INTO rowversion (table_name, version) VALUES (:table, 0)"
+        ), {"table": table})
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            connection.execute(text(
+                f'CREATE TRIGGER IF NOT EXISTS "{table}_change_{event.lower()}" AFTER {event} ON "{table}" '
+                f"BEGIN UPDATE rowversion SET version = version + 1 WHERE table_name = '{table}'; END"
+            ))
+
+
+def run_migrations(connection: Connection) -> None:
+    """Apply every pending migration (each one is a no-op once applied)"""
+    migrate_activity_templates(connection)
+    migrate_achievement_codes(connection)
+
+    added = add_missing_columns(connection)
+    if added:
+        print(f"🔴 Added columns: {', '.join(added)}")
+    if "child.latest_assessment_id" in added:
+        backfill_child_pointers(connection)
+
+    install_row_versions(connection)
+    install_change_counters(connection)
+    seed_child_progress(connection)
+    seed_child_type_progress(connection)
+    # Dashboards read skills only from snapshots: build them for assessments that predate them
+    backfill_skill_snapshots(connection=connection)
+    backfill_skill_names(connection)
@@ -1,5 +1,5 @@
 from typing import Optional, List  # Import Optional (for nullable fields) and List (for relationships) from typing module
-from sqlmodel import Field, SQLModel, Relationship  # Import key components from SQLModel for database definition
+from sqlmodel import Field, SQLModel, Relationship, Index  # Import key components from SQLModel for database definition
 from datetime import datetime, date  # Import datetime and date types for timestamp and date fields
 
 # --- 1. PARENT ENTITY ---
@@ -40,6 +40,12 @@ class Child(SQLModel, table=True):
     age: int
     # Foreign Key: Links this child to a specific Parent
     parent_id: Optional[int] = Field(default=None, foreign_key="parent.id")
+    # Denormalized pointers to the current context, maintained by submit_assessment
+    # (plain ids rather than foreign keys to avoid a child <-> assessment cycle)
+    latest_assessment_id: Optional[int] = None
+    active_plan_id: Optional[int] = None
+    # Set when the parent deleted the child and the subtree purge is still pending
+    deleted_at: Optional[datetime] = None
     
     # Relationship: Link back to the Parent
     parent: Optional[Parent] = Relationship(back_populates="children")
@@ -55,7 +61,7 @@ class Assessment(SQLModel, table=True):
     # Primary Key: Unique identifier for the assessment
     id: Optional[int] = Field(default=None, primary_key=True)
     # Foreign Key: Links assessment to a specific Child
-    child_id: int = Field(foreign_key="child.id")
+    child_id: int = Field(foreign_key="child.id", index=True)
     # Type of assessment (e.g., "Placement", "Progress Check")
     assessment_type: str
     # Total number of questions in the assessment
@@ -83,7 +89,7 @@ class AssessmentQuestion(SQLModel, table=True):
     # Primary Key: Unique identifier for the question record
     id: Optional[int] = Field(default=None, primary_key=True)
     # Foreign Key: Links to the parent Assessment
-    assessment_id: int = Field(foreign_key="assessment.id")
+    assessment_id: int = Field(foreign_key="assessment.id", index=True)
     # Type of question (e.g., "Multiple Choice", "Drag and Drop")
     question_type: str
     # Content of the question (text or JSON string)
@@ -105,7 +111,7 @@ class LearningPlan(SQLModel, table=True):
     # Primary Key: Unique identifier for the learning plan
     id: Optional[int] = Field(default=None, primary_key=True)
     # Foreign Key: Links plan to the Assessment that expanded it
-    assessment_id: int = Field(foreign_key="assessment.id")
+    assessment_id: int = Field(foreign_key="assessment.id", index=True)
     # Date when the plan was created
     plan_created_date: datetime = Field(default_factory=datetime.utcnow)
     # Duration of the plan in weeks
@@ -116,6 +122,8 @@ class LearningPlan(SQLModel, table=True):
     status: str
     # Projected end date
     plan_end_date: datetime
+    # When a reassessment replaced this plan (archival waits out its retention window from here)
+    superseded_at: Optional[datetime] = None
     # Focus areas description (e.g., "Vowels", "Phonics")
     focus_areas: str
     # Weekly goals description
@@ -127,27 +135,30 @@ class LearningPlan(SQLModel, table=True):
     activities: List["Activity"] = Relationship(back_populates="learning_plan")
 
 # --- 6. ACTIVITY ENTITY ---
+# A per-child assignment of a shared ActivityTemplate (name, content, etc. live on the template)
 class Activity(SQLModel, table=True):
+    # Covering index for child-scoped listings (progress history joins on it)
+    __table_args__ = (
+        Index("ix_activity_child_cover", "child_id", "id", "template_id"),
+        Index("ix_activity_row_version", "row_version"),
+    )
+
     # Primary Key: Unique identifier for the activity
     id: Optional[int] = Field(default=None, primary_key=True)
-    # Type of activity (e.g., "Game", "Video")
-    activity_type: str
-    # Display name of the activity
-    activity_name: str
-    # Content or URL for the activity
-    activity_content: str
-    # Estimated time to complete in minutes
-    estimated_duration_minutes: int
-    # Language of the activity
-    language: str = "English"
-    # Difficulty level (1-10 or "Easy", "Hard")
-    difficulty_level: str
+    # Foreign Key: The shared template describing this activity
+    template_id: int = Field(foreign_key="activitytemplate.id")
     # Foreign Key: Links activity to a Learning Plan
     plan_id: Optional[int] = Field(default=None, foreign_key="learningplan.id")
     # Foreign Key: Links activity to a specific Child (if assigned directly)
     child_id: Optional[int] = Field(default=None, foreign_key="child.id")
-    
+    # Position in the plan (1-7) and plan week (None for ad-hoc activities)
+    day: Optional[int] = None
+    week: Optional[int] = None
+    # Bumped by a trigger on every insert/update (see RowVersion); the columnar export's watermark
+    row_version: Optional[int] = None
+
     # Relationships
+    template: Optional["ActivityTemplate"] = Relationship()
     learning_plan: Optional[LearningPlan] = Relationship(back_populates="activities")
     child: Optional[Child] = Relationship(back_populates="activities")
     # Relationship to ActivityProgress linkage
@@ -156,6 +167,12 @@ class Activity(SQLModel, table=True):
 # --- 7. ACTIVITY_PROGRESS ENTITY ---
 # This is a link table or detailed status table for activity completion
 class ActivityProgress(SQLModel, table=True):
+    # Covering index so progress history is served without touching the table rows
+    __table_args__ = (
+        Index("ix_activityprogress_activity_cover", "activity_id", "id", "completion_status", "total_time_spent_minutes"),
+        Index("ix_activityprogress_row_version", "row_version"),
+    )
+
     # Primary Key (Composite typically, but using ID for simplicity in SQLModel)
     id: Optional[int] = Field(default=None, primary_key=True)
     # Foreign Key: Links to the Activity
@@ -167,6 +184,8 @@ class ActivityProgress(SQLModel, table=True):
     completion_status: str
     # Time spent on this specific attempt/record
     total_time_spent_minutes: int
+    # Bumped by a trigger on every insert/update (see RowVersion); the columnar export's watermark
+    row_version: Optional[int] = None
     
     # Relationships
     activity: Optional[Activity] = Relationship(back_populates="progress_records")
@@ -190,23 +209,26 @@ class Progress(SQLModel, table=True):
     activity_progress_items: List[ActivityProgress] = Relationship(back_populates="parent_progress")
 
 # --- 9. ACHIEVEMENT ENTITY ---
+# One compact row per award; names, icons and descriptions live in the in-memory catalog
 class Achievement(SQLModel, table=True):
-    # Primary Key
-    id: Optional[int] = Field(default=None, primary_key=True)
-    # Name of the achievement/badge
-    achievement_name: str
-    # Description of how to earn it
-    description: str
-    # Icon identifier or URL
-    badge_icon: str
-    # Foreign Key: Links to the Child who earned it
-    child_id: int = Field(foreign_key="child.id")
-    
+    # Primary Key / Foreign Key: Links to the Child who earned it
+    child_id: int = Field(foreign_key="child.id", primary_key=True)
+    # Primary Key: Catalog code of the badge (see utils/achievements.ACHIEVEMENT_DEFINITIONS)
+    achievement_code: int = Field(primary_key=True)
+    # When the badge was awarded (unknown for awards migrated from the old layout)
+    awarded_at: Optional[datetime] = None
+
     # Relationship: Link back to Child
     child: Optional[Child] = Relationship(back_populates="achievements")
 
 # --- 10. NOTIFICATION ENTITY ---
 class Notification(SQLModel, table=True):
+    # Feed reads go by parent; retention scans by read state and age
+    __table_args__ = (
+        Index("ix_notification_parent_sent", "parent_id", "sent_time"),
+        Index("ix_notification_read_scheduled", "is_read", "scheduled_time"),
+    )
+
     # Primary Key
     id: Optional[int] = Field(default=None, primary_key=True)
     # Type of notification (e.g., "Reminder", "Achievement")
@@ -226,3 +248,176 @@ class Notification(SQLModel, table=True):
     
     # Relationship: Link back to Parent
     parent: Optional[Parent] = Relationship(back_populates="notifications")
+
+# --- 11. ACTIVITY_TEMPLATE ENTITY ---
+# Deduplicated activity catalog shared by every child's plan (see utils/activity_catalog.py)
+class ActivityTemplate(SQLModel, table=True):
+    # Primary Key
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # Hash of the fields below, used to intern identical templates
+    fingerprint: str = Field(index=True, unique=True)
+    # Type of activity (e.g., "Game", "Video")
+    activity_type: str
+    # Display name of the activity
+    activity_name: str
+    # Content or URL for the activity
+    activity_content: str
+    # Estimated time to complete in minutes
+    estimated_duration_minutes: int
+    # Language of the activity
+    language: str = "English"
+    # Difficulty level (1-10 or "Easy", "Hard")
+    difficulty_level: str
+
+# --- 12. SKILL_SNAPSHOT ENTITY ---
+# Per-skill mastery of one assessment, written once at submission
+class SkillSnapshot(SQLModel, table=True):
+    # Primary Key
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # Foreign Key: The assessment this snapshot summarizes
+    assessment_id: int = Field(foreign_key="assessment.id", index=True)
+    # Skill category key (e.g., "phonics")
+    skill: str
+    # Display name shown on the dashboard
+    skill_name: str
+    # Number of questions for this skill and how many were correct
+    total_questions: int
+    correct_answers: int
+    # Mastery percentage (0-100)
+    mastery_percentage: int
+
+# --- 13. SKILL_MASTERY_POINT ENTITY ---
+# Append-only mastery time series (one point per child, skill and assessment)
+class SkillMasteryPoint(SQLModel, table=True):
+    # Range scans for history charts go through (child_id, skill, ts)
+    __table_args__ = (
+        Index("ix_skillmasterypoint_child_skill_ts", "child_id", "skill", "ts"),
+    )
+
+    # Primary Key
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # Foreign Key: The child this point belongs to
+    child_id: int = Field(foreign_key="child.id")
+    # Skill category key (e.g., "phonics")
+    skill: str
+    # When the mastery was measured (the assessment date)
+    ts: datetime
+    # Mastery percentage (0-100)
+    mastery_percentage: int
+    # Foreign Key: The assessment that produced this point
+    assessment_id: int = Field(foreign_key="assessment.id")
+
+# --- 14. CHILD_PROGRESS ENTITY ---
+# Per-child counters (one row per child, so siblings never write the same row).
+# Family totals are aggregated from these rows; Progress only anchors ActivityProgress.
+class ChildProgress(SQLModel, table=True):
+    # Primary Key / Foreign Key: The child these counters belong to
+    child_id: int = Field(foreign_key="child.id", primary_key=True)
+    # Total score accumulated
+    total_score: int = 0
+    # Consecutive active days ending at last_active_day (see utils/streaks.current_streak)
+    streak_days: int = 0
+    # Total minutes spent on activities
+    total_time_minutes: int = 0
+    # Number of distinct activities completed
+    activities_completed: int = 0
+    # When the child last recorded progress
+    last_active_at: Optional[datetime] = None
+    # Most recent active day, in the parent's timezone
+    last_active_day: Optional[date] = None
+
+# --- 15. DAILY_ACTIVITY ENTITY ---
+# One rollup row per child per local day; the source of truth for streaks.
+class DailyActivity(SQLModel, table=True):
+    # Primary Key / Foreign Key: The child this day belongs to
+    child_id: int = Field(foreign_key="child.id", primary_key=True)
+    # Primary Key: Calendar day in the parent's timezone
+    day: date = Field(primary_key=True)
+    # Progress events recorded that day
+    events: int = 0
+    # Activities completed for the first time that day
+    activities_completed: int = 0
+    # Score earned that day
+    score: int = 0
+    # Minutes spent that day
+    minutes: int = 0
+
+# --- 16. PARENT_INVITE ENTITY ---
+# One-time sign-up link for parents created by a roster import without a password
+class ParentInvite(SQLModel, table=True):
+    # Primary Key: SHA-256 of the invite token (the token itself is only handed out once)
+    token_hash: str = Field(primary_key=True)
+    # Foreign Key: The imported parent account the invite activates
+    parent_id: int = Field(foreign_key="parent.id", index=True)
+    # When the invite stops working
+    expires_at: datetime
+    # When the parent set their password (None while the invite is open)
+    accepted_at: Optional[datetime] = None
+
+# --- 17. CLASSROOM ENTITY ---
+# A teacher's group of children; the teacher is a regular account
+class Classroom(SQLModel, table=True):
+    # Primary Key: Unique identifier for the classroom
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # Display name (e.g., "Reception B")
+    name: str
+    # Foreign Key: The account that owns the classroom and sees its dashboard
+    teacher_id: int = Field(foreign_key="parent.id", index=True)
+    # Code parents enter to enrol a child
+    join_code: str = Field(index=True, unique=True)
+    # Bumped whenever membership or a member's data changes (keys the dashboard cache)
+    version: int = 0
+    # When the classroom was created
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# --- 18. CLASSROOM_MEMBER ENTITY ---
+class ClassroomMember(SQLModel, table=True):
+    # Primary Key / Foreign Key: The classroom
+    classroom_id: int = Field(foreign_key="classroom.id", primary_key=True)
+    # Primary Key / Foreign Key: The enrolled child (indexed for "which classrooms is this child in")
+    child_id: int = Field(foreign_key="child.id", primary_key=True, index=True)
+    # When the parent enrolled the child
+    joined_at: datetime = Field(default_factory=datetime.utcnow)
+
+# --- 19. PLACEMENT_TEST ENTITY ---
+# An adaptive placement test in progress; becomes an Assessment once the level converges
+class PlacementTest(SQLModel, table=True):
+    # Primary Key: Unique identifier for the test session
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # Foreign Key: The child taking the test
+    child_id: int = Field(foreign_key="child.id", index=True)
+    # Answers so far as JSON: [[item_id, selected_answer, time_spent_seconds], ...]
+    responses: str = "[]"
+    # Item currently shown to the child (answers to any other item are rejected)
+    current_item_id: Optional[int] = None
+    # Running ability estimate (logits) and its standard error
+    theta: float = 0.0
+    standard_error: float = 1.0
+    # "In Progress" or "Completed"
+    status: str = "In Progress"
+    # When the test was started
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    # Assessment written when the test completed
+    assessment_id: Optional[int] = None
+
+# --- 20. CHILD_TYPE_PROGRESS ENTITY ---
+# Completed activities per child per activity type. A rollup like ChildProgress, so badge
+# rules keep their counts when old plans' activities move to the archive.
+class ChildTypeProgress(SQLModel, table=True):
+    # Primary Key / Foreign Key: The child these counters belong to
+    child_id: int = Field(foreign_key="child.id", primary_key=True)
+    # Primary Key: Activity type (e.g., "Tracing")
+    activity_type: str = Field(primary_key=True)
+    # Number of distinct activities of this type completed
+    activities_completed: int = 0
+
+# --- 21. ROW_VERSION ENTITY ---
+# One counter per table whose rows change in place. Triggers stamp each inserted or
+# updated row with the next value, so "changed since" is a single indexed comparison.
+# A separate counter (not MAX(row_version)) never reuses values once rows are archived.
+# Counted-only tables (child, childprogress, dailyactivity) just bump their counter.
+class RowVersion(SQLModel, table=True):
+    # Primary Key: The versioned table
+    table_name: str = Field(primary_key=True)
+    # Last version handed out
+    version: int = 0
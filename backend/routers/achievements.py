@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlmodel import Session
+from typing import List
+from pydantic import BaseModel
+
+from ..database import get_session
+from ..models import Child, Parent
+from ..auth import get_current_user
+from ..utils.achievements import CATALOG_JSON, CATALOG_ETAG, ACHIEVEMENT_KEYS, get_child_achievement_codes, achievement_mask
+
+# Badge catalog (static, cacheable) and per-child earned sets
+router = APIRouter(prefix="/achievements", tags=["achievements"])
+
+class ChildAchievements(BaseModel):
+    child_id: int
+    codes: List[int]  # Catalog codes of the earned badges
+    mask: int  # Bit `code` set for each earned badge
+    achievement_ids: List[str]
+
+@router.get("/catalog")
+def get_catalog(request: Request):
+    """Every badge definition; clients revalidate with If-None-Match and get 304 until it changes"""
+    headers = {"ETag": CATALOG_ETAG, "Cache-Control": "public, max-age=3600"}
+    if request.headers.get("if-none-match") == CATALOG_ETAG:
+        return Response(status_code=304, headers=headers)
+    return Response(content=CATALOG_JSON, media_type="application/json", headers=headers)
+
+@router.get("/{child_id}", response_model=ChildAchievements)
+def get_child_achievements(child_id: int, session: Session = Depends(get_session), current_user: Parent = Depends(get_current_user)):
+    child = session.get(Child, child_id)
+    if not child:
+        raise HTTPException(status_code=404, detail="Child not found")
+    if child.parent_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    codes = sorted(get_child_achievement_codes(session, child_id))
+    return ChildAchievements(
+        child_id=child_id,
+        codes=codes,
+        mask=achievement_mask(codes),
+        achievement_ids=[ACHIEVEMENT_KEYS[code] for code in codes if code in ACHIEVEMENT_KEYS]
+    )
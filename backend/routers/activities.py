@@ -1,11 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException  # Import API Router and exception handlers
-from sqlmodel import Session, select  # Import Session and select for DB operations
+from fastapi import APIRouter, Depends, HTTPException, Query  # Import API Router and exception handlers
+from fastapi.responses import StreamingResponse  # Import streaming response for NDJSON exports
+from sqlmodel import Session, select, and_, or_  # Import Session and select for DB operations
 from typing import List, Optional  # Import typing helpers
 from pydantic import BaseModel  # Import BaseModel for input validation schemas
-from ..database import get_session  # Import DB session dependency
-from ..models import Activity, ActivityProgress, Progress, Child, Parent, Achievement, Notification  # Import all relevant models
+from ..database import get_session, engine  # Import DB session dependency and engine
+from ..models import Activity, ActivityTemplate, ActivityProgress, Progress, Child, Parent, Achievement, Notification  # Import all relevant models
+from ..auth import get_current_user
 from ..utils.achievements import check_and_award_achievements, get_child_achievement_ids
+from ..utils.activity_catalog import intern_templates, get_template
+from ..utils.child_progress import increment_child_progress, increment_type_completions
+from ..utils.streaks import parent_timezone, local_day, record_daily_activity
+from ..utils.leaderboard import leaderboards
+from ..utils.recommendations import recommender
+from ..utils.classrooms import touch_child_classrooms
+from ..utils.archival import get_archived_progress_page, is_archived_activity
 from datetime import datetime
+import json
 
 # Create router for activity-related endpoints
 router = APIRouter(prefix="/activities", tags=["activities"])
@@ -28,7 +38,7 @@ def record_progress(submission: ActivitySubmission, session: Session = Depends(g
     if not child:
         raise HTTPException(status_code=404, detail="Child not found")
     
-    # 2. Get or Create parent's main Progress record
+    # 2. Get or Create parent's main Progress record (anchors ActivityProgress rows; scores are per child)
     statement = select(Progress).where(Progress.parent_id == child.parent_id)
     progress_record = session.exec(statement).first()
     
@@ -53,18 +63,20 @@ def record_progress(submission: ActivitySubmission, session: Session = Depends(g
              # If we tried to look up by ID and failed, and no name provided, we can't create.
              # But for robustness, let's error if ID was intended but failed.
              if submission.activity_id:
+                  if is_archived_activity(submission.activity_id):
+                       raise HTTPException(status_code=410, detail="Activity belongs to an archived plan")
                   raise HTTPException(status_code=404, detail="Activity not found")
              else:
                   raise HTTPException(status_code=400, detail="Activity ID or Name required")
 
-        activity_record = Activity(
-            child_id=child.id,
+        template_id, = intern_templates([ActivityTemplate(
             activity_type=submission.activity_type.capitalize() if submission.activity_type else "Game",
             activity_name=submission.activity_name,
             activity_content="Generated from submission",
             estimated_duration_minutes=int(submission.duration_seconds / 60),
             difficulty_level="Medium"
-        )
+        )])
+        activity_record = Activity(child_id=child.id, template_id=template_id)
         session.add(activity_record)
         session.commit()
         session.refresh(activity_record)
@@ -77,6 +89,11 @@ def record_progress(submission: ActivitySubmission, session: Session = Depends(g
     )
     activity_progress = session.exec(statement).first()
 
+    # Only the first completion of an activity counts towards the child's completed total
+    newly_completed = submission.completed and (
+        not activity_progress or activity_progress.completion_status != "Completed"
+    )
+
     if activity_progress:
         # Update existing
         activity_progress.completion_status = "Completed" if submission.completed else activity_progress.completion_status
@@ -92,14 +109,39 @@ def record_progress(submission: ActivitySubmission, session: Session = Depends(g
     
     session.add(activity_progress)
 
-    # 5. Update Parent's Total Score
-    progress_record.total_score += submission.score
-    session.add(progress_record)
+    # 5. Update the child's own counters, streak and daily rollup (atomic upserts, no shared family row)
+    now = datetime.utcnow()
+    today = local_day(parent_timezone(session.get(Parent, child.parent_id)), now)
+    increment_child_progress(
+        session,
+        child_id=child.id,
+        score=submission.score,
+        minutes=int(submission.duration_seconds / 60),
+        completed=1 if newly_completed else 0,
+        at=now,
+        day=today
+    )
+    record_daily_activity(
+        session,
+        child_id=child.id,
+        day=today,
+        score=submission.score,
+        minutes=int(submission.duration_seconds / 60),
+        completed=1 if newly_completed else 0
+    )
+    if newly_completed:
+        increment_type_completions(session, child.id, get_template(session, activity_record.template_id).activity_type)
+    touch_child_classrooms(session, child.id)
 
     # Commit base changes
     session.commit()
     session.refresh(activity_progress)
 
+    # Feed the in-memory leaderboards (only after the score is durable)
+    leaderboards.record_score(child.id, child.age, child.current_level, submission.score, today)
+    # ...and the child's cached recommendation vector
+    recommender.record_progress(session, child.id, activity_record.id, activity_record.template_id, submission.completed)
+
     # --- GAMIFICATION ENGINE ---
     # 6. Check for Achievements using comprehensive system
     achievements_earned = check_and_award_achievements(
@@ -112,7 +154,8 @@ def record_progress(submission: ActivitySubmission, session: Session = Depends(g
 
     # 7. Create Notifications for Parent
     if submission.completed:
-        msg = f"{child.name} completed '{activity_record.activity_name}'!"
+        template = get_template(session, activity_record.template_id)
+        msg = f"{child.name} completed '{template.activity_name}'!"
         if achievements_earned:
             msg += f" And earned {len(achievements_earned)} badge(s)!"
 
@@ -129,12 +172,169 @@ def record_progress(submission: ActivitySubmission, session: Session = Depends(g
 
     return activity_progress
 
-# Endpoint to get progress (Needs to join tables now)
-# NOTE: Returning raw ActivityProgress list might be scarce on info, 
-# but sticking to schema return types for now.
-@router.get("/progress/{child_id}", response_model=List[ActivityProgress])
-def get_child_progress(child_id: int, session: Session = Depends(get_session)):
-    # Join ActivityProgress with Activity to filter by child_id
-    statement = select(ActivityProgress).join(Activity).where(Activity.child_id == child_id)
-    results = session.exec(statement)
-    return results.all()
+# Output Schemas for progress history (progress joined with its activity details)
+class ActivityProgressItem(BaseModel):
+    id: int
+    activity_id: int
+    activity_name: str
+    activity_type: str
+    completion_status: str
+    total_time_spent_minutes: int
+    archived: bool = False  # From a plan moved to the archive (read-only)
+
+class ActivityProgressPage(BaseModel):
+    items: List[ActivityProgressItem]
+    # Opaque cursor for the next page ("<activity_id>:<progress_id>", prefixed "archive:"
+    # once live history is exhausted), None on the last page
+    next_cursor: Optional[str] = None
+
+# Output Schema for a recommended next activity
+class RecommendedActivity(BaseModel):
+    activity_id: int
+    activity_name: str
+    activity_type: str
+    difficulty_level: str
+    week: Optional[int]
+    day: Optional[int]
+    skill: str  # Skill key the activity mainly practises for this child
+    reason: str
+    score: float
+
+EXPORT_BATCH_SIZE = 500
+ARCHIVE_CURSOR_PREFIX = "archive:"
+
+def _authorize_child(session: Session, child_id: int, current_user: Parent) -> Child:
+    child = session.get(Child, child_id)
+    if not child:
+        raise HTTPException(status_code=404, detail="Child not found")
+    if child.parent_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return child
+
+def _parse_cursor(cursor: Optional[str]):
+    """(in archive phase, (activity_id, progress_id) or None)"""
+    if not cursor:
+        return False, None
+    archived = cursor.startswith(ARCHIVE_CURSOR_PREFIX)
+    if archived:
+        cursor = cursor[len(ARCHIVE_CURSOR_PREFIX):]
+    try:
+        activity_id, progress_id = cursor.split(":")
+        return archived, (int(activity_id), int(progress_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _progress_page_query(child_id: int, status: Optional[str], after, limit: int):
+    """Keyset page of a child's progress, ordered the same way as the covering indexes"""
+    statement = select(
+        ActivityProgress.id,
+        ActivityProgress.activity_id,
+        ActivityTemplate.activity_name,
+        ActivityTemplate.activity_type,
+        ActivityProgress.completion_status,
+        ActivityProgress.total_time_spent_minutes
+    ).select_from(ActivityProgress).join(
+        Activity, ActivityProgress.activity_id == Activity.id
+    ).join(
+        ActivityTemplate, Activity.template_id == ActivityTemplate.id
+    ).where(Activity.child_id == child_id)
+
+    if status:
+        statement = statement.where(ActivityProgress.completion_status == status)
+
+    if after:
+        activity_id, progress_id = after
+        statement = statement.where(or_(
+            Activity.id > activity_id,
+            and_(Activity.id == activity_id, ActivityProgress.id > progress_id)
+        ))
+
+    return statement.order_by(Activity.id, ActivityProgress.id).limit(limit)
+
+# Endpoint to get a page of a child's progress history with activity details
+@router.get("/progress/{child_id}", response_model=ActivityProgressPage)
+def get_child_progress(
+    child_id: int,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    session: Session = Depends(get_session),
+    current_user: Parent = Depends(get_current_user)
+):
+    _authorize_child(session, child_id, current_user)
+    archived, after = _parse_cursor(cursor)
+
+    # Live history first, then archived plans'; fetch one extra row to know whether another page exists
+    items = []
+    if not archived:
+        items = [
+            ActivityProgressItem(**row._mapping)
+            for row in session.exec(_progress_page_query(child_id, status, after, limit + 1)).all()
+        ]
+        after = None
+    if len(items) <= limit:
+        items += [
+            ActivityProgressItem(archived=True, **row)
+            for row in get_archived_progress_page(child_id, status, after, limit + 1 - len(items))
+        ]
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = f"{ARCHIVE_CURSOR_PREFIX if last.archived else ''}{last.activity_id}:{last.id}"
+
+    return ActivityProgressPage(items=items, next_cursor=next_cursor)
+
+# Endpoint to rank the open activities of a child's plan by how the child is doing
+@router.get("/recommendations/{child_id}", response_model=List[RecommendedActivity])
+def get_recommendations(
+    child_id: int,
+    limit: int = Query(3, ge=1, le=20),
+    session: Session = Depends(get_session),
+    current_user: Parent = Depends(get_current_user)
+):
+    child = _authorize_child(session, child_id, current_user)
+    recommendations = []
+    for item in recommender.recommend(session, child, limit):
+        template = get_template(session, item.pop("template_id"))
+        recommendations.append(RecommendedActivity(
+            activity_name=template.activity_name,
+            activity_type=template.activity_type,
+            difficulty_level=template.difficulty_level,
+            **item
+        ))
+    return recommendations
+
+# Endpoint to stream a child's full progress history as NDJSON (one item per line)
+@router.get("/progress/{child_id}/export")
+def export_child_progress(
+    child_id: int,
+    status: Optional[str] = None,
+    session: Session = Depends(get_session),
+    current_user: Parent = Depends(get_current_user)
+):
+    _authorize_child(session, child_id, current_user)
+
+    def generate():
+        # Own session: the request session may be closed before the body finishes streaming
+        with Session(engine) as export_session:
+            after = None
+            while True:
+                rows = export_session.exec(_progress_page_query(child_id, status, after, EXPORT_BATCH_SIZE)).all()
+                for row in rows:
+                    yield json.dumps(dict(row._mapping)) + "\n"
+                if len(rows) < EXPORT_BATCH_SIZE:
+                    break
+                after = (rows[-1].activity_id, rows[-1].id)
+
+        after = None
+        while True:
+            rows = get_archived_progress_page(child_id, status, after, EXPORT_BATCH_SIZE)
+            for row in rows:
+                yield json.dumps({**row, "archived": True}) + "\n"
+            if len(rows) < EXPORT_BATCH_SIZE:
+                break
+            after = (rows[-1]["activity_id"], rows[-1]["id"])
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+import os
+
+from ..models import Parent
+from ..auth import get_current_user
+from ..utils.profiling import sample_worker, read_request_profile, format_collapsed, PROFILE_MAX_SECONDS
+
+# Operator-only diagnostics; access is granted by email through ADMIN_EMAILS (comma-separated)
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+def require_admin(current_user: Parent = Depends(get_current_user)) -> Parent:
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return current_user
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    admin: Parent = Depends(require_admin)
+):
+    """Sample every thread of the worker that serves this request; returns collapsed stacks"""
+    if seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"'seconds' must be at most {PROFILE_MAX_SECONDS}")
+    try:
+        stacks = await sample_worker(seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        format_collapsed(stacks),
+        headers={
+            "X-Profile-Samples": str(sum(stacks.values())),
+            "X-Profile-Worker": str(os.getpid()),
+            "Content-Disposition": f'attachment; filename="profile-{os.getpid()}.collapsed"'
+        }
+    )
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def get_request_profile(profile_id: str, admin: Parent = Depends(require_admin)):
+    """A per-request profile (id from the X-Profile-Id response header); values are microseconds"""
+    profile = read_request_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile)
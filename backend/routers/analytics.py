@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Dict, List
+from pydantic import BaseModel
+from datetime import datetime
+
+from ..models import Parent
+from ..auth import get_current_user
+from ..utils.cohort_analytics import get_cohort_analytics, DIMENSIONS
+
+# Aggregate (never per-child) distributions across every assessment, served from a TTL cache
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+class AccuracyDistribution(BaseModel):
+    count: int
+    mean: float
+    percentiles: Dict[str, float]  # p10, p25, p50, p75, p90
+    histogram: List[int]  # Counts per histogram_bins interval
+
+class SkillMean(BaseModel):
+    skill: str
+    skill_name: str
+    mean_mastery: float
+    samples: int
+
+class Cohort(BaseModel):
+    value: str
+    assessments: int
+    children: int
+    accuracy: AccuracyDistribution
+    skills: List[SkillMean]
+
+class CohortAnalytics(BaseModel):
+    dimension: str
+    generated_at: datetime
+    histogram_bins: List[int]
+    cohorts: List[Cohort]
+
+@router.get("/cohorts", response_model=CohortAnalytics)
+def get_cohorts(
+    by: str = Query("level", description="age, level or native_language"),
+    current_user: Parent = Depends(get_current_user)
+):
+    if by not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"'by' must be one of: {', '.join(DIMENSIONS)}")
+
+    result = get_cohort_analytics(by)
+    return CohortAnalytics(**{**result, "generated_at": datetime.utcfromtimestamp(result["generated_at"])})
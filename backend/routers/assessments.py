@@ -1,12 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from sqlmodel import Session, select, update, delete
 from typing import List, Optional, Dict
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 import json
 
 from ..database import get_session
-from ..models import Assessment, AssessmentQuestion, LearningPlan, Activity, Child
+from ..models import Assessment, AssessmentQuestion, LearningPlan, Activity, ActivityTemplate, ActivityProgress, Child, PlacementTest
+from ..utils.activity_catalog import intern_templates
+from ..utils.skill_snapshots import build_skill_snapshots
+from ..utils.skill_history import record_mastery_points
+from ..utils.leaderboard import leaderboards
+from ..utils.recommendations import recommender
+from ..utils.classrooms import touch_child_classrooms
+from ..utils.tracing import traced, section
+from ..utils.item_bank import (
+    SKILL_DISPLAY_NAMES, ITEMS_BY_ID, skill_of, next_item, estimate_ability, is_converged
+)
 
 router = APIRouter(prefix="/assessments", tags=["assessments"])
 
@@ -43,6 +53,28 @@ class AssessmentResult(BaseModel):
     weaknesses: List[str]
     recommendations: List[str]
 
+class AdaptiveStart(BaseModel):
+    child_id: int
+
+class AdaptiveAnswer(BaseModel):
+    item_id: int
+    selected_answer: str
+    time_spent: int = 0
+
+class AdaptiveItem(BaseModel):
+    id: int
+    skill: str
+    type: str
+    prompt: str
+    options: List[Dict[str, str]]
+
+class AdaptiveTestState(BaseModel):
+    test_id: int
+    answered: int
+    done: bool
+    item: Optional[AdaptiveItem] = None  # Next item to show (None once done)
+    result: Optional[AssessmentResult] = None  # Placement, once done
+
 # ==================== HELPER FUNCTIONS ====================
 
 def generate_weekly_goals(level: str, skill_analyses: List[SkillAnalysis], duration_weeks: int) -> str:
@@ -234,8 +266,8 @@ def generate_weekly_goals(level: str, skill_analyses: List[SkillAnalysis], durat
     return json.dumps(weekly_goals)
 
 
-def generate_week_activities(week_num: int, level: str, skill_analyses: List[SkillAnalysis], child_id: int, plan_id: int) -> List[Activity]:
-    """Generate PERSONALIZED activities based on child's specific skill weaknesses"""
+def generate_week_activities(week_num: int, level: str, skill_analyses: List[SkillAnalysis]) -> List[ActivityTemplate]:
+    """Generate PERSONALIZED activities (one template per day) based on child's specific skill weaknesses"""
     activities = []
     days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 
@@ -252,22 +284,22 @@ def generate_week_activities(week_num: int, level: str, skill_analyses: List[Ski
                 # Focus on letter recognition if it's weak
                 if primary_weakness and "Letter" in primary_weakness.skill_name:
                     if day_num % 2 == 0:
-                        activities.append(Activity(
-                            plan_id=plan_id, child_id=child_id, activity_type="Game",
+                        activities.append(ActivityTemplate(
+                            activity_type="Game",
                             activity_name=f"Letter Hunt - Day {day_num}",
                             activity_content=f"Find and identify letters (Focus: {primary_weakness.skill_name})",
                             estimated_duration_minutes=15, difficulty_level="Easy"
                         ))
                     else:
-                        activities.append(Activity(
-                            plan_id=plan_id, child_id=child_id, activity_type="Tracing",
+                        activities.append(ActivityTemplate(
+                            activity_type="Tracing",
                             activity_name=f"Letter Tracing - Day {day_num}",
                             activity_content=f"Trace letters while saying sounds ({primary_weakness.skill_name})",
                             estimated_duration_minutes=12, difficulty_level="Easy"
                         ))
                 else:
-                    activities.append(Activity(
-                        plan_id=plan_id, child_id=child_id, activity_type="Game",
+                    activities.append(ActivityTemplate(
+                        activity_type="Game",
                         activity_name=f"Phonics Match - Day {day_num}",
                         activity_content=f"Match sounds to letters (Week {week_num})",
                         estimated_duration_minutes=12, difficulty_level="Easy"
@@ -276,23 +308,23 @@ def generate_week_activities(week_num: int, level: str, skill_analyses: List[Ski
             elif week_num <= 4:
                 # Phonics focus
                 if primary_weakness and "Phonics" in primary_weakness.skill_name:
-                    activities.append(Activity(
-                        plan_id=plan_id, child_id=child_id, activity_type="Game",
+                    activities.append(ActivityTemplate(
+                        activity_type="Game",
                         activity_name=f"Phonics Practice - Day {day_num}",
                         activity_content=f"Practice letter sounds you found difficult (Target: 70% mastery)",
                         estimated_duration_minutes=15, difficulty_level="Easy"
                     ))
                 else:
-                    activities.append(Activity(
-                        plan_id=plan_id, child_id=child_id, activity_type="Game",
+                    activities.append(ActivityTemplate(
+                        activity_type="Game",
                         activity_name=f"Letter Hunt - Day {day_num}",
                         activity_content="Find letters and match sounds",
                         estimated_duration_minutes=12, difficulty_level="Easy"
                     ))
 
             else:
-                activities.append(Activity(
-                    plan_id=plan_id, child_id=child_id, activity_type="Reading",
+                activities.append(ActivityTemplate(
+                    activity_type="Reading",
                     activity_name=f"Story Time - Day {day_num}",
                     activity_content=f"Read simple {day} story together",
                     estimated_duration_minutes=15, difficulty_level="Easy"
@@ -303,29 +335,29 @@ def generate_week_activities(week_num: int, level: str, skill_analyses: List[Ski
             if primary_weakness:
                 skill_focus = primary_weakness.skill_name
                 if day_num % 3 == 0:
-                    activities.append(Activity(
-                        plan_id=plan_id, child_id=child_id, activity_type="Game",
+                    activities.append(ActivityTemplate(
+                        activity_type="Game",
                         activity_name=f"{skill_focus} Challenge - Day {day_num}",
                         activity_content=f"Targeted practice on {skill_focus} (Current: {primary_weakness.mastery_percentage}%, Goal: 80%)",
                         estimated_duration_minutes=18, difficulty_level="Medium"
                     ))
                 elif day_num % 3 == 1:
-                    activities.append(Activity(
-                        plan_id=plan_id, child_id=child_id, activity_type="Tracing",
+                    activities.append(ActivityTemplate(
+                        activity_type="Tracing",
                         activity_name=f"Word Tracing - Day {day_num}",
                         activity_content=f"Trace CVC words focusing on {skill_focus}",
                         estimated_duration_minutes=12, difficulty_level="Medium"
                     ))
                 else:
-                    activities.append(Activity(
-                        plan_id=plan_id, child_id=child_id, activity_type="Reading",
+                    activities.append(ActivityTemplate(
+                        activity_type="Reading",
                         activity_name=f"Reading Practice - Day {day_num}",
                         activity_content=f"Read simple sentences applying {skill_focus}",
                         estimated_duration_minutes=15, difficulty_level="Medium"
                     ))
             else:
-                activities.append(Activity(
-                    plan_id=plan_id, child_id=child_id, activity_type="Game",
+                activities.append(ActivityTemplate(
+                    activity_type="Game",
                     activity_name=f"Phonics Game - Day {day_num}",
                     activity_content="Practice phonics and word building",
                     estimated_duration_minutes=15, difficulty_level="Medium"
@@ -333,15 +365,15 @@ def generate_week_activities(week_num: int, level: str, skill_analyses: List[Ski
 
         else:  # Advanced
             if primary_weakness:
-                activities.append(Activity(
-                    plan_id=plan_id, child_id=child_id, activity_type="Game",
+                activities.append(ActivityTemplate(
+                    activity_type="Game",
                     activity_name=f"{primary_weakness.skill_name} Mastery - Day {day_num}",
                     activity_content=f"Advanced practice on {primary_weakness.skill_name} (Target: 90% mastery)",
                     estimated_duration_minutes=20, difficulty_level="Hard"
                 ))
             else:
-                activities.append(Activity(
-                    plan_id=plan_id, child_id=child_id, activity_type="Reading",
+                activities.append(ActivityTemplate(
+                    activity_type="Reading",
                     activity_name=f"Chapter Reading - Day {day_num}",
                     activity_content=f"Read chapter {(week_num * 7 + day_num) // 14}",
                     estimated_duration_minutes=25, difficulty_level="Hard"
@@ -350,29 +382,48 @@ def generate_week_activities(week_num: int, level: str, skill_analyses: List[Ski
     return activities
 
 
-def analyze_skills(submission: AssessmentSubmission) -> List[SkillAnalysis]:
+def carry_over_plan_activities(session: Session, old_plan: LearningPlan, new_plan: LearningPlan, slots: Dict[tuple, int]) -> Dict[tuple, int]:
+    """
+    Reassessment diff, updating rows in place rather than re-inserting them:
+    - started/completed activities move onto the new plan in their slot, progress and all
+    - unstarted activities take their slot's new template (unchanged if it is the same)
+    - unstarted activities in slots the new plan doesn't have are deleted
+    Returns the slots that still need a new Activity row.
+    """
+    has_progress = select(ActivityProgress.id).where(ActivityProgress.activity_id == Activity.id).exists()
+    rows = session.exec(
+        select(Activity.id, Activity.week, Activity.day, Activity.template_id, has_progress)
+        .where(Activity.plan_id == old_plan.id)
+        .order_by(has_progress.desc(), Activity.id)  # started rows claim their slot first
+    ).all()
+
+    remaining = dict(slots)
+    moves = []
+    delete_ids = []
+    for activity_id, week, day, template_id, started in rows:
+        if started:
+            # Kept even outside the new plan's weeks so completed work never drops off the dashboard
+            remaining.pop((week, day), None)
+            moves.append({"id": activity_id, "plan_id": new_plan.id, "template_id": template_id})
+        elif (week, day) in remaining:
+            moves.append({"id": activity_id, "plan_id": new_plan.id, "template_id": remaining.pop((week, day))})
+        else:
+            delete_ids.append(activity_id)
+
+    if moves:
+        session.execute(update(Activity), moves)
+    if delete_ids:
+        session.execute(delete(Activity).where(Activity.id.in_(delete_ids)))
+
+    return remaining
+
+
+def analyze_skills(answers: List[QuestionAnswer]) -> List[SkillAnalysis]:
     """AI-powered skill analysis based on assessment results"""
     skill_data: Dict[str, Dict] = {}
 
-    skill_mapping = {
-        1: "letter_recognition", 2: "letter_recognition", 3: "letter_recognition", 4: "letter_recognition",
-        5: "phonics", 6: "phonics", 7: "phonics", 8: "phonics",
-        9: "rhyming", 10: "rhyming", 11: "rhyming",
-        12: "grammar", 13: "grammar",
-        14: "reading_fluency", 15: "reading_fluency"
-    }
-
-    skill_display_names = {
-        "letter_recognition": "Letter Recognition",
-        "phonics": "Phonics & Sounds",
-        "rhyming": "Rhyming Patterns",
-        "grammar": "Grammar & Word Structure",
-        "reading_fluency": "Reading Fluency"
-    }
-
-    for answer in submission.answers:
-        q_id = answer.question_id
-        skill = skill_mapping.get(q_id, "general")
+    for answer in answers:
+        skill = skill_of(answer.question_id)
 
         if skill not in skill_data:
             skill_data[skill] = {"total": 0, "correct": 0, "time_total": 0, "questions": []}
@@ -402,20 +453,20 @@ def analyze_skills(submission: AssessmentSubmission) -> List[SkillAnalysis]:
         weaknesses = []
 
         if mastery >= 80:
-            strengths.append(f"Strong understanding of {skill_display_names.get(skill, skill)}")
+            strengths.append(f"Strong understanding of {SKILL_DISPLAY_NAMES.get(skill, skill)}")
         elif mastery >= 50:
-            strengths.append(f"Developing {skill_display_names.get(skill, skill)} skills")
-            weaknesses.append(f"Needs more practice with {skill_display_names.get(skill, skill)}")
+            strengths.append(f"Developing {SKILL_DISPLAY_NAMES.get(skill, skill)} skills")
+            weaknesses.append(f"Needs more practice with {SKILL_DISPLAY_NAMES.get(skill, skill)}")
         else:
-            weaknesses.append(f"Requires focused practice on {skill_display_names.get(skill, skill)}")
+            weaknesses.append(f"Requires focused practice on {SKILL_DISPLAY_NAMES.get(skill, skill)}")
 
         if avg_time > 30:
-            weaknesses.append(f"Taking too long on {skill_display_names.get(skill, skill)} questions")
+            weaknesses.append(f"Taking too long on {SKILL_DISPLAY_NAMES.get(skill, skill)} questions")
         elif avg_time < 5 and mastery >= 80:
-            strengths.append(f"Quick and accurate with {skill_display_names.get(skill, skill)}")
+            strengths.append(f"Quick and accurate with {SKILL_DISPLAY_NAMES.get(skill, skill)}")
 
         skill_analyses.append(SkillAnalysis(
-            skill_name=skill_display_names.get(skill, skill),
+            skill_name=SKILL_DISPLAY_NAMES.get(skill, skill),
             total_questions=total,
             correct_answers=correct,
             mastery_percentage=mastery,
@@ -428,70 +479,95 @@ def analyze_skills(submission: AssessmentSubmission) -> List[SkillAnalysis]:
     return skill_analyses
 
 
-# ==================== ROUTE HANDLERS ====================
+LEVEL_FOCUS = {
+    "Beginner": "Letter Recognition",
+    "Intermediate": "Phonics & Sound Blending",
+    "Advanced": "Reading Comprehension & Fluency",
+}
+
+
+@traced
+def complete_assessment(
+    session: Session,
+    child: Child,
+    answers: List[QuestionAnswer],
+    level: Optional[str] = None,
+    assessment_type: str = "Enhanced Placement Test"
+) -> AssessmentResult:
+    """
+    Score the answers and write the assessment, its questions, skill snapshots and the new plan.
+    level: placement decided by the caller (adaptive test); otherwise derived from accuracy.
+    """
+    total_questions = len(answers)
+    correct_count = sum(1 for a in answers if a.selected_answer == a.correct_answer)
+    accuracy = (correct_count / total_questions) * 100 if total_questions > 0 else 0
 
-@router.post("/submit", response_model=AssessmentResult)
-def submit_assessment(submission: AssessmentSubmission, session: Session = Depends(get_session)):
-    child = session.get(Child, submission.child_id)
-    if not child:
-        raise HTTPException(status_code=404, detail="Child not found")
+    section("score and place")
+    skill_analyses = analyze_skills(answers)
 
-    total_questions = len(submission.answers)
-    correct_count = sum(1 for a in submission.answers if a.selected_answer == a.correct_answer)
-    accuracy = (correct_count / total_questions) * 100 if total_questions > 0 else 0
+    if level is None:
+        letter_recog_mastery = next((s for s in skill_analyses if "Letter" in s.skill_name), None)
+        phonics_mastery = next((s for s in skill_analyses if "Phonics" in s.skill_name), None)
+
+        if accuracy < 50 or (letter_recog_mastery and letter_recog_mastery.mastery_percentage < 60):
+            level = "Beginner"
+        elif accuracy < 75 or (phonics_mastery and phonics_mastery.mastery_percentage < 70):
+            level = "Intermediate"
+        else:
+            level = "Advanced"
+    focus = LEVEL_FOCUS[level]
 
-    skill_analyses = analyze_skills(submission)
+    duration_weeks = 8 if level == "Beginner" else 6
 
-    letter_recog_mastery = next((s for s in skill_analyses if "Letter" in s.skill_name), None)
-    phonics_mastery = next((s for s in skill_analyses if "Phonics" in s.skill_name), None)
+    section("intern plan templates")
+    # Plan activities only reference the shared template catalog.
+    # Intern them first: the catalog commits on its own connection, before we take the write lock.
+    slots = []
+    templates = []
+    for week_num in range(1, duration_weeks + 1):
+        for day_num, template in enumerate(generate_week_activities(week_num, level, skill_analyses), 1):
+            slots.append((week_num, day_num))
+            templates.append(template)
 
-    if accuracy < 50 or (letter_recog_mastery and letter_recog_mastery.mastery_percentage < 60):
-        level = "Beginner"
-        focus = "Letter Recognition"
-    elif accuracy < 75 or (phonics_mastery and phonics_mastery.mastery_percentage < 70):
-        level = "Intermediate"
-        focus = "Phonics & Sound Blending"
-    else:
-        level = "Advanced"
-        focus = "Reading Comprehension & Fluency"
+    template_ids = intern_templates(templates)
+    slot_templates = dict(zip(slots, template_ids))
 
-    child.current_level = level
-    session.add(child)
+    previous_plan = session.get(LearningPlan, child.active_plan_id) if child.active_plan_id else None
 
+    section("write assessment and plan")
+    # Everything below is written in a single transaction, so the child's
+    # latest-assessment / active-plan pointers never disagree with the rows they point at
     assessment = Assessment(
         child_id=child.id,
-        assessment_type="Enhanced Placement Test",
+        assessment_type=assessment_type,
         total_questions=total_questions,
         correct_answers=correct_count,
         accuracy_percentage=accuracy,
         skill_level_result=level,
-        is_initial=True
+        is_initial=child.latest_assessment_id is None
     )
     session.add(assessment)
-    session.commit()
-    session.refresh(assessment)
+    session.flush()
 
-    skill_mapping = {
-        1: "letter_recognition", 2: "letter_recognition", 3: "letter_recognition", 4: "letter_recognition",
-        5: "phonics", 6: "phonics", 7: "phonics", 8: "phonics",
-        9: "rhyming", 10: "rhyming", 11: "rhyming",
-        12: "grammar", 13: "grammar",
-        14: "reading_fluency", 15: "reading_fluency"
-    }
-
-    for answer in submission.answers:
+    question_records = []
+    for answer in answers:
         question_record = AssessmentQuestion(
             assessment_id=assessment.id,
-            question_type=skill_mapping.get(answer.question_id, "general"),
+            question_type=skill_of(answer.question_id),
             question_content=answer.question_content,
             child_answer=answer.selected_answer,
             correct_answer=answer.correct_answer,
             time_spent_seconds=answer.time_spent,
             is_correct=(answer.selected_answer == answer.correct_answer)
         )
-        session.add(question_record)
+        question_records.append(question_record)
+    session.add_all(question_records)
 
-    duration_weeks = 8 if level == "Beginner" else 6
+    # Persist the per-skill summary so the dashboard never re-reads these questions
+    snapshots = build_skill_snapshots(assessment.id, question_records)
+    session.add_all(snapshots)
+    # Extend the child's mastery history for progress charts
+    record_mastery_points(session, child.id, assessment.id, assessment.assessment_date, snapshots)
 
     plan = LearningPlan(
         assessment_id=assessment.id,
@@ -503,18 +579,30 @@ def submit_assessment(submission: AssessmentSubmission, session: Session = Depen
         weekly_goals=generate_weekly_goals(level, skill_analyses, duration_weeks)
     )
     session.add(plan)
-    session.commit()
-    session.refresh(plan)
+    session.flush()
 
-    activities_to_create = []
-    for week_num in range(1, duration_weeks + 1):
-        week_activities = generate_week_activities(week_num, level, skill_analyses, child.id, plan.id)
-        activities_to_create.extend(week_activities)
+    # Reassessment: only write the slots that changed, and retire the old plan
+    if previous_plan and previous_plan.status == "Active":
+        slot_templates = carry_over_plan_activities(session, previous_plan, plan, slot_templates)
+        previous_plan.status = "Superseded"
+        previous_plan.superseded_at = datetime.utcnow()
+        session.add(previous_plan)
 
-    for activity in activities_to_create:
-        session.add(activity)
+    session.add_all([
+        Activity(template_id=template_id, plan_id=plan.id, child_id=child.id, week=week_num, day=day_num)
+        for (week_num, day_num), template_id in slot_templates.items()
+    ])
 
+    child.current_level = level
+    child.latest_assessment_id = assessment.id
+    child.active_plan_id = plan.id
+    session.add(child)
+    touch_child_classrooms(session, child.id)
     session.commit()
+    section("caches and result")
+    # A new level moves the child to another leaderboard cohort
+    leaderboards.update_child(child.id, child.age, level)
+    recommender.invalidate(child.id)
 
     strengths = []
     weaknesses = []
@@ -553,3 +641,83 @@ def submit_assessment(submission: AssessmentSubmission, session: Session = Depen
         weaknesses=list(set(weaknesses))[:5],
         recommendations=recommendations[:5]
     )
+
+
+# ==================== ROUTE HANDLERS ====================
+
+@router.post("/submit", response_model=AssessmentResult)
+def submit_assessment(submission: AssessmentSubmission, session: Session = Depends(get_session)):
+    child = session.get(Child, submission.child_id)
+    if not child:
+        raise HTTPException(status_code=404, detail="Child not found")
+    return complete_assessment(session, child, submission.answers)
+
+def _public_item(item) -> AdaptiveItem:
+    """Item as shown to the child (without its answer or difficulty)"""
+    return AdaptiveItem(id=item["id"], skill=item["skill"], type=item["type"], prompt=item["prompt"], options=item["options"])
+
+@router.post("/adaptive/start", response_model=AdaptiveTestState)
+def start_adaptive_test(start: AdaptiveStart, session: Session = Depends(get_session)):
+    """Begin an adaptive placement test; items are served one at a time until the level converges"""
+    child = session.get(Child, start.child_id)
+    if not child:
+        raise HTTPException(status_code=404, detail="Child not found")
+
+    item = next_item(0.0, [])
+    test = PlacementTest(child_id=child.id, current_item_id=item["id"])
+    session.add(test)
+    session.commit()
+    session.refresh(test)
+    return AdaptiveTestState(test_id=test.id, answered=0, done=False, item=_public_item(item))
+
+@router.post("/adaptive/{test_id}/answer", response_model=AdaptiveTestState)
+def answer_adaptive_item(test_id: int, answer: AdaptiveAnswer, session: Session = Depends(get_session)):
+    """Score one answer, re-estimate ability, then serve the next item or finish the placement"""
+    test = session.get(PlacementTest, test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+    if test.status != "In Progress":
+        raise HTTPException(status_code=400, detail="Test already completed")
+    if answer.item_id != test.current_item_id:
+        raise HTTPException(status_code=400, detail=f"Expected an answer to item {test.current_item_id}")
+
+    responses = json.loads(test.responses)
+    responses.append([answer.item_id, answer.selected_answer, answer.time_spent])
+    estimate = estimate_ability([
+        (item_id, selected == ITEMS_BY_ID[item_id]["correct_id"]) for item_id, selected, _ in responses
+    ])
+    upcoming = next_item(estimate["theta"], [item_id for item_id, _, _ in responses])
+
+    def save_test(**fields):
+        test.responses = json.dumps(responses)
+        test.theta = estimate["theta"]
+        test.standard_error = estimate["standard_error"]
+        for name, value in fields.items():
+            setattr(test, name, value)
+        session.add(test)
+        session.commit()
+
+    if not is_converged(estimate, len(responses), upcoming is not None):
+        save_test(current_item_id=upcoming["id"])
+        return AdaptiveTestState(test_id=test.id, answered=len(responses), done=False, item=_public_item(upcoming))
+
+    child = session.get(Child, test.child_id)
+    if not child:
+        raise HTTPException(status_code=404, detail="Child not found")
+
+    # Converged: only the items actually asked become question rows.
+    # The test row is updated afterwards: complete_assessment interns templates
+    # on its own connection and must not wait behind a write pending in this session.
+    answers = [
+        QuestionAnswer(
+            question_id=item_id,
+            question_content=ITEMS_BY_ID[item_id]["prompt"],
+            selected_answer=selected,
+            correct_answer=ITEMS_BY_ID[item_id]["correct_id"],
+            time_spent=time_spent
+        )
+        for item_id, selected, time_spent in responses
+    ]
+    result = complete_assessment(session, child, answers, level=estimate["level"], assessment_type="Adaptive Placement Test")
+    save_test(status="Completed", current_item_id=None, assessment_id=child.latest_assessment_id)
+    return AdaptiveTestState(test_id=test.id, answered=len(responses), done=True, result=result)
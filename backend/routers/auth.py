@@ -1,13 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import Session, select
-from datetime import timedelta
+from datetime import datetime, timedelta
+from pydantic import BaseModel
 from ..database import get_session
-from ..models import Parent
-from ..auth import verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from ..models import Parent, ParentInvite
+from ..auth import verify_password, get_password_hash, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from ..utils.roster_import import invite_token_hash
 
 router = APIRouter(tags=["auth"])
 
+class InviteAcceptance(BaseModel):
+    token: str
+    password: str
+
+def _token_response(user: Parent) -> dict:
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user.email, "id": user.id}, # Add ID to token payload for easy extraction
+        expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer", "parent_id": user.id, "parent_name": user.name}
+
 @router.post("/token")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)):
     # 1. Find user by email (username field in form)
@@ -23,10 +37,22 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     
     # 3. Create Access Token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email, "id": user.id}, # Add ID to token payload for easy extraction
-        expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer", "parent_id": user.id, "parent_name": user.name}
+    return _token_response(user)
+
+# Invited parents (created by a roster import) choose their password and are logged in
+@router.post("/invites/accept")
+def accept_invite(acceptance: InviteAcceptance, session: Session = Depends(get_session)):
+    invite = session.get(ParentInvite, invite_token_hash(acceptance.token))
+    if not invite or invite.accepted_at or invite.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=400, detail="Invite is invalid or has expired")
+    if not acceptance.password:
+        raise HTTPException(status_code=400, detail="Password is required")
+
+    user = session.get(Parent, invite.parent_id)
+    user.password_hash = get_password_hash(acceptance.password)
+    invite.accepted_at = datetime.utcnow()
+    session.add(user)
+    session.add(invite)
+    session.commit()
+    session.refresh(user)
+    return _token_response(user)
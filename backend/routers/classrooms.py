@@ -0,0 +1,139 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import Session, select, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+from datetime import datetime
+
+from ..database import get_session
+from ..models import Child, Parent, Classroom, ClassroomMember
+from ..auth import get_current_user
+from ..utils.classrooms import generate_join_code, get_classroom_dashboard, touch_child_classrooms
+from ..utils.streaks import parent_timezone, local_day
+
+# Teacher-owned groups of children; parents enrol their own child with the join code
+router = APIRouter(prefix="/classrooms", tags=["classrooms"])
+
+class ClassroomCreate(BaseModel):
+    name: str
+
+class ClassroomJoin(BaseModel):
+    join_code: str
+    child_id: int
+
+class ClassroomInfo(BaseModel):
+    id: int
+    name: str
+    join_code: str
+    children: int
+
+class ClassroomChild(BaseModel):
+    id: int
+    name: str
+    age: int
+    level: str
+    streak: int
+    weekly_progress: int  # Percentage of the active plan completed
+    activities_completed: int
+    total_activities: int
+    activities_this_week: int
+    minutes_this_week: int
+    skills: Dict[str, int]  # Skill key -> mastery (0-100) from the latest assessment
+    last_active: Optional[str]
+
+class SkillAverage(BaseModel):
+    skill: str
+    skill_name: str
+    mean_mastery: float
+    children: int
+
+class ClassroomDashboard(BaseModel):
+    classroom_id: int
+    name: str
+    version: int
+    generated_at: datetime
+    children: List[ClassroomChild]
+    skill_averages: List[SkillAverage]
+
+def _get_owned_classroom(session: Session, classroom_id: int, current_user: Parent) -> Classroom:
+    classroom = session.get(Classroom, classroom_id)
+    if not classroom:
+        raise HTTPException(status_code=404, detail="Classroom not found")
+    if classroom.teacher_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return classroom
+
+@router.post("/", response_model=ClassroomInfo)
+def create_classroom(classroom_in: ClassroomCreate, session: Session = Depends(get_session), current_user: Parent = Depends(get_current_user)):
+    # Retry on the (unlikely) join code collision
+    for _ in range(5):
+        classroom = Classroom(name=classroom_in.name, teacher_id=current_user.id, join_code=generate_join_code())
+        session.add(classroom)
+        try:
+            session.commit()
+            break
+        except IntegrityError:
+            session.rollback()
+    else:
+        raise HTTPException(status_code=500, detail="Could not allocate a join code")
+    session.refresh(classroom)
+    return ClassroomInfo(id=classroom.id, name=classroom.name, join_code=classroom.join_code, children=0)
+
+@router.get("/", response_model=List[ClassroomInfo])
+def list_classrooms(session: Session = Depends(get_session), current_user: Parent = Depends(get_current_user)):
+    """The current user's classrooms with their member counts"""
+    rows = session.exec(
+        select(Classroom, func.count(ClassroomMember.child_id))
+        .outerjoin(ClassroomMember, ClassroomMember.classroom_id == Classroom.id)
+        .where(Classroom.teacher_id == current_user.id)
+        .group_by(Classroom.id)
+        .order_by(Classroom.id)
+    ).all()
+    return [ClassroomInfo(id=c.id, name=c.name, join_code=c.join_code, children=count) for c, count in rows]
+
+@router.post("/join", response_model=ClassroomInfo)
+def join_classroom(join: ClassroomJoin, session: Session = Depends(get_session), current_user: Parent = Depends(get_current_user)):
+    """Enrol one of the current parent's children (joining twice is a no-op)"""
+    child = session.get(Child, join.child_id)
+    if not child:
+        raise HTTPException(status_code=404, detail="Child not found")
+    if child.parent_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    classroom = session.exec(select(Classroom).where(Classroom.join_code == join.join_code.strip().upper())).first()
+    if not classroom:
+        raise HTTPException(status_code=404, detail="Unknown join code")
+
+    session.execute(
+        insert(ClassroomMember).values(classroom_id=classroom.id, child_id=child.id)
+        .on_conflict_do_nothing(index_elements=["classroom_id", "child_id"])
+    )
+    touch_child_classrooms(session, child.id)
+    session.commit()
+    session.refresh(classroom)
+
+    count = session.exec(select(func.count()).select_from(ClassroomMember).where(ClassroomMember.classroom_id == classroom.id)).one()
+    return ClassroomInfo(id=classroom.id, name=classroom.name, join_code=classroom.join_code, children=count)
+
+@router.delete("/{classroom_id}/children/{child_id}")
+def remove_child(classroom_id: int, child_id: int, session: Session = Depends(get_session), current_user: Parent = Depends(get_current_user)):
+    """The teacher or the child's parent can take a child out of a classroom"""
+    classroom = session.get(Classroom, classroom_id)
+    member = session.get(ClassroomMember, (classroom_id, child_id))
+    if not classroom or not member:
+        raise HTTPException(status_code=404, detail="Child is not in this classroom")
+    child = session.get(Child, child_id)
+    if current_user.id not in (classroom.teacher_id, child.parent_id if child else None):
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    touch_child_classrooms(session, child_id)
+    session.delete(member)
+    session.commit()
+    return {"message": "Child removed from classroom"}
+
+@router.get("/{classroom_id}/dashboard", response_model=ClassroomDashboard)
+def get_classroom_dashboard_data(classroom_id: int, session: Session = Depends(get_session), current_user: Parent = Depends(get_current_user)):
+    """Every member's level, plan progress, weekly activity, skills and last-active in one response"""
+    classroom = _get_owned_classroom(session, classroom_id, current_user)
+    today = local_day(parent_timezone(current_user))
+    return get_classroom_dashboard(session, classroom, today)
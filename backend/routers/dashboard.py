@@ -1,13 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import Session, select, func, col
+from sqlalchemy import and_, case
 from typing import List, Optional, Dict
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 
 from ..database import get_session
-from ..models import Child, Parent, Progress, LearningPlan, Activity, ActivityProgress, Achievement, Assessment
+from ..models import Child, Parent, Progress, LearningPlan, Activity, ActivityProgress, Achievement, Assessment, SkillSnapshot, ChildProgress
 from ..auth import get_current_user
 from ..utils.achievements import get_child_achievement_ids
+from ..utils.activity_catalog import get_template
+from ..utils.child_progress import get_family_total_score, get_children_progress
+from ..utils.skill_history import load_mastery_points, downsample_mastery
+from ..utils.item_bank import SKILL_DISPLAY_NAMES
+from ..utils.streaks import parent_timezone, local_day, current_streak
+from ..utils.tracing import traced, section
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
@@ -38,7 +45,8 @@ class DashboardData(BaseModel):
     child_name: str
     level: str
     streak: int
-    total_score: int
+    total_score: int  # This child's score
+    family_total_score: int = 0  # Sum over all of the parent's children
     weekly_focus: str
     weekly_progress: int  # Percentage
     activities: List[ActivityItem]
@@ -52,9 +60,25 @@ class DashboardData(BaseModel):
     duration_weeks: Optional[int] = None  # Learning plan duration
     weekly_goals: Optional[str] = None  # JSON string of weekly goals
 
+class SkillHistoryPoint(BaseModel):
+    skill: str
+    skill_name: str
+    bucket_start: str  # ISO date of the first day of the week/month
+    mastery_mean: float
+    mastery_min: int
+    mastery_max: int
+    mastery_last: int
+    samples: int
+
+class SkillHistory(BaseModel):
+    bucket: str
+    points: List[SkillHistoryPoint]
+
 @router.get("/{child_id}", response_model=DashboardData)
+@traced
 def get_dashboard_data(child_id: int, session: Session = Depends(get_session), current_user: Parent = Depends(get_current_user)):
     # 1. Fetch Child
+    section("1. child")
     child = session.get(Child, child_id)
     if not child:
         raise HTTPException(status_code=404, detail="Child not found")
@@ -62,21 +86,26 @@ def get_dashboard_data(child_id: int, session: Session = Depends(get_session), c
     if child.parent_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to view this child's dashboard")
 
-    # 2. Fetch Parent Progress (Streak/Score)
+    # 2. Fetch Parent Progress (anchors activity progress) and the child's own Streak/Score
+    section("2. progress and streak")
     statement = select(Progress).where(Progress.parent_id == child.parent_id)
     progress_record = session.exec(statement).first()
 
-    streak = progress_record.streak_days if progress_record else 0
-    total_score = progress_record.total_score if progress_record else 0
+    child_counters = session.get(ChildProgress, child_id)
+    today = local_day(parent_timezone(current_user))
+    streak = current_streak(child_counters, today)
+    total_score = child_counters.total_score if child_counters else 0
+    family_total_score = get_family_total_score(session, child.parent_id)
 
-    # 3. Fetch Active Learning Plan
+    # 3. Fetch Active Learning Plan (primary-key lookups via the child's pointers)
+    section("3. plan activities")
     latest_assessment = None
-    if child.assessments:
-        latest_assessment = child.assessments[-1]
+    if child.latest_assessment_id:
+        latest_assessment = session.get(Assessment, child.latest_assessment_id)
 
     current_plan = None
-    if latest_assessment and latest_assessment.learning_plan:
-        current_plan = latest_assessment.learning_plan
+    if child.active_plan_id:
+        current_plan = session.get(LearningPlan, child.active_plan_id)
 
     weekly_focus = "General Learning"
     weekly_progress = 0
@@ -89,7 +118,8 @@ def get_dashboard_data(child_id: int, session: Session = Depends(get_session), c
         weekly_focus = current_plan.focus_areas
         duration_weeks = current_plan.duration_weeks
         weekly_goals_json = current_plan.weekly_goals
-        activities = current_plan.activities
+        # Plan order (reassessments carry unchanged activities over, so ids aren't in plan order)
+        activities = sorted(current_plan.activities, key=lambda a: (a.week or 0, a.day or 0, a.id))
         completed_count = 0
 
         for activity in activities:
@@ -111,46 +141,34 @@ def get_dashboard_data(child_id: int, session: Session = Depends(get_session), c
 
                 total_time_spent += time_spent
 
+            template = get_template(session, activity.template_id)
             activities_list.append(ActivityItem(
                 id=activity.id,
-                title=activity.activity_name,
-                type=activity.activity_type,
+                title=template.activity_name,
+                type=template.activity_type,
                 completed=is_completed,
-                icon_type=activity.activity_type.upper()
+                icon_type=template.activity_type.upper()
             ))
 
         if len(activities) > 0:
             weekly_progress = int((completed_count / len(activities)) * 100)
 
-    # 4. Calculate Skills based on assessment results
+    # 4. Read Skills from the assessment's snapshot (computed at submission)
+    section("4. skills")
     skills = []
     if latest_assessment:
-        # Analyze assessment questions by skill
-        skill_scores = {}  # skill -> {correct, total}
-
-        for question in latest_assessment.questions:
-            skill = question.question_type  # Using question_type as skill category
-            if skill not in skill_scores:
-                skill_scores[skill] = {"correct": 0, "total": 0}
-
-            skill_scores[skill]["total"] += 1
-            if question.is_correct:
-                skill_scores[skill]["correct"] += 1
-
-        # Convert to skill stats
-        skill_name_map = {
-            "multiple-choice": "Letter Recognition",
-            "image-choice": "Phonics & Sounds",
-            "matching": "Word Building",
-            "tracing": "Writing Skills"
-        }
-
-        for skill, scores in skill_scores.items():
-            mastery = int((scores["correct"] / scores["total"]) * 100) if scores["total"] > 0 else 0
+        snapshots = session.exec(
+            select(SkillSnapshot)
+            .where(SkillSnapshot.assessment_id == latest_assessment.id)
+            .order_by(SkillSnapshot.id)
+        ).all()
+
+        for snapshot in snapshots:
+            mastery = snapshot.mastery_percentage
             status = "Not Started" if mastery == 0 else "Learning" if mastery < 80 else "Mastered"
 
             skills.append(SkillStat(
-                skill_name=skill_name_map.get(skill, skill),
+                skill_name=SKILL_DISPLAY_NAMES.get(snapshot.skill, snapshot.skill_name),
                 mastery_level=mastery,
                 status=status
             ))
@@ -158,12 +176,12 @@ def get_dashboard_data(child_id: int, session: Session = Depends(get_session), c
     # If no skills, add default
     if not skills:
         skills = [
-            SkillStat(skill_name="Letter Recognition", mastery_level=0, status="Not Started"),
-            SkillStat(skill_name="Phonics & Sounds", mastery_level=0, status="Not Started"),
-            SkillStat(skill_name="Word Building", mastery_level=0, status="Not Started")
+            SkillStat(skill_name=skill_name, mastery_level=0, status="Not Started")
+            for skill_name in SKILL_DISPLAY_NAMES.values()
         ]
 
     # 5. Calculate activities this week
+    section("5. activities this week")
     one_week_ago = datetime.utcnow() - timedelta(days=7)
     activities_this_week = 0
 
@@ -177,44 +195,66 @@ def get_dashboard_data(child_id: int, session: Session = Depends(get_session), c
         activities_this_week = len(session.exec(stmt).all())
 
     # 6. Fetch Achievements as IDs (for frontend compatibility)
+    section("6. achievements")
     achievement_ids = get_child_achievement_ids(session, child_id)
 
     # 7. Get sibling summaries for multi-child view
+    section("7. siblings")
     siblings = session.exec(
         select(Child).where(Child.parent_id == current_user.id).where(Child.id != child_id)
     ).all()
 
+    # Sibling stats in two grouped queries instead of loading every progress row.
+    # Counted over each sibling's active plan, like this child's own numbers: the active plan
+    # is never archived, so the totals don't change when old plans move out of main.
+    sibling_ids = [sibling.id for sibling in siblings]
+    sibling_counters = get_children_progress(session, sibling_ids)
+    sibling_totals = {}
+    if sibling_ids:
+        sibling_totals = {
+            row[0]: (row[1], row[2] or 0)
+            for row in session.exec(
+                select(
+                    Activity.child_id,
+                    func.count(Activity.id),
+                    func.sum(case((ActivityProgress.completion_status == "Completed", 1), else_=0))
+                ).join(Child, and_(Child.id == Activity.child_id, Child.active_plan_id == Activity.plan_id))
+                .outerjoin(ActivityProgress, ActivityProgress.activity_id == Activity.id)
+                .where(col(Activity.child_id).in_(sibling_ids))
+                .group_by(Activity.child_id)
+            ).all()
+        }
+
     sibling_summaries = []
     for sibling in siblings:
-        # Get sibling's basic stats
-        sibling_stmt = select(ActivityProgress).join(Activity).where(
-            Activity.child_id == sibling.id
-        )
-        sibling_progress = session.exec(sibling_stmt).all()
-        completed = len([p for p in sibling_progress if p.completion_status == "Completed"])
-        total = len(sibling_progress)
+        total, completed = sibling_totals.get(sibling.id, (0, 0))
+        counters = sibling_counters.get(sibling.id)
 
         sibling_summaries.append(ChildSummary(
             id=sibling.id,
             name=sibling.name,
             age=sibling.age,
             level=sibling.current_level,
-            streak=streak,  # Sharing streak for now (family-based)
+            streak=current_streak(counters, today),
             weekly_progress=0,  # Would need separate calculation
             activities_completed=completed,
             total_activities=total
         ))
 
     # Last active - use most recent activity progress or assessment date
-    last_active = None
+    last_active_dates = []
     if latest_assessment:
-        last_active = latest_assessment.assessment_date.strftime("%Y-%m-%d")
+        last_active_dates.append(latest_assessment.assessment_date)
+    if child_counters and child_counters.last_active_at:
+        last_active_dates.append(child_counters.last_active_at)
+    last_active = max(last_active_dates).strftime("%Y-%m-%d") if last_active_dates else None
 
     return DashboardData(
         child_name=child.name,
         level=child.current_level,
         streak=streak,
         total_score=total_score,
+        family_total_score=family_total_score,
         weekly_focus=weekly_focus,
         weekly_progress=weekly_progress,
         activities=activities_list,
@@ -227,3 +267,29 @@ def get_dashboard_data(child_id: int, session: Session = Depends(get_session), c
         duration_weeks=duration_weeks,
         weekly_goals=weekly_goals_json
     )
+
+@router.get("/{child_id}/skills/history", response_model=SkillHistory)
+def get_skill_history(
+    child_id: int,
+    bucket: str = Query("week", pattern="^(week|month)$"),
+    skill: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    session: Session = Depends(get_session),
+    current_user: Parent = Depends(get_current_user)
+):
+    """Downsampled skill mastery over time, from the append-only mastery series"""
+    child = session.get(Child, child_id)
+    if not child:
+        raise HTTPException(status_code=404, detail="Child not found")
+
+    if child.parent_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this child's dashboard")
+
+    rows = load_mastery_points(session, child_id, start, end, skill)
+    points = [
+        SkillHistoryPoint(skill_name=SKILL_DISPLAY_NAMES.get(point["skill"], point["skill"]), **point)
+        for point in downsample_mastery(rows, bucket)
+    ]
+
+    return SkillHistory(bucket=bucket, points=points)
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select
+from typing import List, Optional
+from datetime import datetime
+
+from ..database import get_session
+from ..models import Child, Parent
+from ..auth import get_current_user
+from ..utils.child_export import stream_export, parse_sections, FORMATS, EXPORT_SECTIONS
+
+# Streaming downloads of a child's (or a whole family's) complete history
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+def _get_owned_child(session: Session, child_id: int, current_user: Parent) -> Child:
+    child = session.get(Child, child_id)
+    if not child:
+        raise HTTPException(status_code=404, detail="Child not found")
+    if child.parent_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return child
+
+def _export_response(child_ids: List[int], export_format: str, sections: Optional[str], name: str) -> StreamingResponse:
+    if export_format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"'format' must be one of: {', '.join(FORMATS)}")
+    try:
+        selected = parse_sections(sections)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if export_format == "csv" and len(selected) != 1:
+        raise HTTPException(
+            status_code=400,
+            detail=f"CSV exports one section at a time; pass 'sections' as one of: {', '.join(EXPORT_SECTIONS)}"
+        )
+
+    suffix = f"-{selected[0]}" if export_format == "csv" else ""
+    filename = f"{name}{suffix}-{datetime.utcnow():%Y%m%d}.{export_format}"
+    # The body is generated on its own connection after this request's session is closed
+    return StreamingResponse(
+        stream_export(child_ids, selected, export_format),
+        media_type=FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/children/{child_id}")
+def export_child(
+    child_id: int,
+    format: str = Query("ndjson", description="ndjson or csv"),
+    sections: Optional[str] = Query(None, description="Comma-separated sections (default: all; csv takes exactly one)"),
+    session: Session = Depends(get_session),
+    current_user: Parent = Depends(get_current_user)
+):
+    """Assessments, answers, activities, progress, daily activity and badges of one child"""
+    _get_owned_child(session, child_id, current_user)
+    return _export_response([child_id], format, sections, f"child-{child_id}")
+
+@router.get("/children")
+def export_family(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    sections: Optional[str] = Query(None, description="Comma-separated sections (default: all; csv takes exactly one)"),
+    session: Session = Depends(get_session),
+    current_user: Parent = Depends(get_current_user)
+):
+    """The same export for every child of the current parent, one child after another"""
+    child_ids = session.exec(select(Child.id).where(Child.parent_id == current_user.id).order_by(Child.id)).all()
+    return _export_response(list(child_ids), format, sections, f"family-{current_user.id}")
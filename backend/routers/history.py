@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import Session
+from typing import List, Optional
+from pydantic import BaseModel
+
+from ..database import get_session
+from ..models import Child, Parent
+from ..auth import get_current_user
+from ..utils.activity_catalog import get_template
+from ..utils.archival import get_archived_plans, get_archived_plan_activities
+
+# Explicit read access to archived (superseded/expired) plans kept in archive.db
+router = APIRouter(prefix="/history", tags=["history"])
+
+class ArchivedPlan(BaseModel):
+    id: int
+    assessment_id: int
+    status: str
+    focus_areas: str
+    duration_weeks: int
+    plan_start_date: str
+    plan_end_date: str
+    activity_count: int
+
+class ArchivedActivity(BaseModel):
+    id: int
+    title: str
+    type: str
+    week: Optional[int] = None
+    day: Optional[int] = None
+    completion_status: Optional[str] = None
+    total_time_spent_minutes: int = 0
+
+def _get_owned_child(session: Session, child_id: int, current_user: Parent) -> Child:
+    child = session.get(Child, child_id)
+    if not child:
+        raise HTTPException(status_code=404, detail="Child not found")
+    if child.parent_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return child
+
+@router.get("/{child_id}/plans", response_model=List[ArchivedPlan])
+def list_archived_plans(child_id: int, session: Session = Depends(get_session), current_user: Parent = Depends(get_current_user)):
+    """Archived learning plans of a child, newest first"""
+    _get_owned_child(session, child_id, current_user)
+    return [ArchivedPlan(**plan) for plan in get_archived_plans(child_id)]
+
+@router.get("/{child_id}/plans/{plan_id}/activities", response_model=List[ArchivedActivity])
+def list_archived_plan_activities(child_id: int, plan_id: int, session: Session = Depends(get_session), current_user: Parent = Depends(get_current_user)):
+    """Activities (and recorded progress) of one archived plan"""
+    _get_owned_child(session, child_id, current_user)
+
+    activities = []
+    for row in get_archived_plan_activities(child_id, plan_id):
+        template = get_template(session, row["template_id"])
+        activities.append(ArchivedActivity(
+            id=row["id"],
+            title=template.activity_name if template else "Unknown activity",
+            type=template.activity_type if template else "Game",
+            week=row["week"],
+            day=row["day"],
+            completion_status=row["completion_status"],
+            total_time_spent_minutes=row["total_time_spent_minutes"] or 0
+        ))
+    return activities
@@ -0,0 +1,91 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import Session, select
+from typing import List, Optional
+from pydantic import BaseModel
+
+from ..database import get_session
+from ..models import Child, Parent
+from ..auth import get_current_user
+from ..utils.leaderboard import leaderboards, PERIODS
+from ..utils.streaks import parent_timezone, local_day
+
+# Weekly and all-time rankings served from the in-memory leaderboard index
+router = APIRouter(prefix="/leaderboards", tags=["leaderboards"])
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    child_id: int
+    score: int
+    name: Optional[str] = None  # Only for the requesting parent's own children
+
+class LeaderboardPage(BaseModel):
+    period: str
+    cohort: str
+    total: int
+    entries: List[LeaderboardEntry]
+
+class ChildRank(BaseModel):
+    period: str
+    cohort: str
+    child_id: int
+    rank: Optional[int] = None  # None until the child scores in this period
+    score: int = 0
+    total: int
+
+def _check_period(period: str) -> None:
+    if period not in PERIODS:
+        raise HTTPException(status_code=404, detail=f"Unknown leaderboard period: {period}")
+
+def _check_cohort(cohort: str) -> None:
+    kind, _, value = cohort.partition(":")
+    if cohort != "all" and not (kind in ("age", "level") and value):
+        raise HTTPException(status_code=400, detail="Cohort must be 'all', 'age:<age>' or 'level:<level>'")
+
+@router.get("/{period}", response_model=LeaderboardPage)
+def get_leaderboard(
+    period: str,
+    cohort: str = "all",
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    session: Session = Depends(get_session),
+    current_user: Parent = Depends(get_current_user)
+):
+    """Top of a board, e.g. /leaderboards/weekly?cohort=age:5"""
+    _check_period(period)
+    _check_cohort(cohort)
+
+    total, top = leaderboards.top(period, cohort, limit, offset, local_day(parent_timezone(current_user)))
+    own_names = {
+        child.id: child.name
+        for child in session.exec(select(Child).where(Child.parent_id == current_user.id)).all()
+    }
+    entries = [
+        LeaderboardEntry(rank=offset + i + 1, child_id=child_id, score=score, name=own_names.get(child_id))
+        for i, (child_id, score) in enumerate(top)
+    ]
+    return LeaderboardPage(period=period, cohort=cohort, total=total, entries=entries)
+
+@router.get("/{period}/children/{child_id}", response_model=ChildRank)
+def get_child_rank(
+    period: str,
+    child_id: int,
+    cohort: str = Query("all", description="'all', 'age' or 'level' (the child's own cohort)"),
+    session: Session = Depends(get_session),
+    current_user: Parent = Depends(get_current_user)
+):
+    _check_period(period)
+    child = session.get(Child, child_id)
+    if not child:
+        raise HTTPException(status_code=404, detail="Child not found")
+    if child.parent_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    if cohort == "age":
+        cohort = f"age:{child.age}"
+    elif cohort == "level":
+        cohort = f"level:{child.current_level}"
+    elif cohort != "all":
+        raise HTTPException(status_code=400, detail="Cohort must be 'all', 'age' or 'level'")
+
+    total, rank, score = leaderboards.rank(period, cohort, child_id, local_day(parent_timezone(current_user)))
+    return ChildRank(period=period, cohort=cohort, child_id=child_id, rank=rank, score=score or 0, total=total)
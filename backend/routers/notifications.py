@@ -6,6 +6,9 @@ from datetime import datetime, timedelta
 from ..database import get_session
 from ..models import Notification, Parent, Child, Activity, ActivityProgress, Progress, Achievement
 from ..auth import get_current_user
+from ..utils.child_progress import get_children_progress
+from ..utils.streaks import parent_timezone, local_day, current_streak
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
@@ -34,6 +37,7 @@ class NotificationPreferences(BaseModel):
     quietHoursEnabled: bool = False
     quietHoursStart: str = "20:00"
     quietHoursEnd: str = "08:00"
+    timezone: str = "UTC"  # IANA name; sets the day boundary for streaks
 
 @router.get("/{parent_id}", response_model=List[Notification])
 def get_notifications(parent_id: int, session: Session = Depends(get_session), current_user: Parent = Depends(get_current_user)):
@@ -121,13 +125,22 @@ def create_streak_warning(parent_id: int, session: Session = Depends(get_session
     if not parent:
         raise HTTPException(status_code=404, detail="Parent not found")
 
-    statement = select(Progress).where(Progress.parent_id == parent_id)
-    progress = session.exec(statement).first()
+    # Children whose streak is still alive but who haven't been active yet today
+    today = local_day(parent_timezone(parent))
+    children = session.exec(select(Child).where(Child.parent_id == parent_id)).all()
+    counters = get_children_progress(session, [child.id for child in children])
+    at_risk = []
+    for child in children:
+        child_counters = counters.get(child.id)
+        streak = current_streak(child_counters, today)
+        if streak >= 1 and child_counters.last_active_day != today:
+            at_risk.append((streak, child))
 
-    if not progress or progress.streak_days < 1:
+    if not at_risk:
         return {"message": "No active streak to warn about"}
 
-    message = f"🔥 Keep the {progress.streak_days}-day streak alive! Complete an activity today to maintain it."
+    streak, child = max(at_risk, key=lambda item: item[0])
+    message = f"🔥 Keep {child.name}'s {streak}-day streak alive! Complete an activity today to maintain it."
 
     notification = Notification(
         parent_id=parent_id,
@@ -213,6 +226,11 @@ def save_notification_preferences(parent_id: int, preferences: NotificationPrefe
     if not parent:
         raise HTTPException(status_code=404, detail="Parent not found")
 
+    try:
+        ZoneInfo(preferences.timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {preferences.timezone}")
+
     # Save preferences as JSON in notification_data field
     import json
     parent.notification_data = json.dumps(preferences.dict())
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException  # Import API Router and dependency injection tools
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException  # Import API Router and dependency injection tools
 from sqlmodel import Session, select  # Import Session for database interaction and select for queries
 from typing import List  # Import List for type hinting
 from ..database import get_session  # Import the function to get a database session
 from ..models import Parent, Child  # Import Parent (formerly User) and Child models
 from ..auth import get_password_hash, get_current_user, verify_password # Import password hashing and auth dependency
+from ..utils.child_deletion import count_child_rows, detach_child, delete_child_subtree, BACKGROUND_DELETE_THRESHOLD
+from ..utils.leaderboard import leaderboards
+from ..utils.recommendations import recommender
+from ..utils.classrooms import touch_child_classrooms
 from pydantic import BaseModel
 
 class ParentCreate(BaseModel):
@@ -141,8 +145,11 @@ def update_child(child_id: int, child_update: Child, session: Session = Depends(
         db_child.date_of_birth = child_update.date_of_birth
 
     session.add(db_child)
+    touch_child_classrooms(session, db_child.id)
     session.commit()
     session.refresh(db_child)
+    leaderboards.update_child(db_child.id, db_child.age, db_child.current_level)
+    recommender.invalidate(db_child.id)
     return db_child
 
 # Endpoint to change password
@@ -167,16 +174,25 @@ def change_password(parent_id: int, password_data: PasswordChange, session: Sess
 
     return {"message": "Password changed successfully"}
 
-# Endpoint to delete a child
+# Endpoint to delete a child (and its whole history)
 @router.delete("/children/{child_id}")
-def delete_child(child_id: int, session: Session = Depends(get_session), current_user: Parent = Depends(get_current_user)):
+def delete_child(child_id: int, background_tasks: BackgroundTasks, session: Session = Depends(get_session), current_user: Parent = Depends(get_current_user)):
     db_child = session.get(Child, child_id)
     if not db_child:
         raise HTTPException(status_code=404, detail="Child not found")
     if db_child.parent_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    session.delete(db_child)
+    leaderboards.remove_child(child_id)
+    recommender.invalidate(child_id)
+    touch_child_classrooms(session, child_id)
     session.commit()
 
+    # Large histories: hide the child now and delete the subtree after responding
+    if count_child_rows(session, child_id) > BACKGROUND_DELETE_THRESHOLD:
+        detach_child(session, db_child)
+        background_tasks.add_task(delete_child_subtree, child_id, commit_each=True)
+    else:
+        delete_child_subtree(child_id)
+
     return {"message": "Child deleted successfully"}
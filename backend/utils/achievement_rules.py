@@ -0,0 +1,167 @@
+"""
+Achievement Rules - Declarative Badge Conditions Compiled to SQL
+Each rule is "metric >= threshold". Rules compile to one set-based query, which serves
+both the per-event check in record_progress and the chunked backfill across every child.
+"""
+
+import os
+import sys
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import and_, exists, insert, literal, union_all
+from sqlalchemy.sql import Select
+from sqlmodel import Session, select, func
+from ..database import engine, create_db_and_tables
+from ..models import (
+    Child, Assessment, Achievement, ChildProgress, ChildTypeProgress, DailyActivity, SkillSnapshot
+)
+from .achievements import ACHIEVEMENT_DEFINITIONS
+
+BACKFILL_CHUNK_SIZE = int(os.getenv("ACHIEVEMENT_BACKFILL_CHUNK_SIZE", "50000"))  # child ids per transaction
+
+
+# ==================== METRICS ====================
+# Each metric returns (query of child_id + value, child id column to range-filter on)
+
+def _activities_completed(_: Optional[str]) -> Tuple[Select, object]:
+    query = select(ChildProgress.child_id, ChildProgress.activities_completed.label("value"))
+    return query, ChildProgress.child_id
+
+
+def _streak_days(_: Optional[str]) -> Tuple[Select, object]:
+    query = select(ChildProgress.child_id, ChildProgress.streak_days.label("value"))
+    return query, ChildProgress.child_id
+
+
+def _best_day_activities(_: Optional[str]) -> Tuple[Select, object]:
+    query = select(
+        DailyActivity.child_id, func.max(DailyActivity.activities_completed).label("value")
+    ).group_by(DailyActivity.child_id)
+    return query, DailyActivity.child_id
+
+
+def _completed_of_type(activity_type: Optional[str]) -> Tuple[Select, object]:
+    # Rollup rather than a count over Activity: archived plans take their activities with them
+    query = select(
+        ChildTypeProgress.child_id, ChildTypeProgress.activities_completed.label("value")
+    ).where(ChildTypeProgress.activity_type == activity_type)
+    return query, ChildTypeProgress.child_id
+
+
+def _assessments_taken(_: Optional[str]) -> Tuple[Select, object]:
+    query = select(Assessment.child_id, func.count().label("value")).group_by(Assessment.child_id)
+    return query, Assessment.child_id
+
+
+def _latest_accuracy(_: Optional[str]) -> Tuple[Select, object]:
+    query = select(Child.id.label("child_id"), Assessment.accuracy_percentage.label("value")).join(
+        Assessment, Assessment.id == Child.latest_assessment_id
+    )
+    return query, Child.id
+
+
+def _latest_skill_mastery(skill: Optional[str]) -> Tuple[Select, object]:
+    query = select(Child.id.label("child_id"), SkillSnapshot.mastery_percentage.label("value")).join(
+        SkillSnapshot, and_(SkillSnapshot.assessment_id == Child.latest_assessment_id, SkillSnapshot.skill == skill)
+    )
+    return query, Child.id
+
+
+METRICS: Dict[str, Callable[[Optional[str]], Tuple[Select, object]]] = {
+    "activities_completed": _activities_completed,
+    "streak_days": _streak_days,
+    "best_day_activities": _best_day_activities,
+    "completed_of_type": _completed_of_type,
+    "assessments_taken": _assessments_taken,
+    "latest_accuracy": _latest_accuracy,
+    "latest_skill_mastery": _latest_skill_mastery,
+}
+
+
+# ==================== RULES ====================
+# Badges that only depend on stored data. Event badges (score/duration of a single
+# submission) stay in check_and_award_achievements because that data isn't kept.
+
+ACHIEVEMENT_RULES = {
+    "first_activity": {"metric": "activities_completed", "at_least": 1},
+    "five_activities": {"metric": "activities_completed", "at_least": 5},
+    "tiny_artist": {"metric": "completed_of_type", "arg": "Tracing", "at_least": 3},
+    "activity_marathon": {"metric": "best_day_activities", "at_least": 10},
+    "first_assessment": {"metric": "assessments_taken", "at_least": 1},
+    "perfect_score": {"metric": "latest_accuracy", "at_least": 100},
+    "letter_expert": {"metric": "latest_skill_mastery", "arg": "letter_recognition", "at_least": 100},
+    "phonics_master": {"metric": "latest_skill_mastery", "arg": "phonics", "at_least": 100},
+    "skill_master_letter": {"metric": "latest_skill_mastery", "arg": "letter_recognition", "at_least": 90},
+    "skill_master_phonics": {"metric": "latest_skill_mastery", "arg": "phonics", "at_least": 90},
+    "skill_master_rhyming": {"metric": "latest_skill_mastery", "arg": "rhyming", "at_least": 90},
+    "skill_master_grammar": {"metric": "latest_skill_mastery", "arg": "grammar", "at_least": 90},
+    "skill_master_fluency": {"metric": "latest_skill_mastery", "arg": "reading_fluency", "at_least": 90},
+    "streak_3": {"metric": "streak_days", "at_least": 3},
+    "streak_7": {"metric": "streak_days", "at_least": 7},
+    "streak_14": {"metric": "streak_days", "at_least": 14},
+    "streak_30": {"metric": "streak_days", "at_least": 30},
+}
+
+
+def compile_rule(achievement_id: str, child_ids: Optional[Tuple[int, int]] = None) -> Select:
+    """
+    SELECT child_id of every child that meets the rule and doesn't hold the badge yet.
+    child_ids=(low, high) limits it to low < child_id <= high.
+    """
+    rule = ACHIEVEMENT_RULES[achievement_id]
+    code = ACHIEVEMENT_DEFINITIONS[achievement_id]["code"]
+
+    query, child_column = METRICS[rule["metric"]](rule.get("arg"))
+    if child_ids:
+        query = query.where(child_column > child_ids[0], child_column <= child_ids[1])
+    metric = query.subquery()
+
+    already_earned = exists().where(
+        Achievement.child_id == metric.c.child_id,
+        Achievement.achievement_code == code
+    )
+    return select(metric.c.child_id).where(metric.c.value >= rule["at_least"]).where(~already_earned)
+
+
+def evaluate_rules(session: Session, child_id: int) -> List[str]:
+    """Achievement ids whose rule the child now meets and hasn't been awarded (one query)"""
+    queries = [
+        compile_rule(achievement_id, (child_id - 1, child_id)).add_columns(literal(achievement_id).label("achievement_id"))
+        for achievement_id in ACHIEVEMENT_RULES
+    ]
+    return [row.achievement_id for row in session.exec(union_all(*queries)).all()]
+
+
+def backfill_rule(achievement_id: str, chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+    """Award one rule to every qualifying child: one INSERT ... SELECT per child-id chunk"""
+    code = ACHIEVEMENT_DEFINITIONS[achievement_id]["code"]
+    awarded_at = datetime.utcnow()
+    awarded = 0
+
+    with engine.connect() as connection:
+        max_child_id = connection.execute(select(func.max(Child.id))).scalar() or 0
+        for low in range(0, max_child_id, chunk_size):
+            qualifying = compile_rule(achievement_id, (low, low + chunk_size)).subquery()
+            statement = insert(Achievement).from_select(
+                ["child_id", "achievement_code", "awarded_at"],
+                select(qualifying.c.child_id, literal(code), literal(awarded_at))
+            )
+            awarded += connection.execute(statement).rowcount
+            connection.commit()
+
+    return awarded
+
+
+def backfill_achievements(achievement_ids: Optional[List[str]] = None, chunk_size: int = BACKFILL_CHUNK_SIZE) -> Dict[str, int]:
+    """Backfill the given rules (default: all of them); returns awards per rule"""
+    achievement_ids = achievement_ids or list(ACHIEVEMENT_RULES)
+    unknown = [a for a in achievement_ids if a not in ACHIEVEMENT_RULES]
+    if unknown:
+        raise ValueError(f"No rule for achievement(s): {', '.join(unknown)}")
+    return {achievement_id: backfill_rule(achievement_id, chunk_size) for achievement_id in achievement_ids}
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.utils.achievement_rules [achievement_id ...]
+    create_db_and_tables()
+    print(f"🔴 Achievements backfilled: {backfill_achievements(sys.argv[1:] or None)}")
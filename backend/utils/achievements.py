@@ -3,32 +3,43 @@ Achievement System - Comprehensive Badge Awarding Logic
 Maps achievement definitions to checking logic
 """
 
-from typing import List, Dict, Any
+import hashlib
+import json
+from datetime import datetime
+from types import MappingProxyType
+from typing import Iterable, List, Optional, Set
+from sqlalchemy.dialects.sqlite import insert
 from sqlmodel import Session, select
-from ..models import Achievement, ActivityProgress, Activity, Child, Assessment
+from ..models import Achievement, Activity, Child
+from .activity_catalog import get_template
 
-# Achievement definitions matching frontend rewards.js
-ACHIEVEMENT_DEFINITIONS = {
+# Achievement definitions matching frontend rewards.js.
+# "code" is what Achievement rows store: never renumber or reuse one.
+_DEFINITIONS = {
     # ASSESSMENT BADGES
     "first_assessment": {
+        "code": 1,
         "name": "Brave Beginning",
         "icon": "🌟",
         "points": 50,
         "description": "Completed your first assessment"
     },
     "perfect_score": {
+        "code": 2,
         "name": "Perfect Scholar",
         "icon": "💯",
         "points": 200,
         "description": "Got 100% on assessment"
     },
     "letter_expert": {
+        "code": 3,
         "name": "Letter Expert",
         "icon": "🅰️+",
         "points": 100,
         "description": "Mastered letter recognition (100% in skill)"
     },
     "phonics_master": {
+        "code": 4,
         "name": "Phonics Pro",
         "icon": "🎵",
         "points": 100,
@@ -37,36 +48,42 @@ ACHIEVEMENT_DEFINITIONS = {
 
     # ACTIVITY BADGES
     "first_activity": {
+        "code": 5,
         "name": "First Steps",
         "icon": "👣",
         "points": 25,
         "description": "Completed your first activity"
     },
     "five_activities": {
+        "code": 6,
         "name": "Getting Started",
         "icon": "📚",
         "points": 50,
         "description": "Completed 5 activities"
     },
     "letter_hunt_champion": {
+        "code": 7,
         "name": "Letter Hunt Champion",
         "icon": "🏆",
         "points": 100,
         "description": "Found all letters in Letter Hunt with perfect score"
     },
     "phonics_genius": {
+        "code": 8,
         "name": "Phonics Genius",
         "icon": "🧠",
         "points": 100,
         "description": "Perfect score in Phonics Match"
     },
     "tiny_artist": {
+        "code": 9,
         "name": "Tiny Artist",
         "icon": "🎨",
         "points": 75,
         "description": "Completed 3 tracing activities"
     },
     "activity_marathon": {
+        "code": 10,
         "name": "Activity Marathon",
         "icon": "🏃",
         "points": 150,
@@ -75,24 +92,28 @@ ACHIEVEMENT_DEFINITIONS = {
 
     # STREAK BADGES
     "streak_3": {
+        "code": 11,
         "name": "On Fire!",
         "icon": "🔥",
         "points": 75,
         "description": "3 day learning streak"
     },
     "streak_7": {
+        "code": 12,
         "name": "Week Warrior",
         "icon": "⚔️",
         "points": 200,
         "description": "7 day learning streak"
     },
     "streak_14": {
+        "code": 13,
         "name": "Dedicated Learner",
         "icon": "💎",
         "points": 500,
         "description": "14 day learning streak"
     },
     "streak_30": {
+        "code": 14,
         "name": "Month Master",
         "icon": "👑",
         "points": 1000,
@@ -101,48 +122,56 @@ ACHIEVEMENT_DEFINITIONS = {
 
     # SKILL BADGES
     "beginner_complete": {
+        "code": 15,
         "name": "Beginner Graduate",
         "icon": "🎓",
         "points": 300,
         "description": "Completed all Beginner level skills"
     },
     "intermediate_complete": {
+        "code": 16,
         "name": "Rising Star",
         "icon": "⭐",
         "points": 500,
         "description": "Completed all Intermediate level skills"
     },
     "advanced_complete": {
+        "code": 17,
         "name": "Super Reader",
         "icon": "🦸",
         "points": 1000,
         "description": "Completed all Advanced level skills"
     },
     "skill_master_letter": {
+        "code": 18,
         "name": "Letter Lord",
         "icon": "🔤",
         "points": 150,
         "description": "Mastered letter recognition skill (90%+)"
     },
     "skill_master_phonics": {
+        "code": 19,
         "name": "Sound Specialist",
         "icon": "🎶",
         "points": 150,
         "description": "Mastered phonics skill (90%+)"
     },
     "skill_master_rhyming": {
+        "code": 20,
         "name": "Rhyme Ranger",
         "icon": "🎭",
         "points": 150,
         "description": "Mastered rhyming skill (90%+)"
     },
     "skill_master_grammar": {
+        "code": 21,
         "name": "Grammar Guru",
         "icon": "📝",
         "points": 150,
         "description": "Mastered grammar skill (90%+)"
     },
     "skill_master_fluency": {
+        "code": 22,
         "name": "Fluency Hero",
         "icon": "📖",
         "points": 150,
@@ -151,36 +180,42 @@ ACHIEVEMENT_DEFINITIONS = {
 
     # SPECIAL BADGES
     "speed_demon": {
+        "code": 23,
         "name": "Speed Demon",
         "icon": "⚡",
         "points": 100,
         "description": "Completed activity in under 2 minutes"
     },
     "night_owl": {
+        "code": 24,
         "name": "Night Owl",
         "icon": "🦉",
         "points": 50,
         "description": "Completed activity after 8 PM"
     },
     "early_bird": {
+        "code": 25,
         "name": "Early Bird",
         "icon": "🐦",
         "points": 50,
         "description": "Completed activity before 9 AM"
     },
     "perfectionist": {
+        "code": 26,
         "name": "Perfectionist",
         "icon": "💎",
         "points": 300,
         "description": "5 perfect activity scores in a row"
     },
     "explorer": {
+        "code": 27,
         "name": "Explorer",
         "icon": "🗺️",
         "points": 100,
         "description": "Tried all 3 activity types"
     },
     "social_butterfly": {
+        "code": 28,
         "name": "Social Butterfly",
         "icon": "🦋",
         "points": 75,
@@ -189,50 +224,60 @@ ACHIEVEMENT_DEFINITIONS = {
 }
 
 
-def get_child_achievement_ids(session: Session, child_id: int) -> List[str]:
-    """Get list of achievement IDs a child has earned"""
-    achievements = session.exec(
-        select(Achievement).where(Achievement.child_id == child_id)
-    ).all()
+# Immutable catalog shared by every request
+ACHIEVEMENT_DEFINITIONS = MappingProxyType({key: MappingProxyType(d) for key, d in _DEFINITIONS.items()})
+ACHIEVEMENT_KEYS = MappingProxyType({d["code"]: key for key, d in _DEFINITIONS.items()})
 
-    # Map achievement names back to IDs
-    achievement_ids = []
-    for achievement in achievements:
-        # Find matching ID by name
-        for ach_id, definition in ACHIEVEMENT_DEFINITIONS.items():
-            if definition["name"] == achievement.achievement_name:
-                achievement_ids.append(ach_id)
-                break
+# Serialized once for the catalog endpoint; the ETag changes only when the catalog does
+CATALOG_JSON = json.dumps(
+    [{"id": key, **d} for key, d in _DEFINITIONS.items()], ensure_ascii=False, separators=(",", ":")
+)
+CATALOG_ETAG = '"' + hashlib.sha1(CATALOG_JSON.encode("utf-8")).hexdigest() + '"'
 
-    return achievement_ids
 
+def get_child_achievement_codes(session: Session, child_id: int) -> Set[int]:
+    """Codes of the badges a child holds (primary-key range scan, no text columns)"""
+    return set(session.exec(select(Achievement.achievement_code).where(Achievement.child_id == child_id)).all())
+
+
+def achievement_mask(codes: Iterable[int]) -> int:
+    """Bitmask with bit `code` set for each earned badge"""
+    mask = 0
+    for code in codes:
+        mask |= 1 << code
+    return mask
+
+
+def get_child_achievement_ids(session: Session, child_id: int) -> List[str]:
+    """Get list of achievement IDs a child has earned"""
+    codes = get_child_achievement_codes(session, child_id)
+    return [ACHIEVEMENT_KEYS[code] for code in sorted(codes) if code in ACHIEVEMENT_KEYS]
 
-def award_achievement(session: Session, child_id: int, achievement_id: str) -> Achievement:
-    """Award an achievement to a child (checks if already earned)"""
-    # Check if already earned
-    earned_ids = get_child_achievement_ids(session, child_id)
-    if achievement_id in earned_ids:
-        return None
 
-    # Get achievement definition
+def award_achievement(session: Session, child_id: int, achievement_id: str, earned_codes: Optional[Set[int]] = None) -> Optional[Achievement]:
+    """
+    Award an achievement to a child; returns None if it was already earned.
+    Pass earned_codes (updated in place) to skip the lookup; the caller commits.
+    """
     if achievement_id not in ACHIEVEMENT_DEFINITIONS:
         raise ValueError(f"Unknown achievement ID: {achievement_id}")
 
-    definition = ACHIEVEMENT_DEFINITIONS[achievement_id]
+    code = ACHIEVEMENT_DEFINITIONS[achievement_id]["code"]
+    if earned_codes is None:
+        earned_codes = get_child_achievement_codes(session, child_id)
+    if code in earned_codes:
+        return None
 
-    # Create achievement record
-    achievement = Achievement(
-        child_id=child_id,
-        achievement_name=definition["name"],
-        description=definition["description"],
-        badge_icon=definition["icon"]
+    awarded_at = datetime.utcnow()
+    # The primary key settles races with a concurrent award of the same badge
+    result = session.execute(
+        insert(Achievement).values(child_id=child_id, achievement_code=code, awarded_at=awarded_at).on_conflict_do_nothing()
     )
+    earned_codes.add(code)
+    if not result.rowcount:
+        return None
 
-    session.add(achievement)
-    session.commit()
-    session.refresh(achievement)
-
-    return achievement
+    return Achievement(child_id=child_id, achievement_code=code, awarded_at=awarded_at)
 
 
 def check_and_award_achievements(
@@ -246,73 +291,31 @@ def check_and_award_achievements(
     Check all achievement conditions and award any new ones.
     Returns list of newly earned achievements.
     """
-    newly_earned = []
-
-    # Get current stats
-    completed_activities = session.exec(
-        select(ActivityProgress).join(Activity).where(
-            Activity.child_id == child.id,
-            ActivityProgress.completion_status == "Completed"
-        )
-    ).all()
-
-    total_completed = len(completed_activities)
-
-    # Get latest assessment
-    latest_assessment = None
-    if child.assessments:
-        latest_assessment = child.assessments[-1]
+    from .achievement_rules import evaluate_rules  # Rules import the definitions above
 
-    # ===== ACTIVITY ACHIEVEMENTS =====
+    newly_earned = []
+    earned_codes = get_child_achievement_codes(session, child.id)
+    activity_template = get_template(session, activity.template_id) if activity else None
 
-    # First activity
-    if total_completed >= 1:
-        newly_earned.append(award_achievement(session, child.id, "first_activity"))
+    # ===== RULE-BASED ACHIEVEMENTS =====
+    # Activity counts, tracing, marathon, assessment, skill and streak badges (see ACHIEVEMENT_RULES)
+    for achievement_id in evaluate_rules(session, child.id):
+        newly_earned.append(award_achievement(session, child.id, achievement_id, earned_codes))
 
-    # Five activities
-    if total_completed >= 5:
-        newly_earned.append(award_achievement(session, child.id, "five_activities"))
+    # ===== EVENT ACHIEVEMENTS =====
+    # These depend on this submission's score/duration, which isn't stored
 
     # Letter Hunt Champion (perfect score on Letter Hunt)
-    if activity and "letter hunt" in activity.activity_name.lower() and score >= 90:
-        newly_earned.append(award_achievement(session, child.id, "letter_hunt_champion"))
+    if activity_template and "letter hunt" in activity_template.activity_name.lower() and score >= 90:
+        newly_earned.append(award_achievement(session, child.id, "letter_hunt_champion", earned_codes))
 
     # Phonics Genius (perfect score on Phonics)
-    if activity and "phonics" in activity.activity_name.lower() and score >= 90:
-        newly_earned.append(award_achievement(session, child.id, "phonics_genius"))
-
-    # Tiny Artist (3 tracing activities)
-    tracing_count = len([a for a in completed_activities if a.activity.activity_type == "Tracing"])
-    if tracing_count >= 3:
-        newly_earned.append(award_achievement(session, child.id, "tiny_artist"))
-
-    # Activity Marathon (10 activities in one day) - TODO: Need timestamp tracking
-    # if total_completed >= 10:
-    #     newly_earned.append(award_achievement(session, child.id, "activity_marathon"))
-
-    # ===== SPECIAL ACHIEVEMENTS =====
+    if activity_template and "phonics" in activity_template.activity_name.lower() and score >= 90:
+        newly_earned.append(award_achievement(session, child.id, "phonics_genius", earned_codes))
 
     # Speed Demon (under 2 minutes)
     if duration_seconds > 0 and duration_seconds < 120:
-        newly_earned.append(award_achievement(session, child.id, "speed_demon"))
-
-    # ===== ASSESSMENT ACHIEVEMENTS =====
-
-    if latest_assessment:
-        # First assessment
-        newly_earned.append(award_achievement(session, child.id, "first_assessment"))
-
-        # Perfect score (100% accuracy)
-        if latest_assessment.accuracy_percentage >= 100:
-            newly_earned.append(award_achievement(session, child.id, "perfect_score"))
-
-    # ===== STREAK ACHIEVEMENTS =====
-    # TODO: Need proper streak tracking in Progress model
-    # For now, skip streak achievements
-
-    # ===== SKILL BADGES =====
-    # TODO: Need skill mastery tracking from assessment
-    # For now, skip skill badges
+        newly_earned.append(award_achievement(session, child.id, "speed_demon", earned_codes))
 
     # Filter out None values (already earned)
     newly_earned = [a for a in newly_earned if a is not None]
@@ -0,0 +1,107 @@
+"""
+Activity Template Catalog - Interned, In-Memory Activity Definitions
+Plans reference shared ActivityTemplate rows instead of copying their text per child
+"""
+
+import hashlib
+import threading
+from typing import Dict, List, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from ..database import engine
+from ..models import ActivityTemplate
+from .metrics import record_cache
+
+# Process-wide cache: template id -> template, fingerprint -> template id
+_templates_by_id: Dict[int, ActivityTemplate] = {}
+_ids_by_fingerprint: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def template_fingerprint(template: ActivityTemplate) -> str:
+    """Stable hash of the fields that make two templates identical"""
+    parts = [
+        template.activity_type,
+        template.activity_name,
+        template.activity_content,
+        str(template.estimated_duration_minutes),
+        template.language or "English",
+        template.difficulty_level,
+    ]
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def _cache(template: ActivityTemplate) -> None:
+    # Keep a detached copy so cached objects never belong to a request session
+    detached = ActivityTemplate(**template.model_dump())
+    with _lock:
+        _templates_by_id[detached.id] = detached
+        _ids_by_fingerprint[detached.fingerprint] = detached.id
+
+
+def load_activity_catalog() -> int:
+    """Warm the cache with every stored template (called at startup)"""
+    with Session(engine) as session:
+        templates = session.exec(select(ActivityTemplate)).all()
+        for template in templates:
+            _cache(template)
+    return len(templates)
+
+
+def intern_templates(templates: List[ActivityTemplate]) -> List[int]:
+    """
+    Return the catalog id for each template, inserting the ones not seen before.
+    Uses its own short transaction, so call it before the caller starts writing.
+    """
+    fingerprints = [template_fingerprint(t) for t in templates]
+    missing = {fp: t for fp, t in zip(fingerprints, templates) if fp not in _ids_by_fingerprint}
+
+    if missing:
+        with Session(engine) as session:
+            # Another worker may have inserted some of them already
+            existing = session.exec(
+                select(ActivityTemplate).where(ActivityTemplate.fingerprint.in_(list(missing)))
+            ).all()
+            for template in existing:
+                _cache(template)
+                missing.pop(template.fingerprint, None)
+
+            new_templates = []
+            for fingerprint, template in missing.items():
+                new_templates.append(ActivityTemplate(
+                    fingerprint=fingerprint,
+                    activity_type=template.activity_type,
+                    activity_name=template.activity_name,
+                    activity_content=template.activity_content,
+                    estimated_duration_minutes=template.estimated_duration_minutes,
+                    language=template.language or "English",
+                    difficulty_level=template.difficulty_level
+                ))
+
+            if new_templates:
+                session.add_all(new_templates)
+                try:
+                    session.commit()
+                except IntegrityError:
+                    # Lost an insert race; the rows exist now, so just read them back
+                    session.rollback()
+                    new_templates = session.exec(
+                        select(ActivityTemplate).where(ActivityTemplate.fingerprint.in_(list(missing)))
+                    ).all()
+                for template in new_templates:
+                    session.refresh(template)
+                    _cache(template)
+
+    return [_ids_by_fingerprint[fp] for fp in fingerprints]
+
+
+def get_template(session: Session, template_id: int) -> Optional[ActivityTemplate]:
+    """Look up a template by id, hitting the database only on a cache miss"""
+    template = _templates_by_id.get(template_id)
+    record_cache("activity-templates", template is not None)
+    if template is None:
+        template = session.get(ActivityTemplate, template_id)
+        if template is not None:
+            _cache(template)
+            template = _templates_by_id[template_id]
+    return template
@@ -0,0 +1,214 @@
+"""
+Plan Archival - Keeps the Hot Tables Small
+Plans superseded or ended more than a retention window ago are moved, with their
+activities, progress and assessment questions, into a separate SQLite file (archive.db)
+in bounded batches. Counters that must survive the move live in rollup tables.
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection
+from ..database import engine, archive_file_name, create_db_and_tables
+
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "50"))  # plans per transaction
+EXPIRED_GRACE_DAYS = int(os.getenv("ARCHIVE_EXPIRED_GRACE_DAYS", "30"))
+
+# Lookup columns for the history API and the columnar export (archive tables are plain copies without indexes)
+ARCHIVE_INDEXES = {
+    "learningplan": ("assessment_id",),
+    "activity": ("plan_id", "child_id", "row_version"),
+    "activityprogress": ("activity_id", "row_version"),
+    "assessmentquestion": ("assessment_id",),
+}
+
+
+def attach_archive(connection: Connection) -> None:
+    """ATTACH archive.db as schema "archive" (must run outside a transaction)"""
+    attached = {row[1] for row in connection.execute(text("PRAGMA database_list"))}
+    if "archive" not in attached:
+        connection.execute(text("ATTACH DATABASE :path AS archive"), {"path": archive_file_name})
+
+
+def _archive_table_exists(connection: Connection, table: str) -> bool:
+    return bool(connection.execute(text(f'PRAGMA archive.table_info("{table}")')).first())
+
+
+def _ensure_archive_table(connection: Connection, table: str) -> List[str]:
+    """Create/extend the archive copy of a table to match main; returns the column list"""
+    main_columns = [row[1] for row in connection.execute(text(f'PRAGMA main.table_info("{table}")'))]
+    archive_columns = {row[1] for row in connection.execute(text(f'PRAGMA archive.table_info("{table}")'))}
+
+    if not archive_columns:
+        connection.execute(text(f'CREATE TABLE archive."{table}" AS SELECT * FROM main."{table}" WHERE 0'))
+    else:
+        for column in main_columns:
+            if column not in archive_columns:
+                connection.execute(text(f'ALTER TABLE archive."{table}" ADD COLUMN "{column}"'))
+                if column == "row_version":
+                    # Same stamp main's older rows got, so the columnar export still sees them
+                    connection.execute(text(f'UPDATE archive."{table}" SET row_version = id'))
+    # Every time, so archives created before an index was added pick it up
+    for column in ARCHIVE_INDEXES[table]:
+        connection.execute(text(
+            f'CREATE INDEX IF NOT EXISTS archive."ix_archive_{table}_{column}" ON "{table}" ("{column}")'
+        ))
+
+    return main_columns
+
+
+def _move_rows(connection: Connection, table: str, where: str, **params) -> int:
+    """Copy matching rows into the archive and delete them from main"""
+    columns = ", ".join(f'"{c}"' for c in _ensure_archive_table(connection, table))
+    expanding = [bindparam(name, expanding=True) for name, value in params.items() if isinstance(value, list)]
+
+    insert = text(f'INSERT INTO archive."{table}" ({columns}) SELECT {columns} FROM main."{table}" WHERE {where}')
+    delete = text(f'DELETE FROM main."{table}" WHERE {where}')
+    connection.execute(insert.bindparams(*expanding), params)
+    return connection.execute(delete.bindparams(*expanding), params).rowcount
+
+
+def archive_batch(batch_size: int = ARCHIVE_BATCH_SIZE) -> Dict[str, int]:
+    """Archive up to batch_size plans ended or superseded more than the retention window ago (one transaction)"""
+    cutoff = datetime.utcnow() - timedelta(days=EXPIRED_GRACE_DAYS)
+    moved = {"plans": 0, "activities": 0, "progress": 0, "questions": 0}
+
+    with engine.connect() as connection:
+        attach_archive(connection)
+
+        plans = connection.execute(text(
+            "SELECT id, assessment_id FROM learningplan "
+            "WHERE plan_end_date < :cutoff OR (status = 'Superseded' AND superseded_at < :cutoff) "
+            "ORDER BY id LIMIT :limit"
+        ), {"cutoff": cutoff.isoformat(sep=" "), "limit": batch_size}).all()
+        if not plans:
+            return moved
+
+        plan_ids = [plan.id for plan in plans]
+        assessment_ids = [plan.assessment_id for plan in plans]
+
+        # Expired (never superseded) plans may still be a child's active plan
+        connection.execute(text(
+            "UPDATE learningplan SET status = 'Expired' WHERE id IN :plan_ids AND status = 'Active'"
+        ).bindparams(bindparam("plan_ids", expanding=True)), {"plan_ids": plan_ids})
+        connection.execute(text(
+            "UPDATE child SET active_plan_id = NULL WHERE active_plan_id IN :plan_ids"
+        ).bindparams(bindparam("plan_ids", expanding=True)), {"plan_ids": plan_ids})
+
+        moved["progress"] = _move_rows(
+            connection, "activityprogress",
+            "activity_id IN (SELECT id FROM main.activity WHERE plan_id IN :plan_ids)",
+            plan_ids=plan_ids
+        )
+        moved["activities"] = _move_rows(connection, "activity", "plan_id IN :plan_ids", plan_ids=plan_ids)
+
+        # Questions of a child's latest assessment stay hot
+        latest_ids = {row[0] for row in connection.execute(text(
+            "SELECT latest_assessment_id FROM child WHERE latest_assessment_id IN :assessment_ids"
+        ).bindparams(bindparam("assessment_ids", expanding=True)), {"assessment_ids": assessment_ids})}
+        cold_assessment_ids = [a for a in assessment_ids if a not in latest_ids]
+        if cold_assessment_ids:
+            moved["questions"] = _move_rows(
+                connection, "assessmentquestion", "assessment_id IN :assessment_ids",
+                assessment_ids=cold_assessment_ids
+            )
+
+        moved["plans"] = _move_rows(connection, "learningplan", "id IN :plan_ids", plan_ids=plan_ids)
+        # One commit covers both files, so every row ends up in exactly one of them
+        connection.commit()
+
+    return moved
+
+
+def run_archival(batch_size: int = ARCHIVE_BATCH_SIZE, max_batches: Optional[int] = None) -> Dict[str, int]:
+    """Archive batches until nothing is eligible (or max_batches is reached)"""
+    totals = {"plans": 0, "activities": 0, "progress": 0, "questions": 0}
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(batch_size)
+        if not moved["plans"]:
+            break
+        for key, count in moved.items():
+            totals[key] += count
+        batches += 1
+
+    return totals
+
+
+# ==================== HISTORY READS ====================
+
+def _archive_rows(query: str, params: Dict, required_tables: List[str]) -> List[Dict]:
+    if not os.path.exists(archive_file_name):
+        return []
+    with engine.connect() as connection:
+        attach_archive(connection)
+        if not all(_archive_table_exists(connection, t) for t in required_tables):
+            return []
+        return [dict(row._mapping) for row in connection.execute(text(query), params)]
+
+
+def get_archived_plans(child_id: int) -> List[Dict]:
+    """Archived plans of a child, newest first"""
+    return _archive_rows(
+        "SELECT p.id, p.assessment_id, p.status, p.focus_areas, p.duration_weeks, "
+        "p.plan_start_date, p.plan_end_date, "
+        "(SELECT COUNT(*) FROM archive.activity a WHERE a.plan_id = p.id) AS activity_count "
+        "FROM archive.learningplan p JOIN main.assessment s ON s.id = p.assessment_id "
+        "WHERE s.child_id = :child_id ORDER BY p.id DESC",
+        {"child_id": child_id},
+        ["learningplan", "activity"]
+    )
+
+
+def get_archived_plan_activities(child_id: int, plan_id: int) -> List[Dict]:
+    """Archived activities of one plan with their archived progress (if any)"""
+    return _archive_rows(
+        "SELECT a.id, a.template_id, a.week, a.day, ap.completion_status, ap.total_time_spent_minutes "
+        "FROM archive.activity a LEFT JOIN archive.activityprogress ap ON ap.activity_id = a.id "
+        "WHERE a.plan_id = :plan_id AND a.child_id = :child_id ORDER BY a.week, a.day, a.id",
+        {"child_id": child_id, "plan_id": plan_id},
+        ["activity", "activityprogress"]
+    )
+
+
+def get_archived_progress_page(child_id: int, status: Optional[str], after: Optional[Tuple[int, int]], limit: int) -> List[Dict]:
+    """Keyset page of a child's archived progress, shaped and ordered like the live history"""
+    activity_id, progress_id = after or (0, 0)
+    return _archive_rows(
+        "SELECT ap.id, ap.activity_id, t.activity_name, t.activity_type, "
+        "ap.completion_status, ap.total_time_spent_minutes "
+        "FROM archive.activity a JOIN archive.activityprogress ap ON ap.activity_id = a.id "
+        "JOIN main.activitytemplate t ON t.id = a.template_id "
+        "WHERE a.child_id = :child_id AND (:status IS NULL OR ap.completion_status = :status) "
+        "AND (a.id > :activity_id OR (a.id = :activity_id AND ap.id > :progress_id)) "
+        "ORDER BY a.id, ap.id LIMIT :limit",
+        {"child_id": child_id, "status": status, "activity_id": activity_id, "progress_id": progress_id, "limit": limit},
+        ["activity", "activityprogress"]
+    )
+
+
+def is_archived_activity(activity_id: int) -> bool:
+    return bool(_archive_rows(
+        "SELECT id FROM archive.activity WHERE id = :activity_id", {"activity_id": activity_id}, ["activity"]
+    ))
+
+
+def get_archived_type_completions() -> List[Dict]:
+    """Completed archived activities per (child, activity type), for seeding ChildTypeProgress"""
+    return _archive_rows(
+        "SELECT a.child_id, t.activity_type, COUNT(*) AS completed "
+        "FROM archive.activity a JOIN archive.activityprogress ap ON ap.activity_id = a.id "
+        "JOIN main.activitytemplate t ON t.id = a.template_id "
+        "WHERE ap.completion_status = 'Completed' AND a.child_id IS NOT NULL "
+        "GROUP BY a.child_id, t.activity_type",
+        {},
+        ["activity", "activityprogress"]
+    )
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.utils.archival
+    create_db_and_tables()
+    print(f"🔴 Archived: {run_archival()}")
@@ -0,0 +1,106 @@
+"""
+Child Deletion - Set-Based Subtree Removal
+A child's whole history is removed with one DELETE per table instead of loading it through the ORM
+"""
+
+import os
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import text
+from sqlmodel import Session, select, delete, func, col
+from ..database import engine, archive_file_name
+from ..models import (
+    Child, Assessment, AssessmentQuestion, LearningPlan, Activity, ActivityProgress,
+    Achievement, SkillSnapshot, SkillMasteryPoint, ChildProgress, ChildTypeProgress, DailyActivity,
+    ClassroomMember, PlacementTest
+)
+from .archival import attach_archive
+
+# Above this many activity + assessment rows, the delete runs after the response is sent
+BACKGROUND_DELETE_THRESHOLD = int(os.getenv("CHILD_DELETE_BACKGROUND_THRESHOLD", "2000"))
+
+
+def count_child_rows(session: Session, child_id: int) -> int:
+    """Rough subtree size (index-only counts of the two widest fan-outs)"""
+    activities = session.exec(select(func.count()).select_from(Activity).where(Activity.child_id == child_id)).one()
+    assessments = session.exec(select(func.count()).select_from(Assessment).where(Assessment.child_id == child_id)).one()
+    return activities + assessments
+
+
+def detach_child(session: Session, child: Child) -> None:
+    """Hide a child from its parent immediately and mark it for the purge; the subtree is deleted later"""
+    child.parent_id = None
+    child.deleted_at = datetime.utcnow()
+    session.add(child)
+    session.commit()
+
+
+def _delete_archived_rows(connection, child_id: int) -> Dict[str, int]:
+    """Archived plans/activities/progress/questions of the child (archive.db)"""
+    deleted = {}
+    attach_archive(connection)
+    tables = {row[0] for row in connection.execute(text("SELECT name FROM archive.sqlite_master WHERE type = 'table'"))}
+    assessment_ids = "SELECT id FROM main.assessment WHERE child_id = :child_id"
+    statements = [
+        ("activityprogress", "activity_id IN (SELECT id FROM archive.activity WHERE child_id = :child_id)"),
+        ("activity", "child_id = :child_id"),
+        ("assessmentquestion", f"assessment_id IN ({assessment_ids})"),
+        ("learningplan", f"assessment_id IN ({assessment_ids})"),
+    ]
+    for table, where in statements:
+        if table in tables:
+            result = connection.execute(text(f'DELETE FROM archive."{table}" WHERE {where}'), {"child_id": child_id})
+            deleted[f"archive.{table}"] = result.rowcount
+    return deleted
+
+
+def delete_child_subtree(child_id: int, commit_each: bool = False) -> Dict[str, int]:
+    """
+    Delete a child and everything hanging off it, leaves first.
+    commit_each=True commits after every statement so a large delete never holds
+    the write lock for long; each step still leaves no dangling references.
+    """
+    assessment_ids = select(Assessment.id).where(Assessment.child_id == child_id)
+    activity_ids = select(Activity.id).where(Activity.child_id == child_id)
+    statements = [
+        ("activityprogress", delete(ActivityProgress).where(col(ActivityProgress.activity_id).in_(activity_ids))),
+        ("activity", delete(Activity).where(Activity.child_id == child_id)),
+        ("assessmentquestion", delete(AssessmentQuestion).where(col(AssessmentQuestion.assessment_id).in_(assessment_ids))),
+        ("skillsnapshot", delete(SkillSnapshot).where(col(SkillSnapshot.assessment_id).in_(assessment_ids))),
+        ("learningplan", delete(LearningPlan).where(col(LearningPlan.assessment_id).in_(assessment_ids))),
+        ("skillmasterypoint", delete(SkillMasteryPoint).where(SkillMasteryPoint.child_id == child_id)),
+        ("achievement", delete(Achievement).where(Achievement.child_id == child_id)),
+        ("childprogress", delete(ChildProgress).where(ChildProgress.child_id == child_id)),
+        ("childtypeprogress", delete(ChildTypeProgress).where(ChildTypeProgress.child_id == child_id)),
+        ("dailyactivity", delete(DailyActivity).where(DailyActivity.child_id == child_id)),
+        ("classroommember", delete(ClassroomMember).where(ClassroomMember.child_id == child_id)),
+        ("placementtest", delete(PlacementTest).where(PlacementTest.child_id == child_id)),
+        ("assessment", delete(Assessment).where(Assessment.child_id == child_id)),
+        ("child", delete(Child).where(Child.id == child_id)),
+    ]
+
+    deleted = {}
+    with engine.connect() as connection:
+        # Archived rows are found through main.assessment, so they go first
+        if os.path.exists(archive_file_name):
+            deleted.update(_delete_archived_rows(connection, child_id))
+            if commit_each:
+                connection.commit()
+
+        for table, statement in statements:
+            deleted[table] = connection.execute(statement).rowcount
+            if commit_each:
+                connection.commit()
+        connection.commit()
+
+    return deleted
+
+
+def purge_detached_children() -> int:
+    """Finish deletes whose background task never ran (e.g. the worker restarted)"""
+    with Session(engine) as session:
+        # Only children marked by detach_child: a child may legitimately have no parent
+        child_ids = session.exec(select(Child.id).where(Child.deleted_at != None)).all()  # noqa: E711
+    for child_id in child_ids:
+        delete_child_subtree(child_id, commit_each=True)
+    return len(child_ids)
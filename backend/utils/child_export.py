@@ -0,0 +1,198 @@
+"""
+Child Export - Streaming Download of a Child's Complete History
+Each section is read in keyset windows through yield_per cursors; every window is
+serialized to NDJSON or CSV and handed to the response straight away, so memory
+stays bounded by the window size however long the history is.
+"""
+
+import csv
+import io
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import text
+from ..database import engine, archive_file_name
+from .achievements import ACHIEVEMENT_DEFINITIONS, ACHIEVEMENT_KEYS
+from .archival import attach_archive
+
+EXPORT_WINDOW_SIZE = int(os.getenv("CHILD_EXPORT_WINDOW_SIZE", "1000"))  # rows per read (and per response chunk)
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Per section: exported columns and one SELECT per schema ({schema} = main/archive).
+# "key" is the unique ordering column windows are paged on (default id, starting after "start");
+# "archived" names the table whose archive.db copy is exported too, ahead of the rows in main.
+EXPORT_SECTIONS = {
+    "assessments": {
+        "columns": [
+            "id", "child_id", "assessment_type", "total_questions", "correct_answers",
+            "accuracy_percentage", "assessment_date", "skill_level_result", "is_initial",
+        ],
+        "select": (
+            "SELECT id, child_id, assessment_type, total_questions, correct_answers, accuracy_percentage, "
+            "assessment_date, skill_level_result, is_initial "
+            "FROM {schema}.assessment WHERE child_id = :child_id"
+        ),
+        "archived": None,
+    },
+    "answers": {
+        "columns": [
+            "id", "child_id", "assessment_id", "question_type", "question_content", "child_answer",
+            "correct_answer", "time_spent_seconds", "is_correct",
+        ],
+        "select": (
+            "SELECT q.id, a.child_id, q.assessment_id, q.question_type, q.question_content, q.child_answer, "
+            "q.correct_answer, q.time_spent_seconds, q.is_correct "
+            "FROM {schema}.assessmentquestion q JOIN main.assessment a ON a.id = q.assessment_id "
+            "WHERE a.child_id = :child_id"
+        ),
+        "archived": "assessmentquestion",
+    },
+    "activities": {
+        "columns": [
+            "id", "child_id", "plan_id", "week", "day", "activity_type", "activity_name",
+            "difficulty_level", "estimated_duration_minutes",
+        ],
+        "select": (
+            "SELECT a.id, a.child_id, a.plan_id, a.week, a.day, t.activity_type, t.activity_name, "
+            "t.difficulty_level, t.estimated_duration_minutes "
+            "FROM {schema}.activity a JOIN main.activitytemplate t ON t.id = a.template_id "
+            "WHERE a.child_id = :child_id"
+        ),
+        "archived": "activity",
+    },
+    "progress": {
+        "columns": ["id", "child_id", "activity_id", "completion_status", "total_time_spent_minutes"],
+        "select": (
+            "SELECT p.id, a.child_id, p.activity_id, p.completion_status, p.total_time_spent_minutes "
+            "FROM {schema}.activityprogress p JOIN {schema}.activity a ON a.id = p.activity_id "
+            "WHERE a.child_id = :child_id"
+        ),
+        "archived": "activityprogress",
+    },
+    "daily_activity": {
+        "columns": ["child_id", "day", "events", "activities_completed", "score", "minutes"],
+        "select": (
+            "SELECT child_id, day, events, activities_completed, score, minutes "
+            "FROM {schema}.dailyactivity WHERE child_id = :child_id"
+        ),
+        "key": "day",
+        "start": "",
+        "archived": None,
+    },
+    "badges": {
+        "columns": ["child_id", "achievement_code", "achievement_id", "name", "awarded_at"],
+        "select": (
+            "SELECT child_id, achievement_code, awarded_at "
+            "FROM {schema}.achievement WHERE child_id = :child_id"
+        ),
+        "key": "achievement_code",
+        "archived": None,
+    },
+}
+
+
+def _badge_row(row: Dict) -> Dict:
+    """Catalog key and name for the stored code (names live in memory, not in the table)"""
+    achievement_id = ACHIEVEMENT_KEYS.get(row["achievement_code"])
+    row["achievement_id"] = achievement_id
+    row["name"] = ACHIEVEMENT_DEFINITIONS[achievement_id]["name"] if achievement_id else None
+    return row
+
+
+_ROW_TRANSFORMS = {"badges": _badge_row}
+
+
+def _section_queries(connection, section: str) -> List[str]:
+    """
+    Keyset window queries for the section: the archive copy (older history) when it exists, then main.
+    The two are paged separately because main can reuse ids of rows that were moved out.
+    """
+    spec = EXPORT_SECTIONS[section]
+    key = spec.get("key", "id")
+    schemas = ["main"]
+    if spec["archived"] and os.path.exists(archive_file_name):
+        table = spec["archived"]
+        if connection.execute(text(f'PRAGMA archive.table_info("{table}")')).first():
+            schemas.insert(0, "archive")
+    return [
+        f"SELECT * FROM ({spec['select'].format(schema=schema)}) WHERE {key} > :after ORDER BY {key} LIMIT :limit"
+        for schema in schemas
+    ]
+
+
+def _iter_windows(connection, section: str, child_id: int, window_size: int) -> Iterator[List[Dict]]:
+    """
+    Rows of one section in windows of at most window_size. Each window is read through a
+    yield_per cursor and the read is ended before the window is handed on, so a slow
+    client never holds SQLite's shared lock (which would block every writer).
+    """
+    spec = EXPORT_SECTIONS[section]
+    key = spec.get("key", "id")
+    transform = _ROW_TRANSFORMS.get(section)
+
+    for query in _section_queries(connection, section):
+        after = spec.get("start", 0)
+        while True:
+            result = connection.execution_options(yield_per=window_size).execute(
+                text(query), {"child_id": child_id, "after": after, "limit": window_size}
+            )
+            rows = [dict(row._mapping) for partition in result.partitions() for row in partition]
+            connection.rollback()
+            if not rows:
+                break
+            after = rows[-1][key]
+            yield [transform(row) for row in rows] if transform else rows
+            if len(rows) < window_size:
+                break
+
+
+def stream_export(
+    child_ids: Iterable[int],
+    sections: List[str],
+    export_format: str,
+    window_size: int = EXPORT_WINDOW_SIZE,
+) -> Iterator[str]:
+    """
+    Response body chunks for the given children and sections (one chunk per window).
+    NDJSON: one object per line tagged with "record" (the section name).
+    CSV: a header row, then one row per record (a single section only).
+    """
+    child_ids = list(child_ids)
+    with engine.connect() as connection:
+        # ATTACH must happen before the first statement opens a transaction
+        if os.path.exists(archive_file_name) and any(EXPORT_SECTIONS[s]["archived"] for s in sections):
+            attach_archive(connection)
+
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_SECTIONS[sections[0]]["columns"], extrasaction="ignore")
+            writer.writeheader()
+            for child_id in child_ids:
+                for rows in _iter_windows(connection, sections[0], child_id, window_size):
+                    writer.writerows(rows)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+            return
+
+        for child_id in child_ids:
+            for section in sections:
+                for rows in _iter_windows(connection, section, child_id, window_size):
+                    yield "".join(
+                        json.dumps({"record": section, **row}) + "\n"
+                        for row in rows
+                    )
+
+
+def parse_sections(value: Optional[str]) -> List[str]:
+    """Comma-separated section names (default: all, in export order); raises ValueError on unknown ones"""
+    if not value:
+        return list(EXPORT_SECTIONS)
+    sections = [s.strip() for s in value.split(",") if s.strip()]
+    unknown = [s for s in sections if s not in EXPORT_SECTIONS]
+    if unknown:
+        raise ValueError(f"Unknown section(s): {', '.join(unknown)}")
+    return sections
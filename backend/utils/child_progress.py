@@ -0,0 +1,65 @@
+"""
+Child Progress Counters - Per-Child Score, Time and Completion Totals
+Updated with a single atomic upsert per event; family totals are aggregated on read
+"""
+
+from datetime import datetime, date
+from typing import Dict, List
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select, func
+from ..models import Child, ChildProgress, ChildTypeProgress
+from .streaks import streak_update
+
+
+def increment_child_progress(session: Session, child_id: int, score: int, minutes: int, completed: int, at: datetime, day: date) -> None:
+    """Add to a child's counters and advance its streak for `day` in one statement (caller commits)"""
+    statement = insert(ChildProgress).values(
+        child_id=child_id,
+        total_score=score,
+        streak_days=1,
+        total_time_minutes=minutes,
+        activities_completed=completed,
+        last_active_at=at,
+        last_active_day=day
+    ).on_conflict_do_update(
+        index_elements=["child_id"],
+        set_={
+            "total_score": ChildProgress.total_score + score,
+            "total_time_minutes": ChildProgress.total_time_minutes + minutes,
+            "activities_completed": ChildProgress.activities_completed + completed,
+            "last_active_at": at,
+            **streak_update(day),
+        }
+    )
+    session.execute(statement)
+
+
+def increment_type_completions(session: Session, child_id: int, activity_type: str) -> None:
+    """Count one more completed activity of a type for a child (caller commits)"""
+    statement = insert(ChildTypeProgress).values(
+        child_id=child_id,
+        activity_type=activity_type,
+        activities_completed=1
+    ).on_conflict_do_update(
+        index_elements=["child_id", "activity_type"],
+        set_={"activities_completed": ChildTypeProgress.activities_completed + 1}
+    )
+    session.execute(statement)
+
+
+def get_family_total_score(session: Session, parent_id: int) -> int:
+    """Sum of the children's scores for one parent"""
+    total = session.exec(
+        select(func.sum(ChildProgress.total_score))
+        .join(Child, Child.id == ChildProgress.child_id)
+        .where(Child.parent_id == parent_id)
+    ).one()
+    return total or 0
+
+
+def get_children_progress(session: Session, child_ids: List[int]) -> Dict[int, ChildProgress]:
+    """Counters for several children in one query (children without a row are omitted)"""
+    if not child_ids:
+        return {}
+    rows = session.exec(select(ChildProgress).where(ChildProgress.child_id.in_(child_ids))).all()
+    return {row.child_id: row for row in rows}
@@ -0,0 +1,159 @@
+"""
+Classroom Dashboard - One Set-Based Pass over a Whole Group
+Every member's level, plan progress, weekly activity, skills and last-active come from
+four grouped queries (not one dashboard per child), cached per classroom version.
+"""
+
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, Tuple
+from sqlalchemy import and_, case, exists, update
+from sqlmodel import Session, select, func
+from ..models import (
+    Child, Assessment, Activity, ActivityProgress, ChildProgress, DailyActivity,
+    SkillSnapshot, Classroom, ClassroomMember
+)
+from .item_bank import SKILL_DISPLAY_NAMES
+from .leaderboard import week_start
+from .streaks import current_streak
+from .metrics import record_cache
+
+CLASSROOM_CACHE_SIZE = int(os.getenv("CLASSROOM_CACHE_SIZE", "256"))  # dashboards kept per worker
+
+JOIN_CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # no 0/O or 1/I look-alikes
+JOIN_CODE_LENGTH = 6
+
+_lock = threading.Lock()
+_cache: "OrderedDict[int, Tuple[Tuple[int, date], Dict]]" = OrderedDict()
+
+
+def generate_join_code() -> str:
+    return "".join(secrets.choice(JOIN_CODE_ALPHABET) for _ in range(JOIN_CODE_LENGTH))
+
+
+def touch_child_classrooms(session: Session, child_id: int) -> None:
+    """Bump the version of every classroom the child is in, invalidating their dashboards (caller commits)"""
+    session.execute(
+        update(Classroom)
+        .where(Classroom.id.in_(select(ClassroomMember.classroom_id).where(ClassroomMember.child_id == child_id)))
+        .values(version=Classroom.version + 1)
+    )
+
+
+def build_classroom_dashboard(session: Session, classroom: Classroom, today: date) -> Dict:
+    """Per-child rows and per-skill class averages for one classroom"""
+    members = select(ClassroomMember.child_id).where(ClassroomMember.classroom_id == classroom.id)
+
+    # 1. Profile, counters and latest assessment date of every (non-deleted) member
+    children = session.exec(
+        select(
+            Child.id, Child.name, Child.age, Child.current_level,
+            ChildProgress.streak_days, ChildProgress.last_active_day, ChildProgress.last_active_at,
+            Assessment.assessment_date
+        )
+        .outerjoin(ChildProgress, ChildProgress.child_id == Child.id)
+        .outerjoin(Assessment, Assessment.id == Child.latest_assessment_id)
+        .where(Child.id.in_(members), Child.deleted_at == None)  # noqa: E711
+        .order_by(Child.name, Child.id)
+    ).all()
+
+    # 2. Active-plan completion (an activity counts once however many progress rows it has)
+    completed = exists().where(
+        ActivityProgress.activity_id == Activity.id,
+        ActivityProgress.completion_status == "Completed"
+    )
+    plan_progress = {
+        row[0]: (row[1], row[2] or 0)
+        for row in session.exec(
+            select(Activity.child_id, func.count(), func.sum(case((completed, 1), else_=0)))
+            .join(Child, and_(Child.id == Activity.child_id, Child.active_plan_id == Activity.plan_id))
+            .where(Activity.child_id.in_(members))
+            .group_by(Activity.child_id)
+        ).all()
+    }
+
+    # 3. This week's activity from the daily rollups
+    this_week = {
+        row[0]: (row[1] or 0, row[2] or 0)
+        for row in session.exec(
+            select(DailyActivity.child_id, func.sum(DailyActivity.activities_completed), func.sum(DailyActivity.minutes))
+            .where(DailyActivity.child_id.in_(members), DailyActivity.day >= week_start(today))
+            .group_by(DailyActivity.child_id)
+        ).all()
+    }
+
+    # 4. Skill mastery from each member's latest assessment
+    skills: Dict[int, Dict[str, int]] = {}
+    skill_names: Dict[str, str] = {}
+    for child_id, skill, skill_name, mastery in session.exec(
+        select(Child.id, SkillSnapshot.skill, SkillSnapshot.skill_name, SkillSnapshot.mastery_percentage)
+        .join(SkillSnapshot, SkillSnapshot.assessment_id == Child.latest_assessment_id)
+        .where(Child.id.in_(members))
+        .order_by(SkillSnapshot.id)
+    ).all():
+        skills.setdefault(child_id, {})[skill] = mastery
+        skill_names[skill] = SKILL_DISPLAY_NAMES.get(skill, skill_name)
+
+    rows = []
+    for child in children:
+        total, done = plan_progress.get(child.id, (0, 0))
+        activities_this_week, minutes_this_week = this_week.get(child.id, (0, 0))
+        last_active = max((d for d in (child.assessment_date, child.last_active_at) if d), default=None)
+        rows.append({
+            "id": child.id,
+            "name": child.name,
+            "age": child.age,
+            "level": child.current_level,
+            "streak": current_streak(child, today),
+            "weekly_progress": int(done / total * 100) if total else 0,
+            "activities_completed": done,
+            "total_activities": total,
+            "activities_this_week": activities_this_week,
+            "minutes_this_week": minutes_this_week,
+            "skills": skills.get(child.id, {}),
+            "last_active": last_active.strftime("%Y-%m-%d") if last_active else None,
+        })
+
+    averages = []
+    for skill in sorted(skill_names):
+        values = [row["skills"][skill] for row in rows if skill in row["skills"]]
+        if values:
+            averages.append({
+                "skill": skill,
+                "skill_name": skill_names[skill],
+                "mean_mastery": round(sum(values) / len(values), 1),
+                "children": len(values),
+            })
+
+    return {
+        "classroom_id": classroom.id,
+        "name": classroom.name,
+        "version": classroom.version,
+        "generated_at": datetime.utcnow(),
+        "children": rows,
+        "skill_averages": averages,
+    }
+
+
+def get_classroom_dashboard(session: Session, classroom: Classroom, today: date) -> Dict:
+    """Cached dashboard; rebuilt when the classroom's version (or the day) changes"""
+    key = (classroom.version, today)
+    with _lock:
+        cached = _cache.get(classroom.id)
+        if cached and cached[0] == key:
+            _cache.move_to_end(classroom.id)
+            record_cache("classroom-dashboards", True)
+            return cached[1]
+    record_cache("classroom-dashboards", False)
+
+    dashboard = build_classroom_dashboard(session, classroom, today)
+    with _lock:
+        _cache[classroom.id] = (key, dashboard)
+        _cache.move_to_end(classroom.id)
+        while len(_cache) > CLASSROOM_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return dashboard
+
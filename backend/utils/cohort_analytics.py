@@ -0,0 +1,195 @@
+"""
+Cohort Analytics - Vectorized Distributions over Every Assessment
+Assessment and skill-snapshot columns are streamed into NumPy arrays in keyset chunks;
+percentiles, histograms and per-skill means are computed on the arrays and cached with a TTL.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import text
+from ..database import engine
+from .item_bank import SKILL_DISPLAY_NAMES
+from .metrics import record_cache
+
+ANALYTICS_TTL_SECONDS = float(os.getenv("ANALYTICS_TTL_SECONDS", "600"))
+ANALYTICS_CHUNK_SIZE = int(os.getenv("ANALYTICS_CHUNK_SIZE", "20000"))
+# Cohorts smaller than this are left out so no single family can be picked out
+MIN_COHORT_SIZE = int(os.getenv("ANALYTICS_MIN_COHORT_SIZE", "5"))
+
+DIMENSIONS = ("age", "level", "native_language")
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = np.arange(0, 101, 10)  # 0-10, 10-20, ..., 90-100 (last bin includes 100)
+
+_lock = threading.Lock()
+_dataset: Optional[Dict[str, np.ndarray]] = None
+_dataset_loaded_at = 0.0
+_results: Dict[str, Dict] = {}
+
+
+class _Codes:
+    """Interns strings to small integer codes so categorical columns fit in int arrays"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def encode(self, values) -> np.ndarray:
+        codes = self._codes
+        for value in set(values) - codes.keys():
+            codes[value] = len(self.values)
+            self.values.append(value)
+        return np.fromiter((codes[v] for v in values), dtype=np.int32, count=len(values))
+
+
+def _stream(connection, query: str, chunk_size: int):
+    """Keyset-paginated chunks of rows (first column must be the increasing id)"""
+    last_id = 0
+    while True:
+        rows = connection.execute(text(query), {"last_id": last_id, "limit": chunk_size}).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def load_dataset(chunk_size: int = ANALYTICS_CHUNK_SIZE) -> Dict[str, np.ndarray]:
+    """Column arrays for every assessment and every skill snapshot (sorted by assessment id)"""
+    levels, languages, skills = _Codes(), _Codes(), _Codes()
+    assessment_chunks = []
+    snapshot_chunks = []
+
+    with engine.connect() as connection:
+        for rows in _stream(connection, (
+            "SELECT a.id, a.child_id, a.accuracy_percentage, c.age, a.skill_level_result, c.native_language "
+            "FROM assessment a JOIN child c ON c.id = a.child_id "
+            "WHERE a.id > :last_id ORDER BY a.id LIMIT :limit"
+        ), chunk_size):
+            ids, child_ids, accuracy, ages, level_names, language_names = zip(*rows)
+            assessment_chunks.append((
+                np.array(ids, dtype=np.int64),
+                np.array(child_ids, dtype=np.int64),
+                np.array(accuracy, dtype=np.float64),
+                np.array(ages, dtype=np.int32),
+                levels.encode(level_names),
+                languages.encode(language_names),
+            ))
+
+        for rows in _stream(connection, (
+            "SELECT id, assessment_id, skill, mastery_percentage FROM skillsnapshot "
+            "WHERE id > :last_id ORDER BY id LIMIT :limit"
+        ), chunk_size):
+            _, assessment_ids, skill_names, mastery = zip(*rows)
+            snapshot_chunks.append((
+                np.array(assessment_ids, dtype=np.int64),
+                skills.encode(skill_names),
+                np.array(mastery, dtype=np.float64),
+            ))
+
+    def concat(chunks, i, dtype):
+        return np.concatenate([chunk[i] for chunk in chunks]) if chunks else np.empty(0, dtype=dtype)
+
+    dataset = {
+        "assessment_id": concat(assessment_chunks, 0, np.int64),
+        "child_id": concat(assessment_chunks, 1, np.int64),
+        "accuracy": concat(assessment_chunks, 2, np.float64),
+        "age": concat(assessment_chunks, 3, np.int32),
+        "level": concat(assessment_chunks, 4, np.int32),
+        "native_language": concat(assessment_chunks, 5, np.int32),
+        "snapshot_assessment_id": concat(snapshot_chunks, 0, np.int64),
+        "snapshot_skill": concat(snapshot_chunks, 1, np.int32),
+        "snapshot_mastery": concat(snapshot_chunks, 2, np.float64),
+    }
+
+    # Vectorized join: position of each snapshot's assessment in the (sorted) assessment arrays
+    positions = np.searchsorted(dataset["assessment_id"], dataset["snapshot_assessment_id"])
+    positions = np.minimum(positions, max(len(dataset["assessment_id"]) - 1, 0))
+    matched = (
+        dataset["assessment_id"][positions] == dataset["snapshot_assessment_id"]
+        if len(dataset["assessment_id"]) else np.zeros(len(positions), dtype=bool)
+    )
+    dataset["snapshot_row"] = np.where(matched, positions, -1)
+    dataset["labels"] = {"level": levels.values, "native_language": languages.values, "skill": skills.values}
+    return dataset
+
+
+def _distribution(values: np.ndarray) -> Dict:
+    histogram, _ = np.histogram(values, bins=HISTOGRAM_BINS)
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 2),
+        "percentiles": {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+        "histogram": histogram.tolist(),
+    }
+
+
+def compute_cohorts(dataset: Dict[str, np.ndarray], dimension: str) -> List[Dict]:
+    """Accuracy distribution and per-skill mean mastery for each value of `dimension`"""
+    groups = dataset[dimension]
+    if not groups.size:
+        return []
+    labels = dataset["labels"].get(dimension)
+    skill_labels = dataset["labels"]["skill"]
+
+    group_values, group_index = np.unique(groups, return_inverse=True)
+    n_groups, n_skills = len(group_values), len(skill_labels)
+    assessment_counts = np.bincount(group_index, minlength=n_groups)
+
+    # Per-skill means for every (group, skill) pair in one bincount
+    valid = dataset["snapshot_row"] >= 0
+    snapshot_groups = group_index[dataset["snapshot_row"][valid]]
+    pair = snapshot_groups * max(n_skills, 1) + dataset["snapshot_skill"][valid]
+    pair_counts = np.bincount(pair, minlength=n_groups * n_skills).reshape(n_groups, n_skills) if n_skills else None
+    pair_sums = (
+        np.bincount(pair, weights=dataset["snapshot_mastery"][valid], minlength=n_groups * n_skills).reshape(n_groups, n_skills)
+        if n_skills else None
+    )
+
+    # Sorting once lets each group's rows be taken as a contiguous slice
+    order = np.argsort(group_index, kind="stable")
+    boundaries = np.concatenate(([0], np.cumsum(assessment_counts)))
+
+    cohorts = []
+    for g, value in enumerate(group_values):
+        if assessment_counts[g] < MIN_COHORT_SIZE:
+            continue
+        rows = order[boundaries[g]:boundaries[g + 1]]
+        skills = []
+        for s in sorted(range(n_skills), key=lambda s: skill_labels[s]):
+            if pair_counts[g, s]:
+                skills.append({
+                    "skill": skill_labels[s],
+                    "skill_name": SKILL_DISPLAY_NAMES.get(skill_labels[s], skill_labels[s]),
+                    "mean_mastery": round(float(pair_sums[g, s] / pair_counts[g, s]), 2),
+                    "samples": int(pair_counts[g, s]),
+                })
+        cohorts.append({
+            "value": labels[value] if labels else str(int(value)),
+            "assessments": int(assessment_counts[g]),
+            "children": int(np.unique(dataset["child_id"][rows]).size),
+            "accuracy": _distribution(dataset["accuracy"][rows]),
+            "skills": skills,
+        })
+    return cohorts
+
+
+def get_cohort_analytics(dimension: str) -> Dict:
+    """Cached result for one dimension; the dataset and results are rebuilt after the TTL"""
+    global _dataset, _dataset_loaded_at
+    with _lock:
+        now = time.time()
+        if _dataset is None or now - _dataset_loaded_at > ANALYTICS_TTL_SECONDS:
+            _dataset = load_dataset()
+            _dataset_loaded_at = now
+            _results.clear()
+        record_cache("cohort-analytics", dimension in _results)
+        if dimension not in _results:
+            _results[dimension] = {
+                "dimension": dimension,
+                "generated_at": _dataset_loaded_at,
+                "histogram_bins": HISTOGRAM_BINS.tolist(),
+                "cohorts": compute_cohorts(_dataset, dimension),
+            }
+        return _results[dimension]
@@ -0,0 +1,234 @@
+"""
+Columnar Export - Incremental Parquet Files for Analysts
+Learning tables are exported to EXPORT_DIR/<table>/dt=<date>/part-*.parquet so analysis
+never touches database.db. Each run exports only rows past the table's high-water mark:
+the id for append-only tables, row_version for tables updated in place (activity,
+activityprogress). A changed row is exported again with a higher row_version, so readers
+keep the highest row_version per id. Rows are read in short keyset chunks (a single long cursor would hold SQLite's read lock
+against live writers), and only a bounded number of Parquet writers stay open.
+"""
+
+import json
+import os
+import sys
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+from ..database import engine, database_dir, archive_file_name, create_db_and_tables
+from .archival import attach_archive
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(database_dir, "exports"))
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+EXPORT_MAX_OPEN_FILES = int(os.getenv("EXPORT_MAX_OPEN_FILES", "16"))
+STATE_FILE = os.path.join(EXPORT_DIR, "_state.json")
+
+# Per table: exported columns (Arrow types) and one SELECT per schema ({schema} = main/archive).
+# Every SELECT yields _key (the high-water-mark column) and _date (the partition day);
+# tables without a timestamp are partitioned by export day.
+EXPORT_TABLES = {
+    "assessment": {
+        "columns": [
+            ("id", pa.int64()), ("child_id", pa.int64()), ("assessment_type", pa.string()),
+            ("total_questions", pa.int32()), ("correct_answers", pa.int32()),
+            ("accuracy_percentage", pa.float64()), ("assessment_date", pa.timestamp("us")),
+            ("skill_level_result", pa.string()), ("is_initial", pa.bool_()),
+        ],
+        "select": (
+            "SELECT id AS _key, date(assessment_date) AS _date, id, child_id, assessment_type, total_questions, "
+            "correct_answers, accuracy_percentage, assessment_date, skill_level_result, is_initial "
+            "FROM {schema}.assessment"
+        ),
+        "archived": False,
+    },
+    "assessmentquestion": {
+        "columns": [
+            ("id", pa.int64()), ("assessment_id", pa.int64()), ("question_type", pa.string()),
+            ("question_content", pa.string()), ("child_answer", pa.string()), ("correct_answer", pa.string()),
+            ("time_spent_seconds", pa.int32()), ("is_correct", pa.bool_()),
+        ],
+        "select": (
+            "SELECT q.id AS _key, date(a.assessment_date) AS _date, q.id, q.assessment_id, q.question_type, "
+            "q.question_content, q.child_answer, q.correct_answer, q.time_spent_seconds, q.is_correct "
+            "FROM {schema}.assessmentquestion q JOIN main.assessment a ON a.id = q.assessment_id"
+        ),
+        "archived": True,
+    },
+    "activity": {
+        "columns": [
+            ("id", pa.int64()), ("child_id", pa.int64()), ("plan_id", pa.int64()), ("week", pa.int32()),
+            ("day", pa.int32()), ("template_id", pa.int64()), ("activity_type", pa.string()),
+            ("activity_name", pa.string()), ("difficulty_level", pa.string()),
+            ("estimated_duration_minutes", pa.int32()), ("row_version", pa.int64()),
+        ],
+        # carry_over_plan_activities rewrites plan_id/template_id in place
+        "select": (
+            "SELECT a.row_version AS _key, NULL AS _date, a.id, a.child_id, a.plan_id, a.week, a.day, a.template_id, "
+            "t.activity_type, t.activity_name, t.difficulty_level, t.estimated_duration_minutes, a.row_version "
+            "FROM {schema}.activity a JOIN main.activitytemplate t ON t.id = a.template_id"
+        ),
+        "archived": True,
+        "versioned": True,
+    },
+    "activityprogress": {
+        "columns": [
+            ("id", pa.int64()), ("activity_id", pa.int64()), ("completion_status", pa.string()),
+            ("total_time_spent_minutes", pa.int32()), ("row_version", pa.int64()),
+        ],
+        # record_progress updates completion_status/total_time_spent_minutes in place
+        "select": (
+            "SELECT row_version AS _key, NULL AS _date, id, activity_id, completion_status, "
+            "total_time_spent_minutes, row_version FROM {schema}.activityprogress"
+        ),
+        "archived": True,
+        "versioned": True,
+    },
+    "achievement": {
+        "columns": [("child_id", pa.int64()), ("achievement_code", pa.int32()), ("awarded_at", pa.timestamp("us"))],
+        # Composite primary key: the implicit rowid is the insertion order
+        "select": (
+            "SELECT rowid AS _key, date(awarded_at) AS _date, child_id, achievement_code, awarded_at "
+            "FROM {schema}.achievement"
+        ),
+        "archived": False,
+    },
+}
+
+
+def _load_state() -> Dict[str, int]:
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as handle:
+        return json.load(handle)
+
+
+def _save_state(state: Dict[str, int]) -> None:
+    temporary = STATE_FILE + ".tmp"
+    with open(temporary, "w") as handle:
+        json.dump(state, handle)
+    os.replace(temporary, STATE_FILE)
+
+
+def _chunk_query(connection, table: str) -> str:
+    """Keyset chunk over main (and archive, whose rows keep their original ids)"""
+    spec = EXPORT_TABLES[table]
+    where = " WHERE _key > :after"
+    parts = [f"SELECT * FROM ({spec['select'].format(schema='main')}){where}"]
+    if spec["archived"] and os.path.exists(archive_file_name):
+        if connection.execute(text(f'PRAGMA archive.table_info("{table}")')).first():
+            parts.append(f"SELECT * FROM ({spec['select'].format(schema='archive')}){where}")
+    return f"SELECT * FROM ({' UNION ALL '.join(parts)}) ORDER BY _key LIMIT :limit"
+
+
+class _PartitionWriters:
+    """Open Parquet writers keyed by partition day; the least recently used one is closed at the limit"""
+
+    def __init__(self, table_dir: str, schema: pa.Schema, run_id: str, max_open: int):
+        self.table_dir = table_dir
+        self.schema = schema
+        self.run_id = run_id
+        self.max_open = max_open
+        self.open: "OrderedDict[str, pq.ParquetWriter]" = OrderedDict()
+        self.paths: List[str] = []
+        self.sequence = 0
+
+    def write(self, day: str, batch: pa.RecordBatch) -> None:
+        writer = self.open.pop(day, None)
+        if writer is None:
+            if len(self.open) >= self.max_open:
+                _, oldest = self.open.popitem(last=False)
+                oldest.close()
+            partition_dir = os.path.join(self.table_dir, f"dt={day}")
+            os.makedirs(partition_dir, exist_ok=True)
+            self.sequence += 1
+            # Written under .tmp and renamed once the whole table run succeeds
+            path = os.path.join(partition_dir, f"part-{self.run_id}-{self.sequence:05d}.parquet.tmp")
+            writer = pq.ParquetWriter(path, self.schema, compression="snappy")
+            self.paths.append(path)
+        writer.write_batch(batch)
+        self.open[day] = writer
+
+    def close(self, publish: bool) -> None:
+        for writer in self.open.values():
+            writer.close()
+        self.open.clear()
+        for path in self.paths:
+            if publish:
+                os.replace(path, path[:-len(".tmp")])
+            elif os.path.exists(path):
+                os.remove(path)
+
+
+def export_table(table: str, after: int, run_id: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> Dict[str, int]:
+    """Export rows with _key > after; returns {"rows": n, "high_water_mark": last key}"""
+    spec = EXPORT_TABLES[table]
+    schema = pa.schema(spec["columns"])
+    names = [name for name, _ in spec["columns"]]
+    export_day = datetime.utcnow().date().isoformat()
+    writers = _PartitionWriters(os.path.join(EXPORT_DIR, table), schema, run_id, EXPORT_MAX_OPEN_FILES)
+    exported = 0
+
+    try:
+        with engine.connect() as connection:
+            if spec["archived"] and os.path.exists(archive_file_name):
+                attach_archive(connection)
+            query = text(_chunk_query(connection, table))
+
+            while True:
+                result = connection.execution_options(yield_per=chunk_size).execute(
+                    query, {"after": after, "limit": chunk_size}
+                )
+                rows = [row for partition in result.partitions() for row in partition]
+                connection.rollback()  # end the read so writers are never blocked between chunks
+                if not rows:
+                    break
+
+                # Group the chunk by partition day, then write one column batch per day
+                by_day: Dict[str, List] = {}
+                for row in rows:
+                    by_day.setdefault(row._date or export_day, []).append(row)
+                for day, day_rows in by_day.items():
+                    arrays = [
+                        pa.array([getattr(row, name) for row in day_rows]).cast(field.type)
+                        for name, field in zip(names, schema)
+                    ]
+                    writers.write(day, pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+                exported += len(rows)
+                after = rows[-1]._key
+    except Exception:
+        writers.close(publish=False)
+        raise
+
+    writers.close(publish=True)
+    return {"rows": exported, "high_water_mark": after}
+
+
+def _state_key(table: str) -> str:
+    # Versioned tables used to be marked by id: a new key makes their first run a full re-export
+    return f"{table}:row_version" if EXPORT_TABLES[table].get("versioned") else table
+
+
+def run_columnar_export(tables: Optional[List[str]] = None, chunk_size: int = EXPORT_CHUNK_SIZE) -> Dict[str, int]:
+    """Export every table past its high-water mark; returns rows exported per table"""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    state = _load_state()
+    run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    report = {}
+
+    for table in tables or list(EXPORT_TABLES):
+        result = export_table(table, state.get(_state_key(table), 0), run_id, chunk_size)
+        report[table] = result["rows"]
+        # Files are published before the mark moves: a crash here re-exports, never skips
+        state[_state_key(table)] = result["high_water_mark"]
+        _save_state(state)
+
+    return report
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.utils.columnar_export [table ...]
+    create_db_and_tables()
+    print(f"🔴 Columnar export: {run_columnar_export(sys.argv[1:] or None)}")
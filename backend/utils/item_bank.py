@@ -0,0 +1,160 @@
+"""
+Item Bank - Placement Questions with Difficulty Parameters
+The single source of truth for question skills (used by the fixed 15-question test) and
+the engine of the adaptive test: items sorted by (skill, difficulty) in compact arrays,
+next-item selection by bisection, and a Rasch ability estimate with a confidence stop.
+"""
+
+import os
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+CAT_MIN_ITEMS = int(os.getenv("CAT_MIN_ITEMS", "5"))  # one per skill before stopping is considered
+CAT_MAX_ITEMS = int(os.getenv("CAT_MAX_ITEMS", "15"))
+CAT_CONFIDENCE = float(os.getenv("CAT_CONFIDENCE", "0.85"))  # posterior probability of the placed level
+
+SKILL_DISPLAY_NAMES = MappingProxyType({
+    "letter_recognition": "Letter Recognition",
+    "phonics": "Phonics & Sounds",
+    "rhyming": "Rhyming Patterns",
+    "grammar": "Grammar & Word Structure",
+    "reading_fluency": "Reading Fluency",
+})
+SKILLS = tuple(SKILL_DISPLAY_NAMES)
+
+# Ability (logit) cut points between Beginner | Intermediate | Advanced
+LEVELS = ("Beginner", "Intermediate", "Advanced")
+LEVEL_CUTS = (-0.5, 0.7)
+
+# Matches src/data/questions.js (ids are what the fixed test submits).
+# "difficulty" is the Rasch b parameter: the ability at which a child answers correctly half the time.
+ITEMS = (
+    {"id": 1, "skill": "letter_recognition", "type": "multiple-choice", "difficulty": -1.8,
+     "prompt": 'Which letter matches sound /a/ as in "apple"?', "correct_id": "a",
+     "options": [{"id": "a", "text": "A"}, {"id": "b", "text": "B"}, {"id": "c", "text": "C"}]},
+    {"id": 2, "skill": "letter_recognition", "type": "multiple-choice", "difficulty": -2.2,
+     "prompt": 'Find the letter "B"', "correct_id": "b",
+     "options": [{"id": "d", "text": "D"}, {"id": "b", "text": "B"}, {"id": "p", "text": "P"}]},
+    {"id": 3, "skill": "letter_recognition", "type": "multiple-choice", "difficulty": -1.2,
+     "prompt": 'Which letter makes the sound /s/ as in "snake"?', "correct_id": "s",
+     "options": [{"id": "s", "text": "S"}, {"id": "f", "text": "F"}, {"id": "z", "text": "Z"}]},
+    {"id": 4, "skill": "letter_recognition", "type": "multiple-choice", "difficulty": -1.5,
+     "prompt": 'Point to the letter "M"', "correct_id": "m",
+     "options": [{"id": "n", "text": "N"}, {"id": "w", "text": "W"}, {"id": "m", "text": "M"}]},
+    {"id": 5, "skill": "phonics", "type": "image-choice", "difficulty": -0.9,
+     "prompt": 'Tap picture that starts with "M".', "correct_id": "moon",
+     "options": [{"id": "moon", "text": "🌙", "label": "Moon"}, {"id": "sun", "text": "☀️", "label": "Sun"},
+                 {"id": "star", "text": "⭐", "label": "Star"}]},
+    {"id": 6, "skill": "phonics", "type": "image-choice", "difficulty": -1.0,
+     "prompt": 'Which picture starts with "B"?', "correct_id": "ball",
+     "options": [{"id": "ball", "text": "⚽", "label": "Ball"}, {"id": "cat", "text": "🐱", "label": "Cat"},
+                 {"id": "duck", "text": "🦆", "label": "Duck"}]},
+    {"id": 7, "skill": "phonics", "type": "multiple-choice", "difficulty": 0.1,
+     "prompt": 'Which word starts with the same sound as "sun"?', "correct_id": "sock",
+     "options": [{"id": "snake", "text": "Snake"}, {"id": "sock", "text": "Sock"}, {"id": "cat", "text": "Cat"}]},
+    {"id": 8, "skill": "phonics", "type": "multiple-choice", "difficulty": -0.4,
+     "prompt": 'What sound does "dog" start with?', "correct_id": "d",
+     "options": [{"id": "d", "text": "/d/"}, {"id": "b", "text": "/b/"}, {"id": "g", "text": "/g/"}]},
+    {"id": 9, "skill": "rhyming", "type": "multiple-choice", "difficulty": -0.3,
+     "prompt": 'Which word rhymes with "Cat"?', "correct_id": "bat",
+     "options": [{"id": "dog", "text": "Dog"}, {"id": "bat", "text": "Bat"}, {"id": "fish", "text": "Fish"}]},
+    {"id": 10, "skill": "rhyming", "type": "multiple-choice", "difficulty": 0.3,
+     "prompt": 'Find the word that rhymes with "hop"?', "correct_id": "top",
+     "options": [{"id": "run", "text": "Run"}, {"id": "top", "text": "Top"}, {"id": "jump", "text": "Jump"}]},
+    {"id": 11, "skill": "rhyming", "type": "multiple-choice", "difficulty": 0.6,
+     "prompt": 'Which words rhyme? "Pan" and...', "correct_id": "can",
+     "options": [{"id": "pen", "text": "Pen"}, {"id": "can", "text": "Can"}, {"id": "pin", "text": "Pin"}]},
+    {"id": 12, "skill": "grammar", "type": "multiple-choice", "difficulty": 0.9,
+     "prompt": 'Choose the correct ending: "The dog is runn..."', "correct_id": "ing",
+     "options": [{"id": "ing", "text": "ing"}, {"id": "ed", "text": "ed"}, {"id": "s", "text": "s"}]},
+    {"id": 13, "skill": "grammar", "type": "multiple-choice", "difficulty": 1.2,
+     "prompt": 'Fill in the blank: "I ___ a red ball"', "correct_id": "have",
+     "options": [{"id": "have", "text": "have"}, {"id": "has", "text": "has"}, {"id": "had", "text": "had"}]},
+    {"id": 14, "skill": "reading_fluency", "type": "multiple-choice", "difficulty": 1.4,
+     "prompt": 'Read this sentence: "I see a big red car."', "correct_id": "easy",
+     "options": [{"id": "easy", "text": "I can read it easily"}, {"id": "hard", "text": "I need help"}]},
+    {"id": 15, "skill": "reading_fluency", "type": "multiple-choice", "difficulty": 1.8,
+     "prompt": 'Can you read: "The cat sits on the mat"?', "correct_id": "yes",
+     "options": [{"id": "yes", "text": "Yes, I can read it"}, {"id": "no", "text": "No, I need help"}]},
+)
+
+ITEMS_BY_ID = MappingProxyType({item["id"]: MappingProxyType(item) for item in ITEMS})
+SKILL_BY_ITEM = MappingProxyType({item["id"]: item["skill"] for item in ITEMS})
+
+# Compact index: items sorted by (skill, difficulty); each skill owns one contiguous slice
+_order = sorted(ITEMS, key=lambda item: (SKILLS.index(item["skill"]), item["difficulty"]))
+ITEM_IDS = np.array([item["id"] for item in _order], dtype=np.int32)
+DIFFICULTY = np.array([item["difficulty"] for item in _order], dtype=np.float64)
+SKILL_SLICES: Dict[str, Tuple[int, int]] = {}
+for position, item in enumerate(_order):
+    start, _ = SKILL_SLICES.get(item["skill"], (position, position))
+    SKILL_SLICES[item["skill"]] = (start, position + 1)
+del _order
+
+# Ability grid and standard-normal prior for the EAP estimate
+THETA_GRID = np.linspace(-4.0, 4.0, 161)
+_LOG_PRIOR = -0.5 * THETA_GRID ** 2
+
+
+def skill_of(item_id: int) -> str:
+    return SKILL_BY_ITEM.get(item_id, "general")
+
+
+def next_item(theta: float, administered: Iterable[int]) -> Optional[MappingProxyType]:
+    """
+    Unused item closest in difficulty to theta, from the skill asked least so far
+    (content balance). The nearest position is found by bisecting the skill's slice.
+    """
+    administered = set(administered)
+    asked = {skill: 0 for skill in SKILLS}
+    for item_id in administered:
+        asked[skill_of(item_id)] = asked.get(skill_of(item_id), 0) + 1
+
+    for skill in sorted(SKILLS, key=lambda s: asked[s]):
+        start, end = SKILL_SLICES.get(skill, (0, 0))
+        position = start + int(np.searchsorted(DIFFICULTY[start:end], theta))
+        left, right = position - 1, position
+        while left >= start or right < end:
+            # Step outward from the bisection point, nearest difficulty first
+            take_right = right < end and (left < start or DIFFICULTY[right] - theta <= theta - DIFFICULTY[left])
+            candidate = right if take_right else left
+            if int(ITEM_IDS[candidate]) not in administered:
+                return ITEMS_BY_ID[int(ITEM_IDS[candidate])]
+            if take_right:
+                right += 1
+            else:
+                left -= 1
+    return None
+
+
+def estimate_ability(responses: List[Tuple[int, bool]]) -> Dict:
+    """EAP ability estimate under the Rasch model, its standard error and the posterior mass per level"""
+    log_posterior = _LOG_PRIOR.copy()
+    if responses:
+        difficulty = np.array([ITEMS_BY_ID[item_id]["difficulty"] for item_id, _ in responses])
+        correct = np.array([bool(c) for _, c in responses])
+        # P(correct | theta) for every grid point (rows) and item (columns)
+        p = 1.0 / (1.0 + np.exp(-(THETA_GRID[:, None] - difficulty[None, :])))
+        log_posterior += np.where(correct[None, :], np.log(p), np.log1p(-p)).sum(axis=1)
+
+    posterior = np.exp(log_posterior - log_posterior.max())
+    posterior /= posterior.sum()
+    theta = float((THETA_GRID * posterior).sum())
+    standard_error = float(np.sqrt(((THETA_GRID - theta) ** 2 * posterior).sum()))
+
+    bands = np.digitize(THETA_GRID, LEVEL_CUTS)
+    level_probabilities = {level: float(posterior[bands == i].sum()) for i, level in enumerate(LEVELS)}
+    return {
+        "theta": theta,
+        "standard_error": standard_error,
+        "level": max(level_probabilities, key=level_probabilities.get),
+        "level_probabilities": level_probabilities,
+    }
+
+
+def is_converged(estimate: Dict, answered: int, remaining: bool) -> bool:
+    """Stop once the placed level is likely enough (after the minimum), at the cap, or when the bank runs out"""
+    if not remaining or answered >= CAT_MAX_ITEMS:
+        return True
+    return answered >= CAT_MIN_ITEMS and estimate["level_probabilities"][estimate["level"]] >= CAT_CONFIDENCE
@@ -0,0 +1,395 @@
+"""
+Leaderboards - In-Memory Ranked Indexes
+Scores live in indexable skip lists (O(log n) insert, remove, rank and top-N), one per
+period and cohort. They are fed by record_progress and rebuilt at startup from
+ChildProgress/DailyActivity, the source of truth every worker shares. Each worker also
+snapshots those rows to its own file, stamped with the week and the database's change
+counters, so a restart with an unchanged database skips the rebuild.
+"""
+
+import glob
+import json
+import math
+import os
+import random
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, text
+from ..database import engine, database_dir
+
+SNAPSHOT_DIR = os.getenv("LEADERBOARD_SNAPSHOT_DIR", os.path.join(database_dir, "leaderboards"))
+SNAPSHOT_VERSION = 2
+# RowVersion counters of every table the boards are built from (see migrations.COUNTED_TABLES)
+WATERMARK_TABLES = ("child", "childprogress", "dailyactivity")
+
+PERIODS = ("all-time", "weekly")
+
+_MAX_LEVELS = 24  # enough for ~16M entries at p=1/2
+
+
+# ==================== INDEXABLE SKIP LIST ====================
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, levels: int):
+        self.key = key
+        self.next: List["_Node"] = [None] * levels
+        # width[i]: how many positions next[i] jumps ahead
+        self.width: List[int] = [1] * levels
+
+
+# Sorts after every (-score, child_id) key
+_NIL = _Node((math.inf,), 0)
+
+
+def _random_levels() -> int:
+    return min(_MAX_LEVELS, 1 - int(math.log(1.0 - random.random(), 2.0)))
+
+
+class IndexableSkipList:
+    """Sorted set of unique keys with positional access (ranks are 0-based)"""
+
+    def __init__(self):
+        self.size = 0
+        self.head = _Node(None, _MAX_LEVELS)
+        self.head.next = [_NIL] * _MAX_LEVELS
+
+    @classmethod
+    def from_sorted(cls, keys: Iterable) -> "IndexableSkipList":
+        """Build from strictly increasing keys in O(n)"""
+        skip_list = cls()
+        last = [skip_list.head] * _MAX_LEVELS
+        last_position = [0] * _MAX_LEVELS
+        position = 0
+        for position, key in enumerate(keys, 1):
+            node = _Node(key, _random_levels())
+            for level in range(len(node.next)):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level] = node
+                last_position[level] = position
+        for level in range(_MAX_LEVELS):
+            last[level].next[level] = _NIL
+            last[level].width[level] = position + 1 - last_position[level]
+        skip_list.size = position
+        return skip_list
+
+    def __len__(self) -> int:
+        return self.size
+
+    def insert(self, key) -> None:
+        chain = [None] * _MAX_LEVELS
+        steps_at_level = [0] * _MAX_LEVELS
+        node = self.head
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level].key <= key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        new_node = _Node(key, _random_levels())
+        steps = 0
+        for level in range(len(new_node.next)):
+            previous = chain[level]
+            new_node.next[level] = previous.next[level]
+            previous.next[level] = new_node
+            new_node.width[level] = previous.width[level] - steps
+            previous.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(len(new_node.next), _MAX_LEVELS):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key) -> None:
+        chain = [None] * _MAX_LEVELS
+        node = self.head
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), _MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def rank(self, key) -> Optional[int]:
+        """0-based position of key, or None if absent"""
+        node = self.head
+        position = 0
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position if node.next[0].key == key else None
+
+    def slice(self, start: int, count: int) -> List:
+        """Up to `count` keys starting at 0-based position `start`"""
+        if start >= self.size or count <= 0:
+            return []
+        node = self.head
+        remaining = start + 1
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        keys = []
+        while node is not _NIL and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+# ==================== BOARDS ====================
+
+class Leaderboard:
+    """Scores of one period/cohort, ordered by score desc then child id"""
+
+    def __init__(self, scores: Optional[Dict[int, int]] = None):
+        self.scores: Dict[int, int] = dict(scores or {})
+        self.index = IndexableSkipList.from_sorted(sorted((-score, child_id) for child_id, score in self.scores.items()))
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def set(self, child_id: int, score: int) -> None:
+        self.discard(child_id)
+        self.scores[child_id] = score
+        self.index.insert((-score, child_id))
+
+    def discard(self, child_id: int) -> None:
+        score = self.scores.pop(child_id, None)
+        if score is not None:
+            self.index.remove((-score, child_id))
+
+    def rank(self, child_id: int) -> Optional[int]:
+        """1-based rank"""
+        score = self.scores.get(child_id)
+        if score is None:
+            return None
+        return self.index.rank((-score, child_id)) + 1
+
+    def top(self, limit: int, offset: int = 0) -> List[Tuple[int, int]]:
+        """(child_id, score) pairs from rank offset+1"""
+        return [(child_id, -negative_score) for negative_score, child_id in self.index.slice(offset, limit)]
+
+
+def week_start(day: date) -> date:
+    """Monday of the day's week"""
+    return day - timedelta(days=day.weekday())
+
+
+def cohort_keys(age: int, level: str) -> List[str]:
+    return ["all", f"age:{age}", f"level:{level}"]
+
+
+class LeaderboardIndex:
+    """Every board, plus each child's cohort (age, level); all access goes through one lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cohorts: Dict[int, Tuple[int, str]] = {}
+        self._boards: Dict[Tuple[str, str], Leaderboard] = {}
+        self._week_start: Optional[date] = None
+
+    def load(self, rows: Iterable[Tuple[int, int, str, int, int]], current_week: date) -> int:
+        """Replace everything with (child_id, age, level, total_score, weekly_score) rows"""
+        cohorts = {}
+        scores: Dict[Tuple[str, str], Dict[int, int]] = {}
+        for child_id, age, level, total_score, weekly_score in rows:
+            cohorts[child_id] = (age, level)
+            for cohort in cohort_keys(age, level):
+                scores.setdefault(("all-time", cohort), {})[child_id] = total_score
+                if weekly_score:
+                    scores.setdefault(("weekly", cohort), {})[child_id] = weekly_score
+        boards = {key: Leaderboard(board_scores) for key, board_scores in scores.items()}
+
+        with self._lock:
+            self._cohorts = cohorts
+            self._boards = boards
+            self._week_start = current_week
+        return len(cohorts)
+
+    def _board(self, period: str, cohort: str) -> Leaderboard:
+        board = self._boards.get((period, cohort))
+        if board is None:
+            board = self._boards[(period, cohort)] = Leaderboard()
+        return board
+
+    def _set_score(self, period: str, child_id: int, score: int) -> None:
+        for cohort in cohort_keys(*self._cohorts[child_id]):
+            self._board(period, cohort).set(child_id, score)
+
+    def _move(self, child_id: int, age: int, level: str) -> None:
+        """Put the child in the cohorts for (age, level), carrying its scores over"""
+        previous = self._cohorts.get(child_id)
+        if previous == (age, level):
+            return
+        if previous:
+            for cohort in cohort_keys(*previous):
+                for period in PERIODS:
+                    if cohort != "all" and (period, cohort) in self._boards:
+                        self._boards[(period, cohort)].discard(child_id)
+        self._cohorts[child_id] = (age, level)
+        for period in PERIODS:
+            score = self._board(period, "all").scores.get(child_id)
+            if score is not None:
+                self._set_score(period, child_id, score)
+
+    def record_score(self, child_id: int, age: int, level: str, points: int, day: date) -> None:
+        """Add points earned on `day` (the child's local day) to the all-time and weekly boards"""
+        week = week_start(day)
+        with self._lock:
+            if self._week_start is None or week > self._week_start:
+                # New week: last week's boards are finished
+                self._boards = {key: board for key, board in self._boards.items() if key[0] != "weekly"}
+                self._week_start = week
+            self._move(child_id, age, level)
+
+            total = self._board("all-time", "all").scores.get(child_id, 0) + points
+            self._set_score("all-time", child_id, total)
+            if week == self._week_start:
+                weekly = self._board("weekly", "all").scores.get(child_id, 0) + points
+                self._set_score("weekly", child_id, weekly)
+
+    def update_child(self, child_id: int, age: int, level: str) -> None:
+        """Follow an age/level change (no-op for children without a score yet)"""
+        with self._lock:
+            if child_id in self._cohorts:
+                self._move(child_id, age, level)
+
+    def remove_child(self, child_id: int) -> None:
+        with self._lock:
+            cohorts = self._cohorts.pop(child_id, None)
+            if cohorts:
+                for cohort in cohort_keys(*cohorts):
+                    for period in PERIODS:
+                        if (period, cohort) in self._boards:
+                            self._boards[(period, cohort)].discard(child_id)
+
+    def _readable(self, period: str, today: date) -> bool:
+        # A weekly board that hasn't seen this week's first event yet is last week's
+        return period != "weekly" or (self._week_start is not None and week_start(today) <= self._week_start)
+
+    def top(self, period: str, cohort: str, limit: int, offset: int, today: date) -> Tuple[int, List[Tuple[int, int]]]:
+        """(board size, [(child_id, score), ...]) for ranks offset+1 .. offset+limit"""
+        with self._lock:
+            board = self._boards.get((period, cohort))
+            if board is None or not self._readable(period, today):
+                return 0, []
+            return len(board), board.top(limit, offset)
+
+    def rank(self, period: str, cohort: str, child_id: int, today: date) -> Tuple[int, Optional[int], Optional[int]]:
+        """(board size, 1-based rank, score) of one child"""
+        with self._lock:
+            board = self._boards.get((period, cohort))
+            if board is None or not self._readable(period, today):
+                return 0, None, None
+            return len(board), board.rank(child_id), board.scores.get(child_id)
+
+
+# Process-wide index (each worker process keeps its own copy)
+leaderboards = LeaderboardIndex()
+
+
+# ==================== REBUILD AND SNAPSHOTS ====================
+
+def _rows_from_database(connection, current_week: date) -> List[Tuple[int, int, str, int, int]]:
+    """Every scored child with its total and this week's score (two grouped scans)"""
+    return [tuple(row) for row in connection.execute(text(
+        "SELECT c.id, c.age, c.current_level, cp.total_score, COALESCE(w.score, 0) "
+        "FROM childprogress cp JOIN child c ON c.id = cp.child_id "
+        "LEFT JOIN (SELECT child_id, SUM(score) AS score FROM dailyactivity "
+        "           WHERE day >= :week_start GROUP BY child_id) w ON w.child_id = cp.child_id "
+        "WHERE c.deleted_at IS NULL"
+    ), {"week_start": current_week.isoformat()})]
+
+
+def _watermark(connection) -> Dict[str, int]:
+    """Change counters of the source tables; equal watermarks mean the rows are unchanged"""
+    rows = connection.execute(
+        text("SELECT table_name, version FROM rowversion WHERE table_name IN :tables")
+        .bindparams(bindparam("tables", expanding=True)),
+        {"tables": list(WATERMARK_TABLES)}
+    ).all()
+    return {table: version for table, version in rows}
+
+
+def _read_snapshot(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as handle:
+            snapshot = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    return snapshot if snapshot.get("version") == SNAPSHOT_VERSION else None
+
+
+def _snapshot_path() -> str:
+    # One file per worker: workers never replace each other's snapshot
+    return os.path.join(SNAPSHOT_DIR, f"worker-{os.getpid()}.json")
+
+
+def save_leaderboard_snapshot() -> Dict[str, int]:
+    """
+    Write the board rows, read from the database rather than this worker's boards (which
+    miss other workers' scores), to this worker's file (atomic replace). Skipped when the
+    database hasn't changed since this worker's last snapshot or changed during the read.
+    """
+    current_week = week_start(datetime.utcnow().date())
+    path = _snapshot_path()
+    with engine.connect() as connection:
+        watermark = _watermark(connection)
+        previous = _read_snapshot(path)
+        if previous and previous["watermark"] == watermark and previous["week_start"] == current_week.isoformat():
+            return {"children": len(previous["rows"]), "written": 0}
+        rows = _rows_from_database(connection, current_week)
+        if _watermark(connection) != watermark:
+            return {"children": len(rows), "written": 0}
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    temporary = path + ".tmp"
+    with open(temporary, "w") as handle:
+        json.dump({
+            "version": SNAPSHOT_VERSION,
+            "week_start": current_week.isoformat(),
+            "watermark": watermark,
+            "rows": rows,
+        }, handle, separators=(",", ":"))
+    os.replace(temporary, path)
+    return {"children": len(rows), "written": 1}
+
+
+def _load_snapshot(current_week: date, watermark: Dict[str, int]) -> Optional[List]:
+    """Rows of any worker's snapshot taken at the current watermark; stale files are removed"""
+    rows = None
+    for path in glob.glob(os.path.join(SNAPSHOT_DIR, "worker-*.json")):
+        snapshot = _read_snapshot(path)
+        if snapshot and snapshot["watermark"] == watermark and snapshot["week_start"] == current_week.isoformat():
+            rows = rows if rows is not None else snapshot["rows"]
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return rows
+
+
+def load_leaderboards() -> Dict[str, object]:
+    """Startup: restore a snapshot if the database hasn't changed since, otherwise rebuild (one grouped query)"""
+    current_week = week_start(datetime.utcnow().date())
+    with engine.connect() as connection:
+        watermark = _watermark(connection)
+        rows = _load_snapshot(current_week, watermark)
+        source = "snapshot"
+        if rows is None:
+            rows = _rows_from_database(connection, current_week)
+            source = "database"
+    return {"children": leaderboards.load(rows, current_week), "source": source}
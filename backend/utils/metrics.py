@@ -0,0 +1,367 @@
+"""
+Metrics - Prometheus Text Exposition Without a Client Library
+Counters, gauges and histograms write to per-thread shards (no lock on the hot path) and
+are summed when scraped. With METRICS_DIR set, every worker also writes its totals to a
+file there and /metrics merges the files, so a scrape sees the whole multi-worker server.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from .tracing import span
+
+# Shared directory for multi-worker aggregation (unset: this process only)
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+# Dead workers' counters are kept for this long so totals don't drop when a worker restarts
+METRICS_DEAD_WORKER_RETENTION_SECONDS = int(os.getenv("METRICS_DEAD_WORKER_RETENTION_SECONDS", str(24 * 3600)))
+METRICS_FLUSH_INTERVAL_SECONDS = float(os.getenv("METRICS_FLUSH_INTERVAL_SECONDS", "5"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+_registry: List["_Metric"] = []
+_registry_lock = threading.Lock()
+_flusher_stop = threading.Event()
+
+
+# ==================== METRIC TYPES ====================
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._local = threading.local()
+        self._shards: List[Dict] = []
+        self._shards_lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _shard(self) -> Dict:
+        # Each thread only ever writes its own dict, so recording needs no lock
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _collect(self) -> Dict[Tuple[str, ...], object]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def _collect(self):
+        totals: Dict[Tuple[str, ...], float] = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for labels, value in list(shard.items()):
+                totals[labels] = totals.get(labels, 0.0) + value
+        return totals
+
+
+class Gauge(_Metric):
+    """
+    Live value. merge="sum" adds workers' values (in-flight requests, queue depths),
+    merge="max" keeps the largest (timestamps). inc/dec are sharded; set() and callbacks
+    hold one value per process.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), merge: str = "sum"):
+        super().__init__(name, documentation, labelnames)
+        self.merge = merge
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def set_function(self, callback: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        """Read the value(s) at scrape time instead of recording them"""
+        self._callback = callback
+
+    def _collect(self):
+        totals = dict(self._values)
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for labels, value in list(shard.items()):
+                totals[labels] = totals.get(labels, 0.0) + value
+        if self._callback:
+            try:
+                totals.update(self._callback())
+            except Exception as e:
+                print(f"🔴 Metric {self.name} callback failed: {e}")
+        return totals
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        cells = shard.get(labels)
+        if cells is None:
+            # One cell per bucket plus +Inf, then the sum
+            cells = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        cells[bisect_left(self.buckets, value)] += 1
+        cells[-1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def _collect(self):
+        totals: Dict[Tuple[str, ...], List] = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for labels, cells in list(shard.items()):
+                merged = totals.setdefault(labels, [0] * len(cells))
+                for i, value in enumerate(list(cells)):
+                    merged[i] += value
+        return totals
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+# ==================== APPLICATION METRICS ====================
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route"))
+http_requests = Counter(
+    "http_requests_total", "Requests by route template and status code", ("method", "route", "status"))
+http_in_flight = Gauge(
+    "http_requests_in_flight", "Requests being handled right now")
+db_pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection", buckets=WAIT_BUCKETS)
+db_pool_connections = Gauge(
+    "db_pool_connections", "Pooled database connections by state", ("state",))
+threadpool_threads = Gauge(
+    "threadpool_threads", "Worker threads running sync endpoints (bcrypt runs here) and requests queued for one", ("state",))
+password_hashes_in_progress = Gauge(
+    "password_hashes_in_progress", "bcrypt hashes or verifications currently running")
+roster_hash_queue_depth = Gauge(
+    "roster_hash_queue_depth", "Roster import passwords waiting in the bcrypt process pool")
+cache_requests = Counter(
+    "cache_requests_total", "In-memory cache lookups by cache and result (hit/miss)", ("cache", "result"))
+job_duration = Histogram(
+    "background_job_duration_seconds", "Background job run time", ("job",), buckets=JOB_BUCKETS)
+job_lag = Gauge(
+    "background_job_lag_seconds", "How late the job's last run started compared with its schedule", ("job",), merge="max")
+job_last_success = Gauge(
+    "background_job_last_success_timestamp_seconds", "Unix time the job last finished without error", ("job",), merge="max")
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    cache_requests.inc(cache, "hit" if hit else "miss")
+
+
+def instrument_pool(pool) -> None:
+    """Time connection checkouts and expose the pool's state (wraps the pool's own checkout)"""
+    do_get = pool._do_get
+
+    def timed_do_get():
+        started = time.perf_counter()
+        try:
+            with span("db pool checkout"):
+                return do_get()
+        finally:
+            db_pool_checkout_wait.observe(time.perf_counter() - started)
+
+    pool._do_get = timed_do_get
+    db_pool_connections.set_function(lambda: {
+        ("checked_out",): float(pool.checkedout()) if hasattr(pool, "checkedout") else 0.0,
+        ("idle",): float(pool.checkedin()) if hasattr(pool, "checkedin") else 0.0,
+    })
+
+
+def watch_threadpool(limiter) -> None:
+    """The anyio limiter FastAPI runs sync endpoints under (captured from the event loop)"""
+    def read():
+        statistics = limiter.statistics()
+        return {("busy",): float(statistics.borrowed_tokens), ("waiting",): float(statistics.tasks_waiting)}
+    threadpool_threads.set_function(read)
+
+
+# ==================== EXPOSITION ====================
+
+def _key(labels: Tuple[str, ...]) -> str:
+    return "\x1f".join(labels)
+
+
+def _labels(key: str) -> Tuple[str, ...]:
+    return tuple(key.split("\x1f")) if key else ()
+
+
+def snapshot() -> Dict:
+    """This process's values, JSON-serializable"""
+    return {
+        "pid": os.getpid(),
+        "ts": time.time(),
+        "metrics": {metric.name: {_key(labels): value for labels, value in metric._collect().items()} for metric in _registry},
+    }
+
+
+def flush_to_dir() -> Optional[str]:
+    """Write this worker's snapshot for the others to merge (atomic rename)"""
+    if not METRICS_DIR:
+        return None
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"worker-{os.getpid()}.json")
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump(snapshot(), handle)
+    os.replace(temporary, path)
+    return path
+
+
+def start_flusher() -> bool:
+    """Flush this worker's snapshot every few seconds (only in multi-worker mode)"""
+    if not METRICS_DIR or METRICS_FLUSH_INTERVAL_SECONDS <= 0:
+        return False
+
+    def loop():
+        while not _flusher_stop.wait(METRICS_FLUSH_INTERVAL_SECONDS):
+            try:
+                flush_to_dir()
+            except OSError as e:
+                print(f"🔴 Metrics flush failed: {e}")
+
+    _flusher_stop.clear()
+    threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+    return True
+
+
+def stop_flusher() -> None:
+    """Stop the flush loop and write a last snapshot (called on shutdown)"""
+    _flusher_stop.set()
+    if METRICS_DIR:
+        flush_to_dir()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _worker_snapshots() -> List[Dict]:
+    if not METRICS_DIR:
+        return [snapshot()]
+    flush_to_dir()
+    snapshots = []
+    now = time.time()
+    for name in os.listdir(METRICS_DIR):
+        if not (name.startswith("worker-") and name.endswith(".json")):
+            continue
+        path = os.path.join(METRICS_DIR, name)
+        try:
+            with open(path, encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            continue  # being replaced or removed right now
+        data["alive"] = _pid_alive(data["pid"])
+        if not data["alive"] and now - data["ts"] > METRICS_DEAD_WORKER_RETENTION_SECONDS:
+            os.remove(path)
+            continue
+        snapshots.append(data)
+    return snapshots
+
+
+def _merge(snapshots: List[Dict]) -> Dict[str, Dict[str, object]]:
+    merged: Dict[str, Dict[str, object]] = {metric.name: {} for metric in _registry}
+    for metric in _registry:
+        values = merged[metric.name]
+        for data in snapshots:
+            if metric.kind == "gauge" and metric.merge == "sum" and not data.get("alive", True):
+                continue  # a dead worker has nothing in flight
+            for key, value in data["metrics"].get(metric.name, {}).items():
+                if metric.kind == "histogram":
+                    current = values.setdefault(key, [0] * len(value))
+                    for i, cell in enumerate(value):
+                        current[i] += cell
+                elif metric.kind == "gauge" and metric.merge == "max":
+                    values[key] = max(values.get(key, value), value)
+                else:
+                    values[key] = values.get(key, 0.0) + value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """Every metric in the Prometheus text format, merged across workers when METRICS_DIR is set"""
+    merged = _merge(_worker_snapshots())
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for key in sorted(merged[metric.name]):
+            value = merged[metric.name][key]
+            labels = _labels(key)
+            if metric.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float("inf"),), value[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    lines.append(f"{metric.name}_bucket{_format_labels(metric.labelnames + ('le',), labels + (le,))} {cumulative}")
+                lines.append(f"{metric.name}_sum{_format_labels(metric.labelnames, labels)} {_number(value[-1])}")
+                lines.append(f"{metric.name}_count{_format_labels(metric.labelnames, labels)} {cumulative}")
+            else:
+                lines.append(f"{metric.name}{_format_labels(metric.labelnames, labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,140 @@
+"""
+Notification Retention - Compaction and Incremental Vacuum
+Old read notifications are rolled into one "Monthly Summary" row per parent and month,
+very old unread ones are dropped, and freed pages are returned with incremental_vacuum.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from sqlmodel import Session, select, delete, col
+from ..database import engine, create_db_and_tables
+from ..models import Notification
+
+READ_RETENTION_DAYS = int(os.getenv("NOTIFICATION_READ_RETENTION_DAYS", "30"))
+UNREAD_RETENTION_DAYS = int(os.getenv("NOTIFICATION_UNREAD_RETENTION_DAYS", "180"))
+RETENTION_BATCH_SIZE = int(os.getenv("NOTIFICATION_RETENTION_BATCH_SIZE", "500"))
+VACUUM_STEP_PAGES = 1000
+
+SUMMARY_TYPE = "Monthly Summary"
+
+
+def _month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+
+def _summary_message(month: datetime, counts: Dict[str, int]) -> str:
+    total = sum(counts.values())
+    details = ", ".join(f"{count} {kind}" for kind, count in sorted(counts.items(), key=lambda item: -item[1]))
+    return f"📬 {month.strftime('%B %Y')}: {total} notifications ({details})"
+
+
+def summarize_read_batch(session: Session, cutoff: datetime, batch_size: int) -> Tuple[int, int]:
+    """Fold one batch of old read notifications into monthly summaries; returns (rolled up, summaries touched)"""
+    rows = session.exec(
+        select(Notification.id, Notification.parent_id, Notification.notification_type, Notification.scheduled_time)
+        .where(Notification.is_read == True)  # noqa: E712
+        .where(Notification.scheduled_time < cutoff)
+        .where(Notification.notification_type != SUMMARY_TYPE)
+        .order_by(Notification.scheduled_time)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0, 0
+
+    # (parent_id, month) -> {notification_type: count}
+    groups: Dict[Tuple[int, datetime], Dict[str, int]] = {}
+    for _, parent_id, kind, scheduled_time in rows:
+        counts = groups.setdefault((parent_id, _month_start(scheduled_time)), {})
+        counts[kind] = counts.get(kind, 0) + 1
+
+    # Merge into summaries written by earlier runs
+    existing = session.exec(
+        select(Notification)
+        .where(Notification.notification_type == SUMMARY_TYPE)
+        .where(col(Notification.parent_id).in_({parent_id for parent_id, _ in groups}))
+        .where(col(Notification.scheduled_time).in_({month for _, month in groups}))
+    ).all()
+    summaries = {(n.parent_id, n.scheduled_time): n for n in existing}
+
+    for (parent_id, month), counts in groups.items():
+        summary = summaries.get((parent_id, month))
+        if summary:
+            previous = json.loads(summary.notification_data or "{}").get("counts", {})
+            for kind, count in previous.items():
+                counts[kind] = counts.get(kind, 0) + count
+        else:
+            summary = Notification(
+                parent_id=parent_id,
+                notification_type=SUMMARY_TYPE,
+                scheduled_time=month,
+                sent_time=month,
+                is_read=True,
+                message=""
+            )
+        summary.message = _summary_message(month, counts)
+        summary.notification_data = json.dumps({"month": month.strftime("%Y-%m"), "counts": counts})
+        session.add(summary)
+
+    session.execute(delete(Notification).where(col(Notification.id).in_([row[0] for row in rows])))
+    session.commit()
+    return len(rows), len(groups)
+
+
+def delete_stale_unread_batch(session: Session, cutoff: datetime, batch_size: int) -> int:
+    """Drop one batch of unread notifications nobody opened before the cutoff"""
+    ids = session.exec(
+        select(Notification.id)
+        .where(Notification.is_read == False)  # noqa: E712
+        .where(Notification.scheduled_time < cutoff)
+        .limit(batch_size)
+    ).all()
+    if ids:
+        session.execute(delete(Notification).where(col(Notification.id).in_(ids)))
+        session.commit()
+    return len(ids)
+
+
+def incremental_vacuum() -> int:
+    """Return free pages to the filesystem in small steps; returns bytes reclaimed"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        page_size = connection.exec_driver_sql("PRAGMA page_size").scalar()
+        pages_before = connection.exec_driver_sql("PRAGMA page_count").scalar()
+        while connection.exec_driver_sql("PRAGMA freelist_count").scalar() > 0:
+            before = connection.exec_driver_sql("PRAGMA page_count").scalar()
+            connection.exec_driver_sql(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})")
+            # Not in incremental mode (or nothing movable): stop instead of spinning
+            if connection.exec_driver_sql("PRAGMA page_count").scalar() == before:
+                break
+        pages_after = connection.exec_driver_sql("PRAGMA page_count").scalar()
+    return (pages_before - pages_after) * page_size
+
+
+def run_notification_retention(batch_size: int = RETENTION_BATCH_SIZE) -> Dict[str, int]:
+    """Apply the retention policy in small transactions, then vacuum; returns a run report"""
+    now = datetime.now()
+    report = {"summarized": 0, "summary_updates": 0, "deleted_unread": 0, "bytes_reclaimed": 0}
+
+    with Session(engine) as session:
+        while True:
+            rolled_up, summaries = summarize_read_batch(session, now - timedelta(days=READ_RETENTION_DAYS), batch_size)
+            if not rolled_up:
+                break
+            report["summarized"] += rolled_up
+            report["summary_updates"] += summaries
+
+        while True:
+            deleted = delete_stale_unread_batch(session, now - timedelta(days=UNREAD_RETENTION_DAYS), batch_size)
+            if not deleted:
+                break
+            report["deleted_unread"] += deleted
+
+    report["bytes_reclaimed"] = incremental_vacuum()
+    return report
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.utils.notification_retention
+    create_db_and_tables()
+    print(f"🔴 Notification retention: {run_notification_retention()}")
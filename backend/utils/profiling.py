@@ -0,0 +1,215 @@
+"""
+Profiling - Sampling and Per-Request Profiles in Collapsed-Stack Format
+The sampling profiler reads every thread's stack a few hundred times a second for N
+seconds (low overhead, whole worker). A request carrying a valid signed X-Profile-Request
+header is instead traced call by call while its endpoint runs. Both produce the collapsed
+format flamegraph.pl, speedscope and inferno read: "frame;frame;frame count".
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+# Signs X-Profile-Request headers (unset: per-request profiling is off)
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")  # default: profiles/ next to the database
+PROFILE_SIGNATURE_MAX_TTL_SECONDS = 3600
+
+REQUEST_PROFILE_HEADER = "X-Profile-Request"
+
+_sampler_lock = threading.Lock()
+
+
+def _label(code) -> str:
+    # ";" separates frames in the collapsed format
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def format_collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+# ==================== SAMPLING PROFILER ====================
+
+def _sample(stacks: Counter, own_thread: int, names: dict) -> None:
+    for thread_id, frame in sys._current_frames().items():
+        if thread_id == own_thread:
+            continue
+        frames = []
+        while frame is not None:
+            frames.append(_label(frame.f_code))
+            frame = frame.f_back
+        frames.append(names.get(thread_id, f"thread-{thread_id}"))
+        stacks[";".join(reversed(frames))] += 1
+
+
+def _sample_for(seconds: float, interval: float) -> Counter:
+    stacks: Counter = Counter()
+    own_thread = threading.get_ident()
+    deadline = time.perf_counter() + seconds
+    next_sample = time.perf_counter()
+    while next_sample < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        _sample(stacks, own_thread, names)
+        next_sample += interval
+        time.sleep(max(0.0, next_sample - time.perf_counter()))
+    return stacks
+
+
+async def sample_worker(seconds: float, interval: float) -> Counter:
+    """
+    Sample every thread of this worker for `seconds` on a background thread; the event loop
+    keeps serving meanwhile. Raises RuntimeError if a profile is already running.
+    """
+    if not _sampler_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running on this worker")
+    try:
+        return await asyncio.to_thread(_sample_for, seconds, interval)
+    finally:
+        _sampler_lock.release()
+
+
+# ==================== PER-REQUEST PROFILES ====================
+
+def _signature(expires: int, method: str, path: str) -> str:
+    message = f"{expires}:{method.upper()}:{path}".encode("utf-8")
+    return hmac.new(PROFILING_SECRET.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+
+def sign_request(method: str, path: str, ttl_seconds: int = 600) -> str:
+    """X-Profile-Request value allowing one method+path to be profiled until it expires"""
+    expires = int(time.time()) + min(ttl_seconds, PROFILE_SIGNATURE_MAX_TTL_SECONDS)
+    return f"{expires}.{_signature(expires, method, path)}"
+
+
+def verify_request(header: Optional[str], method: str, path: str) -> bool:
+    if not PROFILING_SECRET or not header:
+        return False
+    expires, _, signature = header.partition(".")
+    try:
+        expires = int(expires)
+    except ValueError:
+        return False
+    if not time.time() <= expires <= time.time() + PROFILE_SIGNATURE_MAX_TTL_SECONDS:
+        return False
+    return hmac.compare_digest(signature, _signature(expires, method, path))
+
+
+class _CallTracer:
+    """sys.setprofile hook: self time (microseconds) per exact call stack of one thread"""
+
+    def __init__(self, root: str):
+        self.keys = [root]
+        self.stacks: Counter = Counter()
+        self.last = time.perf_counter_ns()
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter_ns()
+        self.stacks[self.keys[-1]] += now - self.last
+        if event == "call":
+            self.keys.append(f"{self.keys[-1]};{_label(frame.f_code)}")
+        elif event == "c_call":
+            self.keys.append(f"{self.keys[-1]};{getattr(arg, '__qualname__', repr(arg))} (builtin)")
+        elif len(self.keys) > 1:
+            self.keys.pop()  # return / c_return / c_exception
+        self.last = time.perf_counter_ns()
+
+
+class RequestProfile:
+    __slots__ = ("tracer", "started")
+
+    def __init__(self, root: str):
+        self.tracer = _CallTracer(root)
+        self.started = datetime.utcnow()
+
+
+_request_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+def start_request_profile(method: str, path: str, header: Optional[str]) -> Optional[RequestProfile]:
+    """Profile this request's endpoint if the header is validly signed for it"""
+    if header is None:
+        return None
+    if not verify_request(header, method, path):
+        print(f"🔴 Ignoring invalid or expired {REQUEST_PROFILE_HEADER} for {method} {path}")
+        return None
+    profile = RequestProfile(f"{method} {path}")
+    _request_profile.set(profile)
+    return profile
+
+
+def _profile_dir() -> str:
+    if PROFILE_DIR:
+        return PROFILE_DIR
+    from ..database import database_dir  # imported late, like tracing
+    return os.path.join(database_dir, "profiles")
+
+
+def finish_request_profile(profile: RequestProfile) -> str:
+    """Write the request's collapsed stacks; returns the profile id to fetch it by"""
+    stacks = Counter({stack: ns // 1000 for stack, ns in profile.tracer.stacks.items() if ns >= 1000})
+    profile_id = f"{profile.started:%Y%m%dT%H%M%S}-{os.urandom(4).hex()}"
+    directory = _profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{profile_id}.collapsed"), "w", encoding="utf-8") as handle:
+        handle.write(format_collapsed(stacks))
+    return profile_id
+
+
+def read_request_profile(profile_id: str) -> Optional[str]:
+    if not all(c.isalnum() or c in "-T" for c in profile_id):
+        return None
+    try:
+        with open(os.path.join(_profile_dir(), f"{profile_id}.collapsed"), encoding="utf-8") as handle:
+            return handle.read()
+    except FileNotFoundError:
+        return None
+
+
+def _run_traced(tracer: _CallTracer, function, arguments: dict):
+    sys.setprofile(tracer)
+    try:
+        return function(**arguments)
+    finally:
+        sys.setprofile(None)
+
+
+def instrument_endpoints() -> None:
+    """Run the endpoint under the call tracer when its request is being profiled"""
+    import fastapi.routing
+    from starlette.concurrency import run_in_threadpool
+
+    run_endpoint_function = fastapi.routing.run_endpoint_function
+    if getattr(run_endpoint_function, "_profiled", False):
+        return
+
+    async def profiled_run_endpoint_function(*, dependant, values, is_coroutine):
+        profile = _request_profile.get()
+        if profile is None:
+            return await run_endpoint_function(dependant=dependant, values=values, is_coroutine=is_coroutine)
+        if is_coroutine:
+            # Async endpoints share the event loop thread: other requests' frames may show up
+            sys.setprofile(profile.tracer)
+            try:
+                return await dependant.call(**values)
+            finally:
+                sys.setprofile(None)
+        return await run_in_threadpool(_run_traced, profile.tracer, dependant.call, values)
+
+    profiled_run_endpoint_function._profiled = True
+    fastapi.routing.run_endpoint_function = profiled_run_endpoint_function
+
+
+if __name__ == "__main__":
+    # Run with: PROFILING_SECRET=... python -m backend.utils.profiling GET /dashboard/5
+    method, path = sys.argv[1], sys.argv[2]
+    print(f"{REQUEST_PROFILE_HEADER}: {sign_request(method, path)}")
@@ -0,0 +1,241 @@
+"""
+Activity Recommendations - Ranking the Plan Against How the Child Is Doing
+Every catalog template is a row in an in-memory feature matrix (skills it practises, type,
+difficulty). Each child has a cached feature vector (skill need from the latest snapshots,
+per-type completion and recency) that record_progress updates in place, so ranking the
+open plan activities is one small matrix-vector product with no database reads.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List
+import numpy as np
+from sqlmodel import Session, select
+from ..models import Child, Activity, ActivityProgress, SkillSnapshot
+from .activity_catalog import get_template
+from .item_bank import SKILLS, SKILL_DISPLAY_NAMES
+from .metrics import record_cache
+
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000"))  # child vectors kept per worker
+# Other workers' record_progress calls only reach this cache through a reload
+RECOMMENDATION_CACHE_TTL_SECONDS = int(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", "300"))
+RECENT_OUTCOMES = 20  # progress rows replayed when a child's vector is built
+
+ACTIVITY_TYPES = ("Game", "Tracing", "Reading", "Video", "Other")
+DIFFICULTY = {"Easy": 0.0, "Medium": 0.5, "Hard": 1.0}
+LEVEL_DIFFICULTY = {"Beginner": 0.0, "Intermediate": 0.5, "Advanced": 1.0}
+
+# Words in a template's name/content that mark the skill it practises (display names match too)
+SKILL_KEYWORDS = {
+    "letter_recognition": ("letter", "alphabet"),
+    "phonics": ("phonics", "sound"),
+    "rhyming": ("rhym",),
+    "grammar": ("grammar", "word"),
+    "reading_fluency": ("read", "story", "chapter", "fluency"),
+}
+
+# Score weights: skill need, type engagement, difficulty fit, plan order
+SKILL_WEIGHT = 1.0
+TYPE_WEIGHT = 0.6
+DIFFICULTY_WEIGHT = 0.5
+ORDER_WEIGHT = 0.2
+RECENCY_PENALTY = 0.3  # per recent play of the same type, keeps the mix varied
+OUTCOME_DECAY = 0.3  # weight of the newest outcome in the per-type moving average
+RECENCY_DECAY = 0.7
+
+# Feature matrix columns
+_SKILL_COLUMNS = slice(0, len(SKILLS))
+_TYPE_COLUMNS = slice(len(SKILLS), len(SKILLS) + len(ACTIVITY_TYPES))
+_DIFFICULTY_COLUMN = len(SKILLS) + len(ACTIVITY_TYPES)
+_FEATURES = _DIFFICULTY_COLUMN + 1
+
+
+def template_features(template) -> np.ndarray:
+    """Skill weights (summing to 1), one-hot type and difficulty of one template"""
+    features = np.zeros(_FEATURES)
+    text = f"{template.activity_name} {template.activity_content}".lower()
+    for i, skill in enumerate(SKILLS):
+        words = SKILL_KEYWORDS[skill] + (SKILL_DISPLAY_NAMES[skill].lower(),)
+        features[i] = any(word in text for word in words)
+    skills = features[_SKILL_COLUMNS]
+    skills[:] = skills / skills.sum() if skills.any() else 1.0 / len(SKILLS)
+
+    activity_type = template.activity_type if template.activity_type in ACTIVITY_TYPES else "Other"
+    features[_TYPE_COLUMNS.start + ACTIVITY_TYPES.index(activity_type)] = 1.0
+    features[_DIFFICULTY_COLUMN] = DIFFICULTY.get(template.difficulty_level, 0.5)
+    return features
+
+
+class ActivityFeatureMatrix:
+    """One row per template id, appended as templates are first seen"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: Dict[int, int] = {}
+        self.matrix = np.zeros((256, _FEATURES))
+
+    def row_of(self, session: Session, template_id: int) -> int:
+        row = self._rows.get(template_id)
+        if row is not None:
+            return row
+        features = template_features(get_template(session, template_id))
+        with self._lock:
+            if template_id not in self._rows:
+                if len(self._rows) == len(self.matrix):
+                    self.matrix = np.vstack([self.matrix, np.zeros_like(self.matrix)])
+                self.matrix[len(self._rows)] = features
+                self._rows[template_id] = len(self._rows)
+            return self._rows[template_id]
+
+
+class ChildFeatures:
+    """A child's cached vector plus the open activities of their active plan"""
+    __slots__ = ("need", "completion", "recency", "level", "plan", "activity_ids", "rows", "order", "open", "loaded_at")
+
+    def __init__(self, level: str):
+        self.need = np.full(len(SKILLS), 0.5)  # 1 - mastery per skill
+        self.completion = np.full(len(ACTIVITY_TYPES), 0.5)  # moving average of completions per type
+        self.recency = np.zeros(len(ACTIVITY_TYPES))  # decayed count of recent plays per type
+        self.level = level
+        self.plan: List = []  # (activity id, template id, week, day) per open-plan slot
+        self.activity_ids = np.zeros(0, dtype=np.int64)
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.order = np.zeros(0)  # plan position, 0 (first slot) to 1 (last)
+        self.open = np.zeros(0, dtype=bool)
+        self.loaded_at = time.monotonic()
+
+    def observe(self, row: int, activity_id: int, completed: bool, matrix: np.ndarray) -> None:
+        type_mask = matrix[row, _TYPE_COLUMNS] > 0
+        self.completion[type_mask] += OUTCOME_DECAY * (float(completed) - self.completion[type_mask])
+        self.recency *= RECENCY_DECAY
+        self.recency[type_mask] += 1.0
+        if completed:
+            self.open[self.activity_ids == activity_id] = False
+
+
+class Recommender:
+    """Per-worker LRU of child vectors over the shared feature matrix"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._children: "OrderedDict[int, ChildFeatures]" = OrderedDict()
+        self.features = ActivityFeatureMatrix()
+
+    def _load(self, session: Session, child: Child) -> ChildFeatures:
+        """Build a child's vector from their latest snapshots, recent progress and open plan (indexed reads)"""
+        state = ChildFeatures(child.current_level)
+
+        if child.latest_assessment_id:
+            for skill, mastery in session.exec(
+                select(SkillSnapshot.skill, SkillSnapshot.mastery_percentage)
+                .where(SkillSnapshot.assessment_id == child.latest_assessment_id)
+            ).all():
+                if skill in SKILLS:
+                    state.need[SKILLS.index(skill)] = 1.0 - mastery / 100
+
+        recent = session.exec(
+            select(Activity.template_id, ActivityProgress.completion_status)
+            .join(ActivityProgress, ActivityProgress.activity_id == Activity.id)
+            .where(Activity.child_id == child.id)
+            .order_by(ActivityProgress.id.desc())
+            .limit(RECENT_OUTCOMES)
+        ).all()
+        matrix_rows = [(self.features.row_of(session, template_id), status) for template_id, status in recent]
+        for row, status in reversed(matrix_rows):
+            state.observe(row, 0, status == "Completed", self.features.matrix)
+
+        if child.active_plan_id:
+            completed = select(ActivityProgress.id).where(
+                ActivityProgress.activity_id == Activity.id,
+                ActivityProgress.completion_status == "Completed"
+            ).exists()
+            plan = session.exec(
+                select(Activity.id, Activity.template_id, Activity.week, Activity.day)
+                .where(Activity.child_id == child.id, Activity.plan_id == child.active_plan_id, ~completed)
+                .order_by(Activity.week, Activity.day)
+            ).all()
+            if plan:
+                state.plan = [tuple(a) for a in plan]
+                state.activity_ids = np.array([a.id for a in plan], dtype=np.int64)
+                state.rows = np.array([self.features.row_of(session, a.template_id) for a in plan], dtype=np.int64)
+                state.order = np.linspace(0.0, 1.0, len(plan)) if len(plan) > 1 else np.zeros(1)
+                state.open = np.ones(len(plan), dtype=bool)
+        return state
+
+    def _get(self, session: Session, child: Child) -> ChildFeatures:
+        with self._lock:
+            state = self._children.get(child.id)
+            if state and time.monotonic() - state.loaded_at < RECOMMENDATION_CACHE_TTL_SECONDS:
+                self._children.move_to_end(child.id)
+                record_cache("recommendations", True)
+                return state
+        record_cache("recommendations", False)
+
+        state = self._load(session, child)
+        with self._lock:
+            self._children[child.id] = state
+            while len(self._children) > RECOMMENDATION_CACHE_SIZE:
+                self._children.popitem(last=False)
+        return state
+
+    def record_progress(self, session: Session, child_id: int, activity_id: int, template_id: int, completed: bool) -> None:
+        """Fold one outcome into a cached vector (children not cached are built fresh when asked)"""
+        if child_id not in self._children:
+            return
+        row = self.features.row_of(session, template_id)
+        with self._lock:
+            state = self._children.get(child_id)
+            if state:
+                state.observe(row, activity_id, completed, self.features.matrix)
+
+    def invalidate(self, child_id: int) -> None:
+        """Drop a child's vector (new assessment and plan, level change or deletion)"""
+        with self._lock:
+            self._children.pop(child_id, None)
+
+    def recommend(self, session: Session, child: Child, limit: int) -> List[Dict]:
+        """The child's best next plan activities, highest score first"""
+        state = self._get(session, child)
+        candidates = np.flatnonzero(state.open)
+        if not len(candidates):
+            return []
+
+        features = self.features.matrix[state.rows[candidates]]
+        target = LEVEL_DIFFICULTY.get(state.level, 0.5) + 0.5 * (state.completion.mean() - 0.5)
+        components = np.column_stack([
+            SKILL_WEIGHT * (features[:, _SKILL_COLUMNS] @ state.need),
+            TYPE_WEIGHT * (features[:, _TYPE_COLUMNS] @ (state.completion - RECENCY_PENALTY * state.recency)),
+            -DIFFICULTY_WEIGHT * np.abs(features[:, _DIFFICULTY_COLUMN] - np.clip(target, 0.0, 1.0)),
+        ])
+        scores = components.sum(axis=1) - ORDER_WEIGHT * state.order[candidates]
+
+        limit = min(limit, len(candidates))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        results = []
+        for i in top:
+            skill = SKILLS[int(np.argmax(features[i, _SKILL_COLUMNS] * state.need))]
+            reason = int(np.argmax(components[i]))
+            if reason == 0:
+                why = f"Practises {SKILL_DISPLAY_NAMES[skill]}, a skill that needs work"
+            elif reason == 1:
+                why = "A kind of activity your child has been finishing"
+            else:
+                why = f"The right difficulty for {state.level} level"
+            activity_id, template_id, week, day = state.plan[candidates[i]]
+            results.append({
+                "activity_id": activity_id,
+                "template_id": template_id,
+                "week": week,
+                "day": day,
+                "score": round(float(scores[i]), 4),
+                "skill": skill,
+                "reason": why,
+            })
+        return results
+
+
+recommender = Recommender()
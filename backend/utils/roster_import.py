@@ -0,0 +1,246 @@
+"""
+Roster Import - Bulk Onboarding of School Families
+A CSV/NDJSON roster (one row per child) becomes parents and children in chunked bulk
+inserts. Passwords are hashed across a process pool; families without one get an invite
+token instead. Bad rows are reported individually and never abort the batch.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+import secrets
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert
+from ..database import engine, create_db_and_tables
+from ..models import Parent, Child, ParentInvite
+from ..auth import get_password_hash
+from .metrics import roster_hash_queue_depth, flush_to_dir, METRICS_FLUSH_INTERVAL_SECONDS
+
+ROSTER_CHUNK_SIZE = int(os.getenv("ROSTER_CHUNK_SIZE", "500"))  # families per transaction
+ROSTER_HASH_WORKERS = int(os.getenv("ROSTER_HASH_WORKERS", str(os.cpu_count() or 1)))
+INVITE_TTL_DAYS = int(os.getenv("ROSTER_INVITE_TTL_DAYS", "14"))
+
+# Stored for invited parents until they accept; never matches a password (see auth.verify_password)
+INVITE_PENDING_HASH = "!invite-pending"
+
+FORMATS = ("csv", "ndjson")
+
+
+def invite_token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def parse_roster(content: str, roster_format: str) -> List[Dict]:
+    """Roster records in file order; an unparseable NDJSON line becomes {"_error": ...}"""
+    if roster_format == "csv":
+        return [dict(row) for row in csv.DictReader(io.StringIO(content))]
+
+    records = []
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            records.append(record if isinstance(record, dict) else {"_error": "Row must be a JSON object"})
+        except ValueError:
+            records.append({"_error": "Invalid JSON"})
+    return records
+
+
+def _field(record: Dict, name: str) -> Optional[str]:
+    value = record.get(name)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _validate(record: Dict) -> Dict:
+    """Normalized row, or raises ValueError with the reason it can't be imported"""
+    if "_error" in record:
+        raise ValueError(record["_error"])
+
+    email = _field(record, "parent_email")
+    if not email or "@" not in email:
+        raise ValueError("parent_email is missing or invalid")
+    parent_name = _field(record, "parent_name")
+    if not parent_name:
+        raise ValueError("parent_name is required")
+
+    row = {
+        "email": email,
+        "parent_name": parent_name,
+        "phone_number": _field(record, "parent_phone"),
+        "password": _field(record, "password"),
+        "child": None,
+    }
+
+    child_name = _field(record, "child_name")
+    if child_name:
+        try:
+            age = int(_field(record, "child_age") or "")
+        except ValueError:
+            raise ValueError("child_age must be a whole number")
+        if not 0 < age < 19:
+            raise ValueError("child_age must be between 1 and 18")
+        row["child"] = {
+            "name": child_name,
+            "age": age,
+            "current_level": _field(record, "child_level") or "Beginner",
+            "native_language": _field(record, "native_language") or "English",
+        }
+    return row
+
+
+def _existing_emails(connection, emails: List[str]) -> set:
+    """Emails already registered, in one query however long the roster is"""
+    rows = connection.execute(
+        text("SELECT email FROM parent WHERE email IN (SELECT value FROM json_each(:emails))"),
+        {"emails": json.dumps(emails)}
+    )
+    return {row[0] for row in rows}
+
+
+def _flush_metrics() -> None:
+    """The CLI has no flusher thread: publish the queue depth so /metrics on the API workers shows it"""
+    try:
+        flush_to_dir()
+    except OSError as e:
+        print(f"🔴 Metrics flush failed: {e}")
+
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    """bcrypt is deliberately slow, so hashes are computed in parallel worker processes"""
+    if not passwords:
+        return []
+    if ROSTER_HASH_WORKERS <= 1 or len(passwords) == 1:
+        return [get_password_hash(p) for p in passwords]
+    with ProcessPoolExecutor(max_workers=ROSTER_HASH_WORKERS) as pool:
+        chunksize = max(1, len(passwords) // (ROSTER_HASH_WORKERS * 4))
+        hashes = []
+        roster_hash_queue_depth.inc(amount=len(passwords))
+        _flush_metrics()
+        last_flush = time.monotonic()
+        try:
+            for password_hash in pool.map(get_password_hash, passwords, chunksize=chunksize):
+                hashes.append(password_hash)
+                roster_hash_queue_depth.dec()
+                if time.monotonic() - last_flush >= max(METRICS_FLUSH_INTERVAL_SECONDS, 1):
+                    _flush_metrics()
+                    last_flush = time.monotonic()
+        finally:
+            roster_hash_queue_depth.dec(amount=len(passwords) - len(hashes))
+            _flush_metrics()
+        return hashes
+
+
+def import_roster(records: List[Dict], chunk_size: int = ROSTER_CHUNK_SIZE) -> Dict:
+    """
+    Create a parent per distinct email and a child per row that names one.
+    Returns counts, the invite tokens to hand out and per-row errors (rows are 1-based).
+    """
+    errors = []
+    families: Dict[str, Dict] = {}  # email -> parent fields, children and source rows
+
+    for number, record in enumerate(records, start=1):
+        try:
+            row = _validate(record)
+        except ValueError as e:
+            errors.append({"row": number, "email": _field(record, "parent_email"), "error": str(e)})
+            continue
+
+        family = families.get(row["email"])
+        if family is None:
+            family = families[row["email"]] = {
+                "name": row["parent_name"],
+                "phone_number": row["phone_number"],
+                "password": row["password"],
+                "children": [],
+                "rows": [],
+            }
+        elif family["name"] != row["parent_name"]:
+            errors.append({"row": number, "email": row["email"], "error": "Same email listed with a different parent_name"})
+            continue
+        family["password"] = family["password"] or row["password"]
+        family["rows"].append(number)
+        if row["child"]:
+            family["children"].append(row["child"])
+
+    with engine.connect() as connection:
+        for email in _existing_emails(connection, list(families)):
+            for number in families.pop(email)["rows"]:
+                errors.append({"row": number, "email": email, "error": "Email already registered"})
+
+    # Hash every password up front (the slow part), then insert in short transactions
+    with_password = [email for email, family in families.items() if family["password"]]
+    for email, password_hash in zip(with_password, _hash_passwords([families[e]["password"] for e in with_password])):
+        families[email]["password_hash"] = password_hash
+
+    expires_at = datetime.utcnow() + timedelta(days=INVITE_TTL_DAYS)
+    report = {"rows": len(records), "parents_created": 0, "children_created": 0, "invites": [], "errors": errors}
+    emails = list(families)
+
+    for start in range(0, len(emails), chunk_size):
+        chunk = emails[start:start + chunk_size]
+        with engine.begin() as connection:
+            # Emails registered since the lookup are skipped by ON CONFLICT and reported below
+            created = connection.execute(
+                insert(Parent).on_conflict_do_nothing(index_elements=["email"]).returning(Parent.id, Parent.email),
+                [
+                    {
+                        "name": families[email]["name"],
+                        "email": email,
+                        "phone_number": families[email]["phone_number"],
+                        "password_hash": families[email].get("password_hash", INVITE_PENDING_HASH),
+                    }
+                    for email in chunk
+                ]
+            ).all()
+            parent_ids = {row.email: row.id for row in created}
+
+            children = []
+            invites = []
+            for email in chunk:
+                family = families[email]
+                if email not in parent_ids:
+                    errors.extend({"row": number, "email": email, "error": "Email already registered"} for number in family["rows"])
+                    continue
+                children.extend({**child, "parent_id": parent_ids[email]} for child in family["children"])
+                if "password_hash" not in family:
+                    token = secrets.token_urlsafe(32)
+                    invites.append({"token_hash": invite_token_hash(token), "parent_id": parent_ids[email], "expires_at": expires_at})
+                    report["invites"].append({"email": email, "token": token, "expires_at": expires_at.isoformat()})
+
+            if children:
+                connection.execute(insert(Child), children)
+            if invites:
+                connection.execute(insert(ParentInvite), invites)
+
+        report["parents_created"] += len(parent_ids)
+        report["children_created"] += len(children)
+
+    errors.sort(key=lambda error: error["row"])
+    return report
+
+
+def import_roster_file(path: str, roster_format: Optional[str] = None) -> Dict:
+    """Import a roster file; the format defaults to the extension (.csv, otherwise NDJSON)"""
+    roster_format = roster_format or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    with open(path, encoding="utf-8-sig") as handle:
+        return import_roster(parse_roster(handle.read(), roster_format))
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.utils.roster_import roster.csv > report.json
+    create_db_and_tables()
+    report = import_roster_file(sys.argv[1])
+    print(f"🔴 Roster import: {report['parents_created']} parents, {report['children_created']} children, "
+          f"{len(report['invites'])} invites, {len(report['errors'])} errors", file=sys.stderr)
+    print(json.dumps(report, indent=2))
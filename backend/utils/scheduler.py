@@ -0,0 +1,57 @@
+"""
+Background Scheduler - Periodic Maintenance Jobs
+Each job runs on its own daemon thread; intervals come from environment variables
+"""
+
+import os
+import threading
+import time
+import traceback
+from typing import Callable, Dict
+from .metrics import job_duration, job_lag, job_last_success
+
+_jobs: Dict[str, threading.Thread] = {}
+_stop = threading.Event()
+
+
+def schedule_periodic(name: str, env_var: str, default_seconds: float, job: Callable[[], object]) -> bool:
+    """
+    Run job every N seconds, N taken from env_var (0 disables the job).
+    Returns True if the job was scheduled.
+    """
+    interval = float(os.getenv(env_var, default_seconds))
+    if interval <= 0 or name in _jobs:
+        return False
+
+    stop = _stop
+
+    def loop():
+        due = time.time() + interval
+        # Wait one interval first so startup isn't slowed down by maintenance work
+        while not stop.wait(interval):
+            started = time.time()
+            # Lag: how far behind a fixed-rate schedule this run starts (grows with slow runs)
+            job_lag.set(max(0.0, started - due), name)
+            due = started + interval
+            try:
+                result = job()
+                job_last_success.set(time.time(), name)
+                print(f"🔴 Job {name}: {result}")
+            except Exception:
+                print(f"🔴 Job {name} failed")
+                traceback.print_exc()
+            finally:
+                job_duration.observe(time.time() - started, name)
+
+    thread = threading.Thread(target=loop, name=f"job-{name}", daemon=True)
+    _jobs[name] = thread
+    thread.start()
+    return True
+
+
+def stop_all() -> None:
+    """Signal every job loop to exit (called on shutdown)"""
+    global _stop
+    _stop.set()
+    _stop = threading.Event()
+    _jobs.clear()
@@ -0,0 +1,88 @@
+"""
+Skill History - Mastery Time Series Across Reassessments
+Points are appended on every assessment and downsampled into week/month buckets for charts
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+from sqlmodel import Session, select
+from ..models import SkillMasteryPoint, SkillSnapshot
+
+# Weeks start on Monday; 1970-01-05 is the first Monday after the epoch
+_WEEK_ORIGIN = np.datetime64("1970-01-05", "D")
+
+
+def record_mastery_points(session: Session, child_id: int, assessment_id: int, ts: datetime, snapshots: List[SkillSnapshot]) -> None:
+    """Append one point per skill snapshot (caller commits)"""
+    session.add_all([
+        SkillMasteryPoint(
+            child_id=child_id,
+            skill=snapshot.skill,
+            ts=ts,
+            mastery_percentage=snapshot.mastery_percentage,
+            assessment_id=assessment_id
+        )
+        for snapshot in snapshots
+    ])
+
+
+def load_mastery_points(session: Session, child_id: int, start: Optional[datetime], end: Optional[datetime], skill: Optional[str]):
+    """One range query over the (child_id, skill, ts) index, ordered by skill then time"""
+    statement = select(
+        SkillMasteryPoint.skill,
+        SkillMasteryPoint.ts,
+        SkillMasteryPoint.mastery_percentage
+    ).where(SkillMasteryPoint.child_id == child_id)
+
+    if skill:
+        statement = statement.where(SkillMasteryPoint.skill == skill)
+    if start:
+        statement = statement.where(SkillMasteryPoint.ts >= start)
+    if end:
+        statement = statement.where(SkillMasteryPoint.ts < end)
+
+    return session.exec(statement.order_by(SkillMasteryPoint.skill, SkillMasteryPoint.ts, SkillMasteryPoint.id)).all()
+
+
+def downsample_mastery(rows, bucket: str = "week") -> List[Dict]:
+    """
+    Aggregate (skill, ts, mastery) rows, sorted by skill then ts, into one point
+    per skill and bucket with mean, min, max and last mastery.
+    """
+    if not rows:
+        return []
+
+    skills = np.array([row[0] for row in rows])
+    days = np.array([row[1] for row in rows], dtype="datetime64[s]").astype("datetime64[D]")
+    mastery = np.array([row[2] for row in rows], dtype=np.float64)
+
+    if bucket == "month":
+        bucket_starts = days.astype("datetime64[M]").astype("datetime64[D]")
+    else:
+        bucket_starts = _WEEK_ORIGIN + ((days - _WEEK_ORIGIN) // 7) * 7
+
+    # Rows are sorted by (skill, ts), so each (skill, bucket) group is one contiguous run
+    boundary = np.ones(len(rows), dtype=bool)
+    boundary[1:] = (skills[1:] != skills[:-1]) | (bucket_starts[1:] != bucket_starts[:-1])
+    starts = np.flatnonzero(boundary)
+    ends = np.append(starts[1:], len(rows))
+    counts = ends - starts
+
+    means = np.add.reduceat(mastery, starts) / counts
+    minimums = np.minimum.reduceat(mastery, starts)
+    maximums = np.maximum.reduceat(mastery, starts)
+    lasts = mastery[ends - 1]
+
+    return [
+        {
+            "skill": str(skills[i]),
+            "bucket_start": bucket_starts[i].astype(datetime).isoformat(),
+            "mastery_mean": round(float(mean), 1),
+            "mastery_min": int(low),
+            "mastery_max": int(high),
+            "mastery_last": int(last),
+            "samples": int(count),
+        }
+        for i, mean, low, high, last, count in zip(starts, means, minimums, maximums, lasts, counts)
+    ]
@@ -0,0 +1,109 @@
+"""
+Skill Snapshots - Per-Assessment Skill Mastery
+Written once when an assessment is submitted so the dashboard never re-reads its questions
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import case
+from sqlalchemy.engine import Connection
+from sqlmodel import select, func
+from ..database import engine, create_db_and_tables
+from ..models import Assessment, AssessmentQuestion, SkillSnapshot
+from .item_bank import SKILL_DISPLAY_NAMES
+
+
+def _snapshots_from_counts(assessment_id: int, counts: Dict[str, Tuple[int, int]]) -> List[SkillSnapshot]:
+    snapshots = []
+    for skill, (total, correct) in counts.items():
+        snapshots.append(SkillSnapshot(
+            assessment_id=assessment_id,
+            skill=skill,
+            skill_name=SKILL_DISPLAY_NAMES.get(skill, skill),
+            total_questions=total,
+            correct_answers=correct,
+            mastery_percentage=int((correct / total) * 100) if total > 0 else 0
+        ))
+    return snapshots
+
+
+def build_skill_snapshots(assessment_id: int, questions: Iterable[AssessmentQuestion]) -> List[SkillSnapshot]:
+    """Summarize an assessment's question records by skill (question_type)"""
+    counts: Dict[str, Tuple[int, int]] = {}
+    for question in questions:
+        total, correct = counts.get(question.question_type, (0, 0))
+        counts[question.question_type] = (total + 1, correct + (1 if question.is_correct else 0))
+    return _snapshots_from_counts(assessment_id, counts)
+
+
+def _backfill_batch(connection: Connection, last_id: int, batch_size: int) -> List[int]:
+    """Write snapshots for the next batch of assessments without any; returns their ids"""
+    # Next batch of assessments without snapshots (archived questions can't be summarized, so skip those)
+    assessment_ids = connection.execute(
+        select(Assessment.id)
+        .where(Assessment.id > last_id)
+        .where(~select(SkillSnapshot.id).where(SkillSnapshot.assessment_id == Assessment.id).exists())
+        .where(select(AssessmentQuestion.id).where(AssessmentQuestion.assessment_id == Assessment.id).exists())
+        .order_by(Assessment.id)
+        .limit(batch_size)
+    ).scalars().all()
+    if not assessment_ids:
+        return []
+
+    # One grouped query for the whole batch
+    rows = connection.execute(
+        select(
+            AssessmentQuestion.assessment_id,
+            AssessmentQuestion.question_type,
+            func.count(AssessmentQuestion.id),
+            # SUM over the Boolean column itself would come back typed as a bool
+            func.sum(case((AssessmentQuestion.is_correct, 1), else_=0))
+        )
+        .where(AssessmentQuestion.assessment_id.in_(assessment_ids))
+        .group_by(AssessmentQuestion.assessment_id, AssessmentQuestion.question_type)
+        .order_by(AssessmentQuestion.assessment_id, func.min(AssessmentQuestion.id))
+    ).all()
+
+    counts_by_assessment: Dict[int, Dict[str, Tuple[int, int]]] = {}
+    for assessment_id, skill, total, correct in rows:
+        counts_by_assessment.setdefault(assessment_id, {})[skill] = (total, int(correct or 0))
+
+    snapshots = [
+        snapshot.model_dump(exclude={"id"})
+        for assessment_id, counts in counts_by_assessment.items()
+        for snapshot in _snapshots_from_counts(assessment_id, counts)
+    ]
+    if snapshots:
+        connection.execute(SkillSnapshot.__table__.insert(), snapshots)
+    return assessment_ids
+
+
+def backfill_skill_snapshots(batch_size: int = 500, connection: Optional[Connection] = None) -> int:
+    """
+    Create snapshots for historical assessments that have none; returns assessments processed.
+    With a connection (the startup migrations) the caller commits; otherwise each batch commits.
+    """
+    if connection is None:
+        with engine.connect() as own_connection:
+            return _backfill(own_connection, batch_size, commit=True)
+    return _backfill(connection, batch_size, commit=False)
+
+
+def _backfill(connection: Connection, batch_size: int, commit: bool) -> int:
+    processed = 0
+    last_id = 0
+    while True:
+        assessment_ids = _backfill_batch(connection, last_id, batch_size)
+        if not assessment_ids:
+            break
+        if commit:
+            connection.commit()
+        processed += len(assessment_ids)
+        last_id = assessment_ids[-1]
+        print(f"🔴 Skill snapshot backfill: {processed} assessments processed")
+    return processed
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.utils.skill_snapshots
+    create_db_and_tables()
+    backfill_skill_snapshots()
@@ -0,0 +1,158 @@
+"""
+SQL Instrumentation - Per-Request Query Counts, Slow-Query Log and N+1 Detection
+Engine events time every statement. Inside a request the counts and total database time
+are returned as response headers; statements slower than a threshold go to a slow-query
+log (parameters redacted), and a statement shape repeated too often in one request is logged.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from ..database import database_dir
+from .tracing import current_span, start_span, KIND_CLIENT
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", os.path.join(database_dir, "slow_queries.log"))
+# A statement shape executed more than this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+# "1" logs a summary line for every request, not only the ones with findings
+SQL_LOG_REQUESTS = os.getenv("SQL_LOG_REQUESTS", "") == "1"
+
+_MAX_LOGGED_STATEMENT = 2000
+
+_log_lock = threading.Lock()
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+\"?(\w+)", re.IGNORECASE)
+
+
+class RequestSQLStats:
+    """Statements run while handling one request"""
+    __slots__ = ("route", "statements", "seconds", "shapes")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.statements = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def repeated(self):
+        """(shape, count) of the statements executed more than the N+1 threshold"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > N_PLUS_ONE_THRESHOLD]
+
+
+_current: ContextVar[Optional[RequestSQLStats]] = ContextVar("request_sql_stats", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with literals and expanded IN-lists folded, so repeats of one query compare equal"""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _LITERALS.sub("?", shape)
+    return _PLACEHOLDER_LISTS.sub("(?...)", shape)
+
+
+def _redact(parameters) -> object:
+    """Parameter types only: values can hold emails, names and password hashes"""
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return {"executemany": len(parameters), "first": _redact(parameters[0])}
+        return [type(value).__name__ for value in parameters]
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return None
+
+
+def _write_slow_query(statement: str, parameters, elapsed: float, stats: Optional[RequestSQLStats]) -> None:
+    entry = {
+        "ts": datetime.utcnow().isoformat(),
+        "ms": round(elapsed * 1000, 2),
+        "route": stats.route if stats else None,
+        "statement": _WHITESPACE.sub(" ", statement).strip()[:_MAX_LOGGED_STATEMENT],
+        "parameters": _redact(parameters),
+    }
+    try:
+        with _log_lock, open(SLOW_QUERY_LOG, "a", encoding="utf-8") as log:
+            log.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"🔴 Slow query log unavailable ({e}): {entry['ms']} ms {entry['statement'][:200]}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+    # Trace span per statement, named like "SELECT activityprogress" (None outside a traced request)
+    query_span = None
+    if current_span() is not None:
+        table = _TABLE.search(statement)
+        name = f"{statement.split(None, 1)[0].upper()} {table.group(1) if table else ''}".strip()
+        query_span = start_span(name, KIND_CLIENT, {"db.system": "sqlite"})
+    conn.info.setdefault("query_spans", []).append(query_span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    query_span = conn.info["query_spans"].pop()
+    stats = _current.get()
+    shape = None
+    if stats is not None:
+        shape = statement_shape(statement)
+        stats.statements += 1
+        stats.seconds += elapsed
+        stats.shapes[shape] += 1
+    if query_span is not None:
+        query_span.end()
+        query_span.attributes["db.statement"] = (shape or statement_shape(statement))[:_MAX_LOGGED_STATEMENT]
+        if executemany:
+            query_span.attributes["db.executemany"] = True
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        _write_slow_query(statement, parameters, elapsed, stats)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time and end its span
+    info = exception_context.connection.info if exception_context.connection else {}
+    if info.get("query_started"):
+        info["query_started"].pop()
+    if info.get("query_spans"):
+        query_span = info["query_spans"].pop()
+        if query_span is not None:
+            query_span.error = True
+            query_span.end()
+
+
+def instrument_engine(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+def start_request(route: str) -> RequestSQLStats:
+    stats = RequestSQLStats(route)
+    _current.set(stats)
+    return stats
+
+
+def finish_request(stats: RequestSQLStats, status_code: int, elapsed: float) -> dict:
+    """Response headers for the request; logs the summary and any likely N+1"""
+    db_ms = stats.seconds * 1000
+    repeated = stats.repeated()
+    if SQL_LOG_REQUESTS or repeated:
+        print(f"🔴 SQL {stats.route} -> {status_code}: {stats.statements} statements, "
+              f"{db_ms:.1f} ms in database of {elapsed * 1000:.1f} ms")
+    for shape, count in repeated:
+        print(f"🔴 Possible N+1 in {stats.route}: {count}x {shape[:300]}")
+    return {
+        "X-DB-Queries": str(stats.statements),
+        "X-DB-Time-Ms": f"{db_ms:.2f}",
+        "Server-Timing": f"db;dur={db_ms:.2f}, app;dur={elapsed * 1000:.2f}",
+    }
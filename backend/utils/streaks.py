@@ -0,0 +1,157 @@
+"""
+Streak Engine - Daily Activity Rollups and Per-Child Streaks
+Each progress event upserts the child's DailyActivity row for its local day and advances
+the streak in O(1); a nightly sweep recomputes every streak from the rollups.
+"""
+
+import json
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import case, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session
+from ..database import engine, create_db_and_tables
+from ..models import Parent, ChildProgress, DailyActivity
+
+DEFAULT_TIMEZONE = "UTC"
+
+
+def parse_timezone(name: Optional[str]) -> ZoneInfo:
+    """IANA zone for a preference value, falling back to UTC for missing/unknown names"""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def parent_timezone(parent: Optional[Parent]) -> ZoneInfo:
+    """Timezone from the parent's notification preferences"""
+    name = None
+    if parent and parent.notification_data:
+        try:
+            name = json.loads(parent.notification_data).get("timezone")
+        except (ValueError, AttributeError):
+            pass
+    return parse_timezone(name)
+
+
+def local_day(tz: ZoneInfo, at: Optional[datetime] = None) -> date:
+    """Calendar day of a naive UTC timestamp (default: now) in the given zone"""
+    at = at or datetime.utcnow()
+    return at.replace(tzinfo=timezone.utc).astimezone(tz).date()
+
+
+def record_daily_activity(session: Session, child_id: int, day: date, score: int, minutes: int, completed: int) -> None:
+    """Add one event to the child's rollup row for that day (one row per child and day; caller commits)"""
+    statement = insert(DailyActivity).values(
+        child_id=child_id,
+        day=day,
+        events=1,
+        activities_completed=completed,
+        score=score,
+        minutes=minutes
+    ).on_conflict_do_update(
+        index_elements=["child_id", "day"],
+        set_={
+            "events": DailyActivity.events + 1,
+            "activities_completed": DailyActivity.activities_completed + completed,
+            "score": DailyActivity.score + score,
+            "minutes": DailyActivity.minutes + minutes,
+        }
+    )
+    session.execute(statement)
+
+
+def streak_update(day: date) -> Dict[str, object]:
+    """
+    SET clauses that advance ChildProgress' streak for activity on `day`:
+    same day (or an older, late-arriving one) keeps it, the next day extends it, a gap restarts it.
+    """
+    last_day = ChildProgress.last_active_day
+    return {
+        "streak_days": case(
+            (last_day == None, 1),  # noqa: E711
+            (last_day >= day, ChildProgress.streak_days),
+            (last_day == day - timedelta(days=1), ChildProgress.streak_days + 1),
+            else_=1
+        ),
+        "last_active_day": case((last_day > day, last_day), else_=day),
+    }
+
+
+def current_streak(counters: Optional[ChildProgress], today: date) -> int:
+    """Stored streak, or 0 if the child missed a whole day since it was last extended"""
+    if not counters or not counters.last_active_day:
+        return 0
+    if counters.last_active_day < today - timedelta(days=1):
+        return 0
+    return counters.streak_days
+
+
+def get_activities_on(session: Session, child_id: int, day: date) -> int:
+    """Activities completed by the child on one local day"""
+    rollup = session.get(DailyActivity, (child_id, day))
+    return rollup.activities_completed if rollup else 0
+
+
+# ==================== NIGHTLY RECONCILE ====================
+
+# Parent timezone as stored in the preferences JSON ('' when unset)
+_TIMEZONE_SQL = (
+    "COALESCE(CASE WHEN json_valid(parent.notification_data) "
+    "THEN json_extract(parent.notification_data, '$.timezone') END, '')"
+)
+
+
+def reconcile_streaks() -> Dict[str, int]:
+    """
+    Recompute every child's streak from DailyActivity in one UPDATE (gaps-and-islands:
+    consecutive days share julianday(day) - row_number()); lapsed streaks become 0.
+    """
+    with engine.connect() as connection:
+        # "Yesterday" for each timezone in use; the last run must reach it to still count
+        zones = [row[0] for row in connection.execute(text(f"SELECT DISTINCT {_TIMEZONE_SQL} FROM parent"))]
+        if not zones:
+            return {"children": 0}
+
+        params = {}
+        values = []
+        for i, zone in enumerate(zones):
+            params[f"zone_{i}"] = zone
+            params[f"yesterday_{i}"] = (local_day(parse_timezone(zone)) - timedelta(days=1)).isoformat()
+            values.append(f"(:zone_{i}, :yesterday_{i})")
+
+        connection.execute(text(
+            f"WITH zones(zone, yesterday) AS (VALUES {', '.join(values)}), "
+            "runs AS ("
+            "  SELECT child_id, day,"
+            "    julianday(day) - ROW_NUMBER() OVER (PARTITION BY child_id ORDER BY day) AS island"
+            "  FROM dailyactivity"
+            "), tagged AS ("
+            "  SELECT child_id, day, island, MAX(island) OVER (PARTITION BY child_id) AS last_island FROM runs"
+            "), last_runs AS ("
+            "  SELECT child_id, MAX(day) AS last_day, COUNT(*) AS length"
+            "  FROM tagged WHERE island = last_island GROUP BY child_id"
+            "), targets AS ("
+            "  SELECT lr.child_id, lr.last_day,"
+            "    CASE WHEN lr.last_day >= z.yesterday THEN lr.length ELSE 0 END AS streak"
+            "  FROM last_runs lr"
+            "  JOIN child ON child.id = lr.child_id"
+            "  JOIN parent ON parent.id = child.parent_id"
+            f"  JOIN zones z ON z.zone = {_TIMEZONE_SQL}"
+            ") "
+            "UPDATE childprogress SET streak_days = targets.streak, last_active_day = targets.last_day "
+            "FROM targets WHERE childprogress.child_id = targets.child_id"
+        ), params)
+        # rowcount isn't reported for statements starting with WITH
+        updated = connection.execute(text("SELECT changes()")).scalar()
+        connection.commit()
+
+    return {"children": updated}
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.utils.streaks
+    create_db_and_tables()
+    print(f"🔴 Streaks reconciled: {reconcile_streaks()}")
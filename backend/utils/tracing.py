@@ -0,0 +1,289 @@
+"""
+Tracing - Local Request Spans Written as OTLP/JSON
+Each request is a trace: the route, its dependencies (get_session, get_current_user), the
+handler's numbered sections, every SQL statement and response serialization are spans.
+Spans are kept in memory until the request ends; the trace is written only if it was
+head-sampled (rate or an incoming sampled traceparent) or the tail rules keep it (slow or
+failed). Kept traces go to a size-rotated file, one OTLP ExportTraceServiceRequest per line.
+"""
+
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))  # head-based: share of requests always kept
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "500"))  # tail-based: keep any request at least this slow
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "2000"))  # per trace; later spans are counted, not kept
+TRACE_FILE = os.getenv("TRACE_FILE", "")  # default: traces.jsonl next to the database
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(20 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "5"))
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "brightbook-api")
+
+# OTLP span kinds
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+
+
+class Trace:
+    __slots__ = ("trace_id", "sampled", "spans", "dropped")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+        self.dropped = 0
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], kind: int, attributes: Optional[Dict]):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.error = False
+        if len(trace.spans) < TRACE_MAX_SPANS:
+            trace.spans.append(self)
+        else:
+            trace.dropped += 1
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace.trace_id}-{self.span_id}-{'01' if self.trace.sampled else '00'}"
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+# (span, open section) of the innermost traced function
+_sections: ContextVar[Optional[tuple]] = ContextVar("trace_sections", default=None)
+_write_lock = threading.Lock()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+# ==================== SPANS ====================
+
+def start_span(name: str, kind: int = KIND_INTERNAL, attributes: Optional[Dict] = None) -> Optional[Span]:
+    """Child of the current span (None outside a trace); does not become the current span"""
+    parent = _current.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, kind, attributes)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a block as a child of the current span; spans started inside nest under it"""
+    child = start_span(name, attributes=attributes)
+    if child is None:
+        yield None
+        return
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException:
+        child.error = True
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+@contextmanager
+def _sectioned(name: str):
+    with span(name) as handler:
+        if handler is None:
+            yield
+            return
+        token = _sections.set((handler, None))
+        try:
+            yield
+        finally:
+            _, open_section = _sections.get()
+            if open_section is not None:
+                open_section.end()
+            _sections.reset(token)
+
+
+def traced(func):
+    """
+    Span for a route handler, dependency or helper, split into sections by section() calls
+    at its numbered steps, so a slow request shows which step took the time.
+    """
+    name = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with _sectioned(name):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _sectioned(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def section(name: str) -> None:
+    """End the previous section of the innermost traced function and start the next one"""
+    state = _sections.get()
+    if state is None:
+        return
+    handler, open_section = state
+    if open_section is not None:
+        open_section.end()
+    new_section = Span(handler.trace, name, handler.span_id, KIND_INTERNAL, None)
+    _sections.set((handler, new_section))
+    # Spans started by the section's queries nest under it; the handler's span() restores the parent
+    _current.set(new_section)
+
+
+# ==================== REQUEST TRACES ====================
+
+def _parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header, or None"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or parts[1] == "0" * 32:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+def start_trace(name: str, traceparent: Optional[str] = None, attributes: Optional[Dict] = None) -> Optional[Span]:
+    """Root (server) span of a request; makes the sampling decision for the head"""
+    if not TRACING_ENABLED:
+        return None
+    incoming = _parse_traceparent(traceparent)
+    if incoming:
+        trace_id, parent_id, sampled = incoming
+    else:
+        trace_id, parent_id, sampled = os.urandom(16).hex(), None, random.random() < TRACE_SAMPLE_RATE
+    root = Span(Trace(trace_id, sampled), name, parent_id, KIND_SERVER, attributes)
+    _current.set(root)
+    _sections.set(None)
+    return root
+
+
+def finish_trace(root: Optional[Span], status_code: int) -> bool:
+    """End the request; returns True if the trace was kept and written"""
+    if root is None:
+        return False
+    root.end()
+    root.attributes["http.status_code"] = status_code
+    root.error = root.error or status_code >= 500
+    elapsed_ms = (root.end_ns - root.start_ns) / 1e6
+    keep = root.trace.sampled or elapsed_ms >= TRACE_SLOW_MS or root.error
+    if keep:
+        try:
+            _export(root.trace)
+        except OSError as e:
+            print(f"🔴 Trace export failed: {e}")
+    return keep
+
+
+# ==================== FILE EXPORTER ====================
+
+def _trace_file() -> str:
+    if TRACE_FILE:
+        return TRACE_FILE
+    from ..database import database_dir  # imported late: database.py itself uses this module
+    return os.path.join(database_dir, "traces.jsonl")
+
+
+def _attribute(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _otlp(trace: Trace) -> Dict:
+    spans = []
+    for s in trace.spans:
+        item = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": s.kind,
+            "startTimeUnixNano": str(s.start_ns),
+            # A span still open when the request ended (e.g. a streamed body) ends with it
+            "endTimeUnixNano": str(s.end_ns or trace.spans[0].end_ns),
+            "attributes": [_attribute(k, v) for k, v in s.attributes.items()],
+            "status": {"code": 2 if s.error else 1},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        spans.append(item)
+    if trace.dropped:
+        spans[0]["attributes"].append(_attribute("trace.dropped_spans", trace.dropped))
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", SERVICE_NAME), _attribute("process.pid", os.getpid())]},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+    }]}
+
+
+def _rotate(path: str) -> None:
+    for i in range(TRACE_FILE_BACKUPS - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    if TRACE_FILE_BACKUPS > 0:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+
+def _export(trace: Trace) -> None:
+    line = json.dumps(_otlp(trace), separators=(",", ":")) + "\n"
+    path = _trace_file()
+    with _write_lock:
+        if os.path.exists(path) and os.path.getsize(path) + len(line) > TRACE_FILE_MAX_BYTES:
+            _rotate(path)
+        with open(path, "a", encoding="utf-8") as handle:
+            handle.write(line)
+
+
+# ==================== FRAMEWORK HOOKS ====================
+
+def instrument_serialization() -> None:
+    """Span around FastAPI's response-model validation and serialization"""
+    import fastapi.routing
+
+    serialize_response = fastapi.routing.serialize_response
+    if getattr(serialize_response, "_traced", False):
+        return
+
+    @functools.wraps(serialize_response)
+    async def traced_serialize_response(*args, **kwargs):
+        with span("serialize response"):
+            return await serialize_response(*args, **kwargs)
+
+    traced_serialize_response._traced = True
+    fastapi.routing.serialize_response = traced_serialize_response